@@ -0,0 +1,96 @@
+import random
+from typing import Dict, List
+
+PANEL_TYPES = ['timeseries', 'graph', 'stat', 'gauge', 'table', 'text', 'bargauge']
+DATASOURCES = [
+    {'type': 'prometheus', 'uid': 'prom-main'},
+    {'type': 'prometheus', 'uid': 'prom-long-term'},
+    {'type': 'loki', 'uid': 'loki-main'},
+    {'type': 'elasticsearch', 'uid': 'es-logs'},
+]
+TITLES = ['CPU usage', 'Memory usage', 'Disk IO', 'Network traffic',
+          'Request rate', 'Error rate', 'Latency p99', 'Queue depth']
+
+
+def make_target(rng: random.Random, ref: str, datasource: Dict) -> Dict:
+    return {
+        'refId': ref,
+        'datasource': dict(datasource),
+        'expr': f'sum(rate(http_requests_total{{job="{rng.choice(["api", "web", "db"])}"}}[5m]))',
+        'legendFormat': '{{instance}}',
+        'interval': '',
+    }
+
+
+def make_panel(rng: random.Random, panel_id: int, y: int) -> Dict:
+    datasource = rng.choice(DATASOURCES)
+    return {
+        'id': panel_id,
+        'type': rng.choice(PANEL_TYPES),
+        'title': f'{rng.choice(TITLES)} {panel_id}',
+        'datasource': dict(datasource),
+        'gridPos': {'h': 8, 'w': 12, 'x': (panel_id % 2) * 12, 'y': y},
+        'targets': [make_target(rng, chr(ord('A') + i), datasource) for i in range(rng.randint(1, 4))],
+        'fieldConfig': {
+            'defaults': {'unit': rng.choice(['percent', 'bytes', 'reqps', 's']), 'thresholds': {
+                'mode': 'absolute',
+                'steps': [{'color': 'green', 'value': None}, {'color': 'red', 'value': 80}],
+            }},
+            'overrides': [],
+        },
+        'options': {'legend': {'displayMode': 'list', 'placement': 'bottom'}},
+    }
+
+
+def make_dashboard(panel_count: int, seed: int = 0) -> Dict:
+    """
+    Grafana-shaped dashboard with panel_count panels. Every tenth panel
+    is a row; half of the rows are collapsed and hold their panels nested
+    """
+    rng = random.Random(seed)
+    panels: List[Dict] = []
+    row = None
+    y = 0
+
+    for panel_id in range(1, panel_count + 1):
+        if panel_id % 10 == 1:
+            collapsed = rng.random() < 0.5
+            row = {
+                'id': panel_id,
+                'type': 'row',
+                'title': f'Row {panel_id}',
+                'collapsed': collapsed,
+                'gridPos': {'h': 1, 'w': 24, 'x': 0, 'y': y},
+                'panels': [],
+            }
+            panels.append(row)
+        else:
+            panel = make_panel(rng, panel_id, y)
+            if row is not None and row['collapsed']:
+                row['panels'].append(panel)
+            else:
+                panels.append(panel)
+        y += 1
+
+    return {
+        'id': seed,
+        'uid': f'bench-{panel_count}-{seed}',
+        'title': f'Benchmark dashboard {panel_count}',
+        'tags': ['bench'],
+        'version': 1,
+        'schemaVersion': 39,
+        'panels': panels,
+        'templating': {'list': [
+            {
+                'name': name,
+                'type': 'query',
+                'datasource': dict(rng.choice(DATASOURCES)),
+                'query': f'label_values({name})',
+                'current': {'text': 'All', 'value': '$__all'},
+            }
+            for name in ('job', 'instance', 'namespace')
+        ]},
+        'annotations': {'list': [
+            {'name': 'Deploys', 'datasource': dict(DATASOURCES[0]), 'enable': True},
+        ]},
+    }
@@ -0,0 +1,158 @@
+"""
+Patch engine benchmarks on synthetic dashboards.
+
+    python bench/run.py --sizes 10,100,1000,5000 --output bench.json
+    python bench/run.py --compare bench.json
+
+Results are written as JSON so runs of different commits can be compared;
+--compare prints the median time of this run relative to a saved one.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core.json_parser.parser import (  # noqa: E402
+    JSONPathCompiler,
+    JSONPathConditionEvaluator,
+    JSONPathConditionParser,
+    JSONPathResolver,
+    apply_patch,
+    compile_patch,
+)
+from dashboards import make_dashboard  # noqa: E402
+
+PATCH_SHAPES: Dict[str, List[Dict]] = {
+    'plain': [
+        {'op': 'replace', 'path': '/title', 'value': 'Renamed'},
+        {'op': 'replace', 'path': '/panels/0/title', 'value': 'First'},
+    ],
+    'wildcard': [
+        {'op': 'replace', 'path': '/panels/*/datasource', 'value': {'type': 'prometheus', 'uid': 'new'}},
+    ],
+    'selector_and_or': [
+        {
+            'op': 'replace',
+            'path': "/panels/[?type=='timeseries' && datasource in 'prom' || type=='graph']/title",
+            'value': 'Selected',
+        },
+    ],
+    'many_id_selectors': [
+        {'op': 'replace', 'path': f"/panels/[?id=='{i}']/title", 'value': f'Panel {i}'}
+        for i in range(1, 201)
+    ],
+    'descendant': [
+        {'op': 'replace', 'path': "/**/[?type=='timeseries']/datasource", 'value': {'type': 'prometheus', 'uid': 'new'}},
+    ],
+    'regex': [
+        {'op': 'replace', 'path': "/panels/[?title=~'CPU.*']/type", 'value': 'timeseries'},
+        {'op': 'replace', 'path': "/panels/[?type=='row']/panels/[?title=~'(Memory|Disk).*']/type", 'value': 'stat'},
+    ],
+}
+
+
+def measure(func: Callable[[], object], repeat: int) -> Dict[str, float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {
+        'min_s': min(timings),
+        'median_s': statistics.median(timings),
+        'max_s': max(timings),
+        'repeat': repeat,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def run(sizes: List[int], repeat: int) -> Dict:
+    results = []
+
+    for size in sizes:
+        dashboard = make_dashboard(size)
+        for shape, patch in PATCH_SHAPES.items():
+            compiled = compile_patch(patch)
+            cases = {
+                'apply_patch': lambda: apply_patch(dashboard, patch),
+                'compiled_apply': lambda: compiled.apply(dashboard),
+                'resolve': lambda: [
+                    JSONPathResolver.resolve(dashboard, op['path']) for op in patch
+                ],
+                'resolve_handles': lambda: [
+                    JSONPathResolver.resolve_handles(dashboard, JSONPathCompiler.compile_path(op['path']))
+                    for op in patch
+                ],
+            }
+            for name, func in cases.items():
+                results.append({'benchmark': name, 'shape': shape, 'panels': size, **measure(func, repeat)})
+
+        selector = JSONPathConditionParser.compile("type=='timeseries' && title=~'CPU.*' || id=='3'")
+        panels = dashboard['panels']
+        results.append({
+            'benchmark': 'condition_matches',
+            'shape': 'and_or_regex',
+            'panels': size,
+            **measure(lambda: [JSONPathConditionEvaluator.matches(p, selector) for p in panels], repeat),
+        })
+
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+
+def compare(report: Dict, baseline_file: str) -> None:
+    with open(baseline_file) as f:
+        baseline = json.load(f)
+    previous = {
+        (r['benchmark'], r['shape'], r['panels']): r['median_s']
+        for r in baseline['results']
+    }
+    print(f"{'benchmark':<20}{'shape':<18}{'panels':>8}{'median ms':>12}{'ratio':>8}")
+    for r in report['results']:
+        before = previous.get((r['benchmark'], r['shape'], r['panels']))
+        ratio = f"{r['median_s'] / before:.2f}" if before else '-'
+        print(f"{r['benchmark']:<20}{r['shape']:<18}{r['panels']:>8}"
+              f"{r['median_s'] * 1000:>12.3f}{ratio:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10,100,1000,5000', help='Comma separated panel counts')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per benchmark')
+    parser.add_argument('--output', help='JSON results file, stdout when omitted')
+    parser.add_argument('--compare', help='JSON results file of a previous run to compare with')
+    args = parser.parse_args()
+
+    report = run([int(s) for s in args.sizes.split(',')], args.repeat)
+    if args.compare:
+        compare(report, args.compare)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    elif not args.compare:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,10 @@
-from typing import Dict, List
+from typing import Dict, List, Optional
 from api.base import GrafanaBaseManager
+from core.api.dashboard import latest_version
+from core.metrics import instrumented
 
 
+@instrumented('dashboard')
 class GrafanaDashboardManager(GrafanaBaseManager):
     """Manager for Grafana dashboards using grafana-client"""
 
@@ -10,6 +13,13 @@ class GrafanaDashboardManager(GrafanaBaseManager):
         dashboard_json = self.connection.instance.dashboard.get_dashboard(uid)
         return dashboard_json
 
+    def get_dashboard_version(self, uid: str) -> Optional[int]:
+        """Current version of dashboard by UID, from its latest version entry"""
+        versions = self.connection.instance.client.GET(
+            f"/dashboards/uid/{uid}/versions", params={'limit': 1}
+        )
+        return latest_version(versions)
+
     def create_dashboard(self, dashboard: dict) -> Dict:
         """Create a new dashboard"""
         return self.connection.instance.dashboard.update_dashboard(
@@ -26,11 +36,15 @@ class GrafanaDashboardManager(GrafanaBaseManager):
         """Delete dashboard by UID"""
         return self.connection.instance.dashboard.delete_dashboard(uid)
 
-    def search_dashboards(self, query: str = "", tag: str = "") -> List[Dict]:
-        """Search for dashboards"""
-        params = {}
-        if query:
-            params['query'] = query
-        if tag:
-            params['tag'] = tag
-        return self.connection.instance.search.search_dashboards(params=params)
+    def search_dashboards(
+        self,
+        query: str = "",
+        tag: str = "",
+        limit: Optional[int] = None,
+        page: Optional[int] = None,
+        type_: Optional[str] = None
+    ) -> List[Dict]:
+        """Search for dashboards, one page of at most limit hits (Grafana's default is 1000)"""
+        return self.connection.instance.search.search_dashboards(
+            query=query, tag=tag, limit=limit, page=page, type_=type_
+        )
@@ -1,7 +1,9 @@
 from typing import Dict, List, Optional, Union
 from api.base import GrafanaBaseManager
+from core.metrics import instrumented
 
 
+@instrumented('datasource')
 class GrafanaDataSourceManager(GrafanaBaseManager):
     """Manager for Grafana data sources using grafana-client"""
 
@@ -0,0 +1,77 @@
+from threading import Lock
+from typing import Dict, Tuple
+
+import niquests
+from grafana_client import GrafanaApi
+
+from api.models import GrafanaConnection, GrafanaCreds
+from core.api.throttle import ThrottleRegistry
+
+
+class GrafanaSessionRegistry:
+    """
+    Process-wide registry of pooled Grafana connections keyed by
+    (url, credential). Managers for the same instance share one
+    keep-alive HTTP session, so a run does one handshake and one
+    connect() probe per host instead of one per manager. Sessions
+    apply the instance's ThrottleRegistry limits
+    """
+
+    pool_size: int = 10
+    http2: bool = False
+
+    _lock = Lock()
+    _connections: Dict[Tuple[str, str, str], GrafanaConnection] = {}
+
+    @classmethod
+    def configure(cls, pool_size: int = 10, http2: bool = False) -> None:
+        """Sets pool options for connections created from now on"""
+        if pool_size < 1:
+            raise ValueError("Pool size must be positive")
+        cls.pool_size = pool_size
+        cls.http2 = http2
+
+    @classmethod
+    def get(cls, url: str, creds: GrafanaCreds) -> GrafanaConnection:
+        """Returns shared connection for url and creds, connecting on first use"""
+        key = (url, creds.login, creds.password)
+        with cls._lock:
+            connection = cls._connections.get(key)
+            if connection is None:
+                connection = cls._connect(url, creds)
+                # Failed connections are not cached so they can be retried
+                if connection.instance is not None:
+                    cls._connections[key] = connection
+            return connection
+
+    @classmethod
+    def clear(cls) -> None:
+        """Closes and forgets every pooled connection"""
+        with cls._lock:
+            for connection in cls._connections.values():
+                connection.instance.client.s.close()
+            cls._connections.clear()
+
+    @classmethod
+    def _connect(cls, url: str, creds: GrafanaCreds) -> GrafanaConnection:
+        grafana_inst = GrafanaApi.from_url(
+            url=url,
+            credential=(creds.login, creds.password)
+        )
+        grafana_inst.client.s = cls._session(url, grafana_inst.client.s)
+        try:
+            grafana_inst.connect()
+            return GrafanaConnection(instance=grafana_inst)
+        except Exception as e:
+            return GrafanaConnection(error=e)
+
+    @classmethod
+    def _session(cls, url: str, default: niquests.Session) -> niquests.Session:
+        """Replaces grafana-client's session with one using the pool options"""
+        return ThrottleRegistry.session(
+            url,
+            default,
+            pool_maxsize=cls.pool_size,
+            disable_http2=not cls.http2,
+            disable_http3=True
+        )
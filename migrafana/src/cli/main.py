@@ -1,19 +1,21 @@
 import json
 import os
 import click
-from dotenv import load_dotenv
 
-from api.datasource import GrafanaDataSourceManager
-from json_parser.parser import apply_patch
-from api.dashboard import GrafanaDashboardManager
-from api.models import GrafanaCreds
+# Only light modules are imported here: grafana-client (niquests, urllib3),
+# pydantic and dotenv are imported inside the commands that talk to Grafana,
+# so --help and offline commands start fast. tests/test_cli_startup.py
+# keeps it that way
 
-load_dotenv()
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'migrafana')
 
 
 def get_credentials():
     """Try multiple secure sources"""
+    from dotenv import load_dotenv
+    from api.models import GrafanaCreds
 
+    load_dotenv()
     env_user = os.getenv('GRAFANA_API_USER')
     env_pass = os.getenv('GRAFANA_API_PASS')
     if env_user and env_pass:
@@ -22,6 +24,20 @@ def get_credentials():
     raise click.BadParameter("No credentials found")
 
 
+def configure_connections():
+    """Applies the global connection options to the Grafana client registries"""
+    from api.session import GrafanaSessionRegistry
+    from core.api.throttle import ThrottleRegistry
+
+    options = click.get_current_context().find_root().params
+    GrafanaSessionRegistry.configure(pool_size=options['pool_size'], http2=options['http2'])
+    ThrottleRegistry.configure(
+        rate=options['rate_limit'],
+        max_concurrency=options['max_concurrency'],
+        retries=options['retries']
+    )
+
+
 def parse_patch(patch):
     try:
         with open(f'{patch}', 'r+') as patch_file:
@@ -31,29 +47,82 @@ def parse_patch(patch):
         return
 
 
+def read_patch(path, param_hint='--patch'):
+    """
+    Patch file of an option. An unreadable or invalid file is an error:
+    taken as no patch, objects would be written unpatched
+    """
+    patch = parse_patch(path)
+    if patch is None:
+        raise click.BadParameter(f"Cannot read patch file {path}", param_hint=param_hint)
+    return patch
+
+
 @click.group
-def cli():
-    ...
+@click.option('--pool-size', default=10, show_default=True,
+              help='Pooled HTTP connections per Grafana instance')
+@click.option('--http2', is_flag=True, help='Allow HTTP/2 connections to Grafana')
+@click.option('--rate-limit', type=float, help='Maximum requests per second per Grafana instance')
+@click.option('--max-concurrency', default=16, show_default=True,
+              help='Maximum requests in flight per Grafana instance, '
+                   'lowered automatically while Grafana is overloaded')
+@click.option('--retries', default=3, show_default=True,
+              help='Retries of read requests failing with 429, 5xx or timeouts')
+@click.option('--metrics-report', help='Write timings and counters of the run to this JSON file')
+@click.option('--metrics-textfile', help='Write metrics of the run to this file in Prometheus text format')
+@click.pass_context
+def cli(ctx, pool_size, http2, rate_limit, max_concurrency, retries, metrics_report, metrics_textfile):
+    # Connection options are applied by configure_connections
+    if metrics_report or metrics_textfile:
+        from core.metrics import METRICS
+
+        METRICS.enable()
+        ctx.call_on_close(lambda: write_metrics(ctx, metrics_report, metrics_textfile))
+
+
+def write_metrics(ctx, report_path, textfile_path):
+    from core.metrics import METRICS
+
+    if report_path:
+        extra = {'command': ctx.invoked_subcommand}
+        if 'report' in ctx.meta:
+            extra['report'] = ctx.meta['report']
+        METRICS.write_report(report_path, extra)
+    if textfile_path:
+        METRICS.write_prometheus(textfile_path)
 
 
 @cli.command
 @click.option('--src', help='URL of source Grafana instance')
 @click.option('--dest', help='URL of destination Grafana instance')
-@click.option('--patch', help='JSON patch file using RFC6902 standard '
-                              'with mapping to change dashboard components '
-                              'patch = [{ '
-                              '"op": "replace", '
-                              '"path": "/dashboard/*/[?type==\'graph\']/title" '
-                              '"value": "Updated" '
-                              '}]')
+@click.option('--patch', required=True, help='JSON patch file using RFC6902 standard '
+                                             'with mapping to change dashboard components '
+                                             'patch = [{ '
+                                             '"op": "replace", '
+                                             '"path": "/dashboard/*/[?type==\'graph\']/title" '
+                                             '"value": "Updated" '
+                                             '}]')
 @click.option('--uuid', help='UUID of dashboard to change')
-def dashboard(src, dest, patch, uuid):
-    patch_obj = parse_patch(patch)
+@click.option('--dry-run', is_flag=True, help='Print the changes as JSON patch instead of applying them')
+def dashboard(src, dest, patch, uuid, dry_run):
+    from api.dashboard import GrafanaDashboardManager
+    from core.json_parser.diff import diff
+    from core.json_parser.parser import apply_patch
+    from core.sync import DASHBOARD_VOLATILE_KEYS, same_content
+
+    patch_obj = read_patch(patch)
+    configure_connections()
     creds = get_credentials()
     # Initialize grafana-client
     dash_manager = GrafanaDashboardManager(src, creds)
     dash_dict = dash_manager.get_dashboard(uuid)
     updated_dash_dict = apply_patch(dash_dict['dashboard'], patch_obj)
+    if dry_run:
+        click.echo(json.dumps(diff(dash_dict['dashboard'], updated_dash_dict), indent=2))
+        return
+    if same_content(dash_dict['dashboard'], updated_dash_dict, DASHBOARD_VOLATILE_KEYS):
+        click.echo('Dashboard unchanged, nothing written')
+        return
     dash_dict['dashboard'] = updated_dash_dict
     dash_manager.update_dashboard(dash_dict)
     return
@@ -62,27 +131,43 @@ def dashboard(src, dest, patch, uuid):
 @cli.command
 @click.option('--src', help='URL of source Grafana instance')
 @click.option('--dest', help='URL of destination Grafana instance')
-@click.option('--patch', help='JSON patch file using RFC6902 standard '
-                              'with mapping to change dashboard components '
-                              'patch = [{ '
-                              '"op": "replace", '
-                              '"path": "/dashboard/*/[?type==\'graph\']/title" '
-                              '"value": "Updated" '
-                              '}]')
+@click.option('--patch', required=True, help='JSON patch file using RFC6902 standard '
+                                             'with mapping to change dashboard components '
+                                             'patch = [{ '
+                                             '"op": "replace", '
+                                             '"path": "/dashboard/*/[?type==\'graph\']/title" '
+                                             '"value": "Updated" '
+                                             '}]')
 @click.option('--uuid', help='UUID of datasource to change')
-def datasource(src, dest, patch, uuid):
-    patch_obj = parse_patch(patch)
+@click.option('--dry-run', is_flag=True, help='Print the changes as JSON patch instead of applying them')
+def datasource(src, dest, patch, uuid, dry_run):
+    from api.datasource import GrafanaDataSourceManager
+    from core.json_parser.diff import diff
+    from core.json_parser.parser import apply_patch
+    from core.sync import DATASOURCE_VOLATILE_KEYS, same_content
+
+    patch_obj = read_patch(patch)
+    configure_connections()
     creds = get_credentials()
     # Initialize grafana-client
     dash_manager = GrafanaDataSourceManager(src, creds)
     datasource_dict = dash_manager.get_datasource(uuid)
     updated_dash_dict = apply_patch(datasource_dict, patch_obj)
+    if dry_run:
+        click.echo(json.dumps(diff(datasource_dict, updated_dash_dict), indent=2))
+        return
+    if same_content(datasource_dict, updated_dash_dict, DATASOURCE_VOLATILE_KEYS):
+        click.echo('Datasource unchanged, nothing written')
+        return
     dash_manager.update_datasource(uuid, updated_dash_dict)
 
 
 @cli.command
 @click.option('--src', help='URL of source Grafana instance')
 def get_datasources(src):
+    from api.datasource import GrafanaDataSourceManager
+
+    configure_connections()
     creds = get_credentials()
     # Initialize grafana-client
     dash_manager = GrafanaDataSourceManager(src, creds)
@@ -90,6 +175,229 @@ def get_datasources(src):
     print(datasources)
 
 
+@cli.command
+@click.option('--src', help='URL of source Grafana instance')
+@click.option('--dest', help='URL of destination Grafana instance, '
+                             'dashboards are updated in place when omitted')
+@click.option('--patch', help='JSON patch file using RFC6902 standard '
+                              'applied to every dashboard')
+@click.option('--uuid', multiple=True, help='UUID of dashboard to migrate, can be repeated')
+@click.option('--query', default='', help='Migrate dashboards matching search query')
+@click.option('--tag', default='', help='Migrate dashboards with tag')
+@click.option('--fetch-workers', default=8, show_default=True,
+              help='Concurrent reads from source instance')
+@click.option('--push-workers', default=4, show_default=True,
+              help='Concurrent writes to destination instance')
+@click.option('--cache-dir', default=DEFAULT_CACHE_DIR, show_default=True,
+              help='Directory of the local dashboard cache')
+@click.option('--cache-size', default=512, show_default=True,
+              help='Maximum size of the local dashboard cache in MB')
+@click.option('--no-cache', is_flag=True, help='Always fetch dashboards and data sources from the instances')
+@click.option('--sync-state', help='State file for incremental sync, dashboards '
+                                   'unchanged since the last run are skipped')
+@click.option('--dry-run', is_flag=True, help='Summarize what the patch would change, push nothing')
+@click.option('--force', is_flag=True, help='Write dashboards even when their content is unchanged')
+@click.option('--remap-datasources', is_flag=True, help='Rewrite data source references to the '
+                                                        'destination data sources of the same name and type')
+def migrate_all(src, dest, patch, uuid, query, tag, fetch_workers, push_workers,
+                cache_dir, cache_size, no_cache, sync_state, dry_run, force, remap_datasources):
+    from api.dashboard import GrafanaDashboardManager
+    from core.cache import CachingDashboardManager, CachingDataSourceManager, DashboardCache
+    from core.json_parser.diff import DiffSummary
+    from core.migration import BulkDashboardMigrator
+    from core.remap import DataSourceRemapper
+    from core.sync import SyncState
+
+    if remap_datasources and not dest:
+        raise click.BadParameter('--remap-datasources needs --dest')
+    patch_obj = read_patch(patch) if patch else None
+    configure_connections()
+    creds = get_credentials()
+    remapper = None
+    if remap_datasources:
+        from api.datasource import GrafanaDataSourceManager
+
+        src_datasources = GrafanaDataSourceManager(src, creds)
+        dest_datasources = GrafanaDataSourceManager(dest, creds)
+        if not no_cache:
+            src_datasources = CachingDataSourceManager(src_datasources)
+            dest_datasources = CachingDataSourceManager(dest_datasources)
+        remapper = DataSourceRemapper.from_managers(src_datasources, dest_datasources)
+        for datasource in remapper.unpaired:
+            click.echo(f"Data source {datasource.get('name')} ({datasource.get('type')}) "
+                       f"has no counterpart on {dest}")
+    src_manager = GrafanaDashboardManager(src, creds)
+    cache = None
+    if not no_cache:
+        cache = DashboardCache(cache_dir, max_bytes=cache_size * 1024 * 1024)
+        src_manager = CachingDashboardManager(src_manager, cache, instance=src)
+    dest_manager = GrafanaDashboardManager(dest, creds) if dest else None
+
+    state = SyncState(sync_state) if sync_state and not dry_run else None
+    summary = DiffSummary() if dry_run else None
+
+    def on_progress(result, done, total):
+        if result.skipped:
+            status = f'skipped, {result.skipped}'
+        else:
+            status = 'ok' if result.ok else f'FAILED {result.error}'
+        click.echo(f'[{done}/{total}] {result.uid}: {status}')
+
+    migrator = BulkDashboardMigrator(
+        src_manager,
+        dest_manager,
+        patch=patch_obj,
+        fetch_workers=fetch_workers,
+        push_workers=push_workers,
+        on_progress=on_progress,
+        state=state,
+        dry_run=summary,
+        skip_unchanged=not force,
+        remapper=remapper
+    )
+    uids = list(uuid) or migrator.find_uids(query=query, tag=tag)
+    try:
+        report = migrator.run(uids)
+    finally:
+        if cache:
+            cache.flush()
+        if state:
+            state.save()
+    click.get_current_context().meta['report'] = report.to_dict()
+    if summary:
+        for line in summary.lines():
+            click.echo(line)
+    if remapper:
+        for dashboard_uid, references in sorted(remapper.unmatched.items()):
+            for reference in references:
+                click.echo(f'{dashboard_uid}: unmatched data source {json.dumps(reference.reference)} '
+                           f'at {reference.path}')
+    click.echo(f'Migrated {len(report.succeeded)}/{report.total} dashboards, '
+               f'{len(report.skipped)} skipped, {len(report.failed)} failed')
+    if report.failed:
+        raise SystemExit(1)
+
+
+@cli.command
+@click.option('--src', help='URL of source Grafana instance')
+@click.option('--output', required=True,
+              help='NDJSON archive to write, compressed when ending with .gz or .zst')
+@click.option('--kind', type=click.Choice(['all', 'dashboards', 'datasources']),
+              default='all', show_default=True, help='Objects to export')
+@click.option('--query', default='', help='Export dashboards matching search query')
+@click.option('--tag', default='', help='Export dashboards with tag')
+@click.option('--workers', default=8, show_default=True, help='Concurrent dashboard reads')
+@click.option('--resume', is_flag=True, help='Append to an interrupted export, '
+                                            'skipping objects already written')
+def export(src, output, kind, query, tag, workers, resume):
+    from api.dashboard import GrafanaDashboardManager
+    from api.datasource import GrafanaDataSourceManager
+    from core.archive import (
+        KIND_DASHBOARD,
+        KIND_DATASOURCE,
+        ArchiveWriter,
+        archived_uids,
+        export_dashboards,
+        export_datasources
+    )
+    from core.migration import search_all_dashboards
+
+    configure_connections()
+    creds = get_credentials()
+    skip_datasources = archived_uids(output, KIND_DATASOURCE) if resume else None
+    skip_dashboards = archived_uids(output, KIND_DASHBOARD) if resume else None
+    with ArchiveWriter(output, append=resume) as writer:
+        if kind in ('all', 'datasources'):
+            written = export_datasources(GrafanaDataSourceManager(src, creds), writer, skip_datasources)
+            click.echo(f'Exported {written} datasources')
+
+        if kind in ('all', 'dashboards'):
+            dash_manager = GrafanaDashboardManager(src, creds)
+            uids = [hit['uid'] for hit in search_all_dashboards(dash_manager, query=query, tag=tag)]
+
+            def on_progress(result, done, total):
+                status = 'ok' if result.ok else f'FAILED {result.error}'
+                click.echo(f'[{done}/{total}] {result.uid}: {status}')
+
+            report = export_dashboards(dash_manager, uids, writer, workers, skip_dashboards, on_progress)
+            click.get_current_context().meta['report'] = report.to_dict()
+            click.echo(f'Exported {len(report.succeeded)}/{report.total} dashboards, '
+                       f'{len(report.failed)} failed')
+            if report.failed:
+                raise SystemExit(1)
+
+
+@cli.command('import')
+@click.option('--dest', help='URL of destination Grafana instance')
+@click.option('--input', 'input_path', required=True,
+              help='NDJSON archive written by export, .gz and .zst are decompressed')
+@click.option('--kind', type=click.Choice(['all', 'dashboards', 'datasources']),
+              default='all', show_default=True, help='Objects to import')
+@click.option('--patch', help='JSON patch file using RFC6902 standard '
+                              'applied to every dashboard')
+@click.option('--datasource-patch', help='JSON patch file using RFC6902 standard '
+                                         'applied to every datasource')
+@click.option('--workers', default=4, show_default=True, help='Concurrent writes to destination')
+def import_archive_command(dest, input_path, kind, patch, datasource_patch, workers):
+    from api.dashboard import GrafanaDashboardManager
+    from api.datasource import GrafanaDataSourceManager
+    from core.archive import import_archive
+    from core.json_parser.parser import compile_patch
+
+    dashboard_patch = read_patch(patch) if patch else None
+    datasource_patch_obj = read_patch(datasource_patch, '--datasource-patch') if datasource_patch else None
+    configure_connections()
+    creds = get_credentials()
+
+    def on_progress(result, done, total):
+        status = 'ok' if result.ok else f'FAILED {result.error}'
+        click.echo(f'[{done}] {result.uid}: {status}')
+
+    report = import_archive(
+        input_path,
+        dashboard_manager=GrafanaDashboardManager(dest, creds) if kind != 'datasources' else None,
+        datasource_manager=GrafanaDataSourceManager(dest, creds) if kind != 'dashboards' else None,
+        dashboard_patch=compile_patch(dashboard_patch) if dashboard_patch else None,
+        datasource_patch=compile_patch(datasource_patch_obj) if datasource_patch_obj else None,
+        workers=workers,
+        on_progress=on_progress
+    )
+    click.get_current_context().meta['report'] = report.to_dict()
+    click.echo(f'Imported {len(report.succeeded)}/{report.total} objects, '
+               f'{len(report.failed)} failed')
+    if report.failed:
+        raise SystemExit(1)
+
+
+@cli.command
+@click.argument('paths', nargs=-1, required=True, type=click.Path(exists=True))
+@click.option('--patch', required=True, help='JSON patch file using RFC6902 standard '
+                                             'applied to every dashboard')
+@click.option('--output-dir', help='Write patched files here, keeping their relative paths; '
+                                   'files are patched in place when omitted')
+@click.option('--kind', type=click.Choice(['dashboard', 'datasource']), default='dashboard',
+              show_default=True, help='Records of NDJSON archives to patch')
+@click.option('--workers', type=int, help='Worker processes, one per CPU by default')
+def patch(paths, patch, output_dir, kind, workers):
+    """Apply a patch to local JSON files, directories and NDJSON archives"""
+    from core.offline import OfflinePatcher
+
+    patch_obj = read_patch(patch)
+
+    def on_progress(result, done, total):
+        if not result.ok:
+            click.echo(f'[{done}/{total}] {result.uid}: FAILED {result.error}', err=True)
+
+    patcher = OfflinePatcher(patch_obj, output_dir=output_dir, workers=workers,
+                             kind=kind, on_progress=on_progress)
+    report = patcher.run(list(paths))
+    click.get_current_context().meta['report'] = report.to_dict()
+    click.echo(f'Patched {len(report.succeeded)}/{report.total} files, '
+               f'{len(report.skipped)} unchanged, {len(report.failed)} failed')
+    if report.failed:
+        raise SystemExit(1)
+
+
 def main():
     cli()
 
@@ -1,23 +1,37 @@
-from grafana_client import GrafanaApi
+from grafana_client import AsyncGrafanaApi, GrafanaApi
+
+from core.api.throttle import ThrottleRegistry
 from core.models import GrafanaConfig
 
 
 class GrafanaAPIClient:
+    """
+    grafana-client wrapper. Requests go through the instance's
+    ThrottleRegistry limits: rate limit, adaptive concurrency and
+    retries of idempotent requests
+    """
+
     def __init__(self, config: GrafanaConfig):
         self.config = config
         self.client = self._initialize_client()
 
     def _initialize_client(self) -> GrafanaApi:
+        client = GrafanaApi.from_url(
+            url=self.config.url,
+            credential=self._credential()
+        )
+        client.client.s = ThrottleRegistry.session(
+            self.config.url,
+            client.client.s,
+            pool_maxsize=client.client.session_pool_size
+        )
+        return client
+
+    def _credential(self):
         if self.config.api_key:
-            return GrafanaApi.from_url(
-                url=self.config.url,
-                credential=self.config.api_key
-            )
+            return self.config.api_key
         elif self.config.username and self.config.password:
-            return GrafanaApi.from_url(
-                url=self.config.url,
-                credential=(self.config.username, self.config.password)
-            )
+            return (self.config.username, self.config.password)
         raise ValueError("No valid authentication method provided")
 
     def test_connection(self) -> bool:
@@ -25,3 +39,39 @@ class GrafanaAPIClient:
             return bool(self.client.connect())
         except Exception:
             return False
+
+
+class AsyncGrafanaAPIClient(GrafanaAPIClient):
+    """
+    asyncio counterpart of GrafanaAPIClient. All requests made through
+    one instance share a single keep-alive connection pool, so many
+    concurrent calls can run on one event loop
+    """
+
+    def _initialize_client(self) -> AsyncGrafanaApi:
+        client = AsyncGrafanaApi.from_url(
+            url=self.config.url,
+            credential=self._credential()
+        )
+        client.client.s = ThrottleRegistry.async_session(
+            self.config.url,
+            client.client.s,
+            pool_maxsize=client.client.session_pool_size
+        )
+        return client
+
+    async def test_connection(self) -> bool:
+        try:
+            return bool(await self.client.connect())
+        except Exception:
+            return False
+
+    async def close(self) -> None:
+        """Closes pooled connections"""
+        await self.client.client.s.close()
+
+    async def __aenter__(self) -> 'AsyncGrafanaAPIClient':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
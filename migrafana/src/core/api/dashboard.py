@@ -1,9 +1,26 @@
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 
-from core.api.base import GrafanaAPIClient
-from core.json_parser.parser import apply_patch
+from grafana_client.client import GrafanaClientError
 
+from core.api.base import AsyncGrafanaAPIClient, GrafanaAPIClient
+from core.json_parser.parser import compile_patch
+from core.metrics import instrumented
+from core.migration import build_dashboard_payload, patch_hash
+from core.remap import DataSourceRemapper
+from core.sync import DASHBOARD_VOLATILE_KEYS, SyncState, canonical_hash, same_content
 
+
+def latest_version(versions: Any) -> Optional[int]:
+    """
+    Version of the newest entry of a dashboard versions response: a list
+    before Grafana 11, {'versions': [...], 'continueToken': ...} since
+    """
+    if isinstance(versions, dict):
+        versions = versions.get('versions')
+    return versions[0].get('version') if versions else None
+
+
+@instrumented('dashboard')
 class GrafanaDashboardManager:
     """Manager for Grafana dashboards using grafana-client"""
 
@@ -15,6 +32,11 @@ class GrafanaDashboardManager:
         dashboard_json = self.api.client.dashboard.get_dashboard(uid)
         return dashboard_json
 
+    def get_dashboard_version(self, uid: str) -> Optional[int]:
+        """Current version of dashboard by UID, from its latest version entry"""
+        versions = self.api.client.client.GET(f"/dashboards/uid/{uid}/versions", params={'limit': 1})
+        return latest_version(versions)
+
     def create_dashboard(self, dashboard: dict) -> Dict:
         """Create a new dashboard"""
         return self.api.client.dashboard.update_dashboard(
@@ -31,23 +53,153 @@ class GrafanaDashboardManager:
         """Delete dashboard by UID"""
         return self.api.client.dashboard.delete_dashboard(uid)
 
-    def search_dashboards(self, query: str = "", tag: str = "") -> List[Dict]:
-        """Search for dashboards"""
-        params = {}
-        if query:
-            params['query'] = query
-        if tag:
-            params['tag'] = tag
-        return self.api.client.search.search_dashboards(params=params)
+    def search_dashboards(
+        self,
+        query: str = "",
+        tag: str = "",
+        limit: Optional[int] = None,
+        page: Optional[int] = None,
+        type_: Optional[str] = None
+    ) -> List[Dict]:
+        """Search for dashboards, one page of at most limit hits (Grafana's default is 1000)"""
+        return self.api.client.search.search_dashboards(
+            query=query, tag=tag, limit=limit, page=page, type_=type_
+        )
 
     def transfer_datasource(
         self,
         uid: str,
         patch_operations: list[dict],
-        target_service: Optional['GrafanaDashboardManager'] = None
-    ) -> Dict:
-        dashboard = self.get_dashboard(uid)
-        patched = apply_patch(dashboard['dashboard'], patch_operations)
-        dashboard['dashboard'] = patched
+        target_service: Optional['GrafanaDashboardManager'] = None,
+        state: Optional[SyncState] = None,
+        remapper: Optional[DataSourceRemapper] = None
+    ) -> Optional[Dict]:
+        """
+        Patches dashboard and pushes it to target_service (or back).
+        With a DataSourceRemapper the data source references of the
+        patched dashboard are rewritten to the target's data sources;
+        unmatched references are collected in remapper.unmatched.
+        The push is skipped, returning None, when the target copy
+        already has the patched content or, with a SyncState, when the
+        patched dashboard matches the one pushed last time.
+        Another instance gets the dashboard by uid, without the source's id
+        """
+        response = self.get_dashboard(uid)
+        original = response['dashboard']
         target = target_service if target_service else self
-        return target.update_dashboard(uid, dashboard)
+        payload = build_dashboard_payload(
+            response,
+            compile_patch(patch_operations) if patch_operations else None,
+            keep_id=target is self,
+            remapper=remapper
+        )
+        patched = payload['dashboard']
+
+        digest = canonical_hash(payload)
+        applied = patch_hash(patch_operations, remapper)
+        version = original.get('version')
+        if state is not None and state.is_pushed(uid, digest):
+            state.record(uid, version, digest, applied)
+            return None
+
+        current = original if target is self else target.find_dashboard(uid)
+        if current is not None and same_content(current, patched, DASHBOARD_VOLATILE_KEYS):
+            result = None
+        else:
+            result = target.update_dashboard(payload)
+        if state is not None:
+            state.record(uid, version, digest, applied)
+        return result
+
+    def find_dashboard(self, uid: str) -> Optional[Dict]:
+        """Get dashboard model by UID, None when it does not exist (404)"""
+        try:
+            return self.get_dashboard(uid)['dashboard']
+        except GrafanaClientError as e:
+            # Refused or failed lookups are not a missing object
+            if e.status_code != 404:
+                raise
+            return None
+
+
+@instrumented('dashboard')
+class AsyncGrafanaDashboardManager:
+    """Async manager for Grafana dashboards, mirrors GrafanaDashboardManager"""
+
+    def __init__(self, api_client: AsyncGrafanaAPIClient):
+        self.api = api_client
+
+    async def get_dashboard(self, uid: str) -> dict:
+        """Get dashboard by UID"""
+        return await self.api.client.dashboard.get_dashboard(uid)
+
+    async def get_dashboard_version(self, uid: str) -> Optional[int]:
+        """Current version of dashboard by UID, from its latest version entry"""
+        versions = await self.api.client.client.GET(f"/dashboards/uid/{uid}/versions", params={'limit': 1})
+        return latest_version(versions)
+
+    async def create_dashboard(self, dashboard: dict) -> Dict:
+        """Create a new dashboard"""
+        return await self.api.client.dashboard.update_dashboard(
+            dashboard=dashboard
+        )
+
+    async def update_dashboard(self, dashboard: dict) -> Dict:
+        """Update existing dashboard"""
+        return await self.api.client.dashboard.update_dashboard(
+            dashboard=dashboard
+        )
+
+    async def delete_dashboard(self, uid: str) -> Dict:
+        """Delete dashboard by UID"""
+        return await self.api.client.dashboard.delete_dashboard(uid)
+
+    async def search_dashboards(
+        self,
+        query: str = "",
+        tag: str = "",
+        limit: Optional[int] = None,
+        page: Optional[int] = None,
+        type_: Optional[str] = None
+    ) -> List[Dict]:
+        """Search for dashboards, one page of at most limit hits (Grafana's default is 1000)"""
+        return await self.api.client.search.search_dashboards(
+            query=query, tag=tag, limit=limit, page=page, type_=type_
+        )
+
+    async def transfer_datasource(
+        self,
+        uid: str,
+        patch_operations: list[dict],
+        target_service: Optional['AsyncGrafanaDashboardManager'] = None,
+        remapper: Optional[DataSourceRemapper] = None
+    ) -> Optional[Dict]:
+        """
+        Patches dashboard, rewrites its data source references with
+        remapper if given, and pushes it to target_service (or back).
+        Returns None without writing when the target copy already
+        has the patched content
+        """
+        response = await self.get_dashboard(uid)
+        original = response['dashboard']
+        target = target_service if target_service else self
+        payload = build_dashboard_payload(
+            response,
+            compile_patch(patch_operations) if patch_operations else None,
+            keep_id=target is self,
+            remapper=remapper
+        )
+        current = original if target is self else await target.find_dashboard(uid)
+        if current is not None and same_content(current, payload['dashboard'], DASHBOARD_VOLATILE_KEYS):
+            return None
+        return await target.update_dashboard(payload)
+
+    async def find_dashboard(self, uid: str) -> Optional[Dict]:
+        """Get dashboard model by UID, None when it does not exist (404)"""
+        try:
+            return (await self.get_dashboard(uid))['dashboard']
+        except GrafanaClientError as e:
+            # Refused or failed lookups are not a missing object
+            if e.status_code != 404:
+                raise
+            return None
@@ -1,8 +1,14 @@
 from typing import Dict, List, Optional, Union
-from core.api.base import GrafanaAPIClient
+
+from grafana_client.client import GrafanaClientError
+
+from core.api.base import AsyncGrafanaAPIClient, GrafanaAPIClient
 from core.json_parser.parser import apply_patch
+from core.metrics import instrumented
+from core.sync import DATASOURCE_VOLATILE_KEYS, same_content
 
 
+@instrumented('datasource')
 class GrafanaDataSourceManager:
     """Manager for Grafana data sources using grafana-client"""
 
@@ -26,13 +32,31 @@ class GrafanaDataSourceManager:
         uid: str,
         patch_operations: list[dict],
         target_service: Optional['GrafanaDataSourceManager'] = None
-    ) -> Dict:
+    ) -> Optional[Dict]:
+        """
+        Patches data source and pushes it to target_service (or back).
+        Returns None without writing when the target copy already
+        has the patched content
+        """
         datasource = self.get_datasource(uid)
         patched = apply_patch(datasource, patch_operations)
-        
+
         target = target_service if target_service else self
+        current = datasource if target is self else target.find_datasource(uid)
+        if current is not None and same_content(current, patched, DATASOURCE_VOLATILE_KEYS):
+            return None
         return target.update_datasource(uid, patched)
 
+    def find_datasource(self, uid: str) -> Optional[Dict]:
+        """Get data source by UID, None when it does not exist (404)"""
+        try:
+            return self.get_datasource(uid)
+        except GrafanaClientError as e:
+            # Refused or failed lookups are not a missing object
+            if e.status_code != 404:
+                raise
+            return None
+
     def create_datasource(self, datasource_config: Dict) -> Dict:
         """
         Create a new data source
@@ -113,4 +137,136 @@ class GrafanaDataSourceManager:
         permissions: Dict
     ) -> Dict:
         """Update data source permissions by UID"""
-        return self.api.client.datasource.update_datasource_permissions(uid, permissions)
\ No newline at end of file
+        return self.api.client.datasource.update_datasource_permissions(uid, permissions)
+
+
+@instrumented('datasource')
+class AsyncGrafanaDataSourceManager:
+    """Async manager for Grafana data sources, mirrors GrafanaDataSourceManager"""
+
+    def __init__(self, api_client: AsyncGrafanaAPIClient):
+        self.api = api_client
+
+    async def get_datasource(self, uid: str) -> Dict:
+        """Get data source by UID"""
+        return await self.api.client.datasource.get_datasource_by_uid(uid)
+
+    async def get_datasource_by_id(self, id: int) -> Dict:
+        """Get data source by ID"""
+        return await self.api.client.datasource.get_datasource_by_id(id)
+
+    async def get_datasource_by_name(self, name: str) -> Dict:
+        """Get data source by name"""
+        return await self.api.client.datasource.get_datasource_by_name(name)
+
+    async def transfer_datasource(
+        self,
+        uid: str,
+        patch_operations: list[dict],
+        target_service: Optional['AsyncGrafanaDataSourceManager'] = None
+    ) -> Optional[Dict]:
+        """
+        Patches data source and pushes it to target_service (or back).
+        Returns None without writing when the target copy already
+        has the patched content
+        """
+        datasource = await self.get_datasource(uid)
+        patched = apply_patch(datasource, patch_operations)
+
+        target = target_service if target_service else self
+        current = datasource if target is self else await target.find_datasource(uid)
+        if current is not None and same_content(current, patched, DATASOURCE_VOLATILE_KEYS):
+            return None
+        return await target.update_datasource(uid, patched)
+
+    async def find_datasource(self, uid: str) -> Optional[Dict]:
+        """Get data source by UID, None when it does not exist (404)"""
+        try:
+            return await self.get_datasource(uid)
+        except GrafanaClientError as e:
+            # Refused or failed lookups are not a missing object
+            if e.status_code != 404:
+                raise
+            return None
+
+    async def create_datasource(self, datasource_config: Dict) -> Dict:
+        """
+        Create a new data source
+        Args:
+            datasource_config: Complete data source configuration including:
+                - name: (str) Data source name
+                - type: (str) Data source type (prometheus, graphite, etc.)
+                - access: (str) Proxy or Direct
+                - url: (str) Data source URL
+                - (plus type-specific settings)
+        """
+        return await self.api.client.datasource.create_datasource(datasource_config)
+
+    async def update_datasource(self, uid: str, datasource_config: Dict) -> Dict:
+        """Update existing data source by UID"""
+        return await self.api.client.datasource.update_datasource_by_uid(uid, datasource_config)
+
+    async def delete_datasource(self, uid: str) -> Dict:
+        """Delete data source by UID"""
+        return await self.api.client.datasource.delete_datasource_by_uid(uid)
+
+    async def delete_datasource_by_name(self, name: str) -> Dict:
+        """Delete data source by name"""
+        return await self.api.client.datasource.delete_datasource_by_name(name)
+
+    async def list_datasources(self) -> List[Dict]:
+        """List all data sources"""
+        return await self.api.client.datasource.list_datasources()
+
+    async def query_datasource(
+        self,
+        uid: str,
+        query: Dict,
+        time_range: Optional[Dict] = None
+    ) -> Union[Dict, List]:
+        """
+        Query a data source directly
+        Args:
+            uid: Data source UID
+            query: Query specific to the data source type
+            time_range: Optional dict with 'from' and 'to' timestamps
+        """
+        return await self.api.client.datasource.query(uid, query, time_range)
+
+    async def get_datasource_health(self, uid: str) -> Dict:
+        """Check data source health by UID"""
+        return await self.api.client.datasource.health(uid)
+
+    async def get_datasource_id_by_uid(self, uid: str) -> int:
+        """Get data source ID by UID"""
+        return (await self.get_datasource(uid))["id"]
+
+    async def enable_datasource(self, uid: str) -> bool:
+        """Enable a data source"""
+        config = await self.get_datasource(uid)
+        config["isEnabled"] = True
+        await self.update_datasource(uid, config)
+        return True
+
+    async def disable_datasource(self, uid: str) -> bool:
+        """Disable a data source"""
+        config = await self.get_datasource(uid)
+        config["isEnabled"] = False
+        await self.update_datasource(uid, config)
+        return True
+
+    async def test_datasource(self, uid: str) -> Dict:
+        """Test data source connection by UID"""
+        return await self.api.client.datasource.test_datasource_by_uid(uid)
+
+    async def get_datasource_permissions(self, uid: str) -> Dict:
+        """Get data source permissions by UID"""
+        return await self.api.client.datasource.get_datasource_permissions(uid)
+
+    async def update_datasource_permissions(
+        self,
+        uid: str,
+        permissions: Dict
+    ) -> Dict:
+        """Update data source permissions by UID"""
+        return await self.api.client.datasource.update_datasource_permissions(uid, permissions)
@@ -0,0 +1,295 @@
+import asyncio
+import random
+import time
+from threading import Condition, Lock
+from typing import Any, Dict, Optional
+
+import niquests
+from niquests.exceptions import ConnectionError, Timeout
+
+from core.metrics import METRICS, SIZE_BUCKETS
+
+# Responses worth retrying and, of those, the ones signalling overload
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+OVERLOAD_STATUSES = frozenset({429, 503})
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+
+
+class TokenBucket:
+    """
+    Token bucket allowing rate requests per second on average and
+    bursts of up to burst requests. Unlimited when rate is None
+    """
+
+    def __init__(self, rate: Optional[float] = None, burst: int = 10):
+        if rate is not None and rate <= 0:
+            raise ValueError("Rate must be positive")
+        if burst < 1:
+            raise ValueError("Burst must be positive")
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = Lock()
+
+    def reserve(self) -> float:
+        """Takes a token, returns how many seconds to wait before using it"""
+        if self.rate is None:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            # A negative balance is paid back by the refill while waiting
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD window of requests in flight: grows by one for every window
+    of successful requests, halves when the instance signals overload.
+    Overload reported by requests started before the last decrease is
+    ignored, so one burst of 429s halves the window only once
+    """
+
+    def __init__(self, maximum: int = 16, minimum: int = 1):
+        if minimum < 1 or maximum < minimum:
+            raise ValueError("Concurrency bounds must satisfy 1 <= minimum <= maximum")
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(maximum)
+        self._in_flight = 0
+        self._epoch = 0
+        self._condition = Condition()
+
+    def try_acquire(self) -> Optional[int]:
+        """Takes a slot if one is free, returns its ticket or None"""
+        with self._condition:
+            if self._in_flight >= int(self.limit):
+                return None
+            self._in_flight += 1
+            return self._epoch
+
+    def acquire(self) -> int:
+        """Waits for a free slot, returns its ticket for release"""
+        with self._condition:
+            while self._in_flight >= int(self.limit):
+                self._condition.wait()
+            self._in_flight += 1
+            return self._epoch
+
+    async def acquire_async(self) -> int:
+        """acquire for event loops, polls instead of blocking the loop"""
+        while True:
+            ticket = self.try_acquire()
+            if ticket is not None:
+                return ticket
+            await asyncio.sleep(0.01)
+
+    def release(self, ticket: int, overloaded: bool = False) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            if not overloaded:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            elif ticket == self._epoch:
+                self.limit = max(self.minimum, self.limit / 2)
+                self._epoch += 1
+            self._condition.notify_all()
+
+
+class InstanceThrottle:
+    """
+    Backpressure for one Grafana instance: rate limit, adaptive
+    concurrency and retries with full-jitter exponential backoff.
+    Only idempotent requests are retried
+    """
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        burst: int = 10,
+        max_concurrency: int = 16,
+        retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0
+    ):
+        if retries < 0:
+            raise ValueError("Retries must not be negative")
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = AdaptiveConcurrency(max_concurrency)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def after(
+        self,
+        method: str,
+        attempt: int,
+        ticket: int,
+        response: Any = None,
+        error: Optional[BaseException] = None
+    ) -> Optional[float]:
+        """
+        Releases the request slot and reports the outcome to the
+        concurrency window. Returns the delay before retrying,
+        or None when the response (or error) is final
+        """
+        status = getattr(response, 'status_code', None)
+        overloaded = isinstance(error, Timeout) or status in OVERLOAD_STATUSES
+        self.concurrency.release(ticket, overloaded)
+        if METRICS.enabled:
+            self._measure(method.upper(), response, error)
+
+        retryable = error is not None or status in RETRY_STATUSES
+        if not retryable or attempt >= self.retries or method.upper() not in IDEMPOTENT_METHODS:
+            return None
+        METRICS.increment('http_retries_total', method=method.upper())
+        return self.delay(attempt, response)
+
+    def _measure(self, method: str, response: Any, error: Optional[BaseException]) -> None:
+        """Records status and bytes sent/received of one attempt"""
+        if response is None:
+            METRICS.increment('http_responses_total', method=method, status=type(error).__name__)
+            return
+        METRICS.increment('http_responses_total', method=method, status=str(response.status_code))
+        body = getattr(getattr(response, 'request', None), 'body', None)
+        METRICS.observe('http_request_bytes', len(body) if body else 0, SIZE_BUCKETS, method=method)
+        # content is a coroutine on async responses, read what was received
+        content = getattr(response, '_content', None)
+        received = len(content) if isinstance(content, bytes) else int(response.headers.get('Content-Length') or 0)
+        METRICS.observe('http_response_bytes', received, SIZE_BUCKETS, method=method)
+        METRICS.observe('concurrency_limit', self.concurrency.limit, (1, 2, 4, 8, 16, 32, 64, 128))
+
+    def delay(self, attempt: int, response: Any = None) -> float:
+        """Retry-After when the instance sent one, otherwise jittered backoff"""
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                return min(self.max_backoff, float(retry_after))
+            except ValueError:
+                # HTTP-date form, fall back to backoff
+                pass
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+
+class ThrottledSession(niquests.Session):
+    """niquests session sending every request through an InstanceThrottle"""
+
+    def __init__(self, throttle: InstanceThrottle, **kwargs):
+        super().__init__(**kwargs)
+        self.throttle = throttle
+
+    def request(self, method, url, *args, **kwargs):
+        attempt = 0
+        while True:
+            time.sleep(self.throttle.bucket.reserve())
+            ticket = self.throttle.concurrency.acquire()
+            response = error = None
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except (Timeout, ConnectionError) as e:
+                error = e
+            finally:
+                if response is None and error is None:
+                    # Any other error, or cancellation, is final: only the slot is returned
+                    self.throttle.concurrency.release(ticket)
+            delay = self.throttle.after(method, attempt, ticket, response, error)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return response
+            time.sleep(delay)
+            attempt += 1
+
+
+class AsyncThrottledSession(niquests.AsyncSession):
+    """asyncio counterpart of ThrottledSession"""
+
+    def __init__(self, throttle: InstanceThrottle, **kwargs):
+        super().__init__(**kwargs)
+        self.throttle = throttle
+
+    async def request(self, method, url, *args, **kwargs):
+        attempt = 0
+        while True:
+            await asyncio.sleep(self.throttle.bucket.reserve())
+            ticket = await self.throttle.concurrency.acquire_async()
+            response = error = None
+            try:
+                response = await super().request(method, url, *args, **kwargs)
+            except (Timeout, ConnectionError) as e:
+                error = e
+            finally:
+                if response is None and error is None:
+                    # Any other error, or cancellation, is final: only the slot is returned
+                    self.throttle.concurrency.release(ticket)
+            delay = self.throttle.after(method, attempt, ticket, response, error)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return response
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+class ThrottleRegistry:
+    """
+    Process-wide InstanceThrottle per Grafana URL, so every client
+    and manager talking to one instance shares its limits
+    """
+
+    rate: Optional[float] = None
+    burst: int = 10
+    max_concurrency: int = 16
+    retries: int = 3
+
+    _lock = Lock()
+    _throttles: Dict[str, InstanceThrottle] = {}
+
+    @classmethod
+    def configure(
+        cls,
+        rate: Optional[float] = None,
+        burst: int = 10,
+        max_concurrency: int = 16,
+        retries: int = 3
+    ) -> None:
+        """Sets limits for instances first used from now on"""
+        # Validates the options before they are stored
+        InstanceThrottle(rate, burst, max_concurrency, retries)
+        cls.rate = rate
+        cls.burst = burst
+        cls.max_concurrency = max_concurrency
+        cls.retries = retries
+
+    @classmethod
+    def get(cls, url: str) -> InstanceThrottle:
+        key = url.rstrip('/')
+        with cls._lock:
+            throttle = cls._throttles.get(key)
+            if throttle is None:
+                throttle = cls._throttles[key] = InstanceThrottle(
+                    cls.rate, cls.burst, cls.max_concurrency, cls.retries
+                )
+            return throttle
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            cls._throttles.clear()
+
+    @classmethod
+    def session(cls, url: str, default: niquests.Session, **kwargs) -> ThrottledSession:
+        """Replaces grafana-client's session with a throttled one for url"""
+        session = ThrottledSession(cls.get(url), **kwargs)
+        session.headers.update(default.headers)
+        default.close()
+        return session
+
+    @classmethod
+    def async_session(cls, url: str, default: niquests.AsyncSession, **kwargs) -> AsyncThrottledSession:
+        """session for AsyncGrafanaApi; the unused default holds no connections"""
+        session = AsyncThrottledSession(cls.get(url), **kwargs)
+        session.headers.update(default.headers)
+        return session
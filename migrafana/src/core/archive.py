@@ -0,0 +1,233 @@
+import gzip
+import io
+import json
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, Optional, Set
+
+from core.files import atomic_path
+from core.json_parser.parser import CompiledPatch
+from core.migration import DashboardMigrationResult, MigrationReport, build_dashboard_payload
+
+KIND_DASHBOARD = 'dashboard'
+KIND_DATASOURCE = 'datasource'
+
+
+def open_archive(path: str, mode: str = 'r') -> IO[str]:
+    """
+    Opens NDJSON archive as text, compressed by file extension:
+    .gz with gzip, .zst with zstandard (optional dependency).
+    mode is 'r', 'w' or 'a'; compressed appends add a new stream
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, f'{mode}t', encoding='utf-8')
+    if path.endswith('.zst'):
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("zstd archives require the zstandard package")
+        return zstandard.open(path, f'{mode}t', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def read_archive(path: str, kind: Optional[str] = None) -> Iterator[Dict]:
+    """
+    Lazily yields archive records ({'kind', 'uid', 'data'}), optionally
+    only those of one kind. A truncated last line is ignored
+    """
+    for line in complete_lines(path):
+        record = json.loads(line)
+        if kind is None or record['kind'] == kind:
+            yield record
+
+
+def complete_lines(path: str) -> Iterator[str]:
+    """Lines of an archive up to the first one cut off by an interrupted export"""
+    with open_archive(path) as archive:
+        try:
+            for line in archive:
+                if not line.endswith('\n'):
+                    return
+                yield line
+        except EOFError:
+            # Compressed stream cut off by an interrupted export
+            return
+
+
+def archived_uids(path: str, kind: str) -> Set[str]:
+    """UIDs of objects of kind already in archive, empty if it does not exist"""
+    if not os.path.exists(path):
+        return set()
+    return {record['uid'] for record in read_archive(path, kind)}
+
+
+class ArchiveWriter:
+    """Writes objects to NDJSON archive, one record per line"""
+
+    def __init__(self, path: str, append: bool = False):
+        if append and os.path.exists(path):
+            if path.endswith(('.gz', '.zst')):
+                self._recompress_complete_lines(path)
+            else:
+                self._drop_partial_line(path)
+        self._file = open_archive(path, 'a' if append else 'w')
+
+    def write(self, kind: str, uid: str, data: Any) -> None:
+        self._file.write(json.dumps(
+            {'kind': kind, 'uid': uid, 'data': data},
+            separators=(',', ':'),
+            ensure_ascii=False
+        ))
+        self._file.write('\n')
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> 'ArchiveWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @staticmethod
+    def _recompress_complete_lines(path: str) -> None:
+        """
+        Rewrites a compressed archive with its complete lines only.
+        A stream cut off by an interrupted export cannot be truncated
+        like a plain file, and one appended after it would make every
+        later line unreadable
+        """
+        with atomic_path(path) as tmp, open_archive(tmp, 'w') as output:
+            output.writelines(complete_lines(path))
+
+    @staticmethod
+    def _drop_partial_line(path: str, chunk_size: int = 64 * 1024) -> None:
+        """Truncates a line left incomplete by an interrupted export"""
+        with open(path, 'rb+') as f:
+            end = f.seek(0, io.SEEK_END)
+            position = end
+            while position > 0:
+                start = max(0, position - chunk_size)
+                f.seek(start)
+                chunk = f.read(position - start)
+                newline = chunk.rfind(b'\n')
+                if newline != -1:
+                    position = start + newline + 1
+                    break
+                position = start
+            if position != end:
+                f.truncate(position)
+
+
+def export_dashboards(
+    manager: Any,
+    uids: Iterable[str],
+    writer: ArchiveWriter,
+    workers: int = 8,
+    skip: Optional[Set[str]] = None,
+    on_progress: Optional[Callable[[DashboardMigrationResult, int, int], None]] = None
+) -> MigrationReport:
+    """
+    Fetches dashboards concurrently and writes them in uids order.
+    At most twice workers dashboards are held in memory at once,
+    so memory stays flat for any number of dashboards.
+    UIDs in skip (e.g. from archived_uids when resuming) are not fetched
+    """
+    uids = [uid for uid in uids if not skip or uid not in skip]
+    report = MigrationReport(total=len(uids))
+
+    def write_next(pending: deque) -> None:
+        uid, future = pending.popleft()
+        error = future.exception()
+        if error is None:
+            writer.write(KIND_DASHBOARD, uid, future.result())
+        result = DashboardMigrationResult(
+            uid=uid,
+            ok=error is None,
+            error=None if error is None else f"{type(error).__name__}: {error}"
+        )
+        report.results.append(result)
+        if on_progress:
+            on_progress(result, len(report.results), report.total)
+
+    with ThreadPoolExecutor(workers) as pool:
+        pending: deque = deque()
+        for uid in uids:
+            pending.append((uid, pool.submit(manager.get_dashboard, uid)))
+            if len(pending) >= workers * 2:
+                write_next(pending)
+        while pending:
+            write_next(pending)
+
+    return report
+
+
+def export_datasources(
+    manager: Any,
+    writer: ArchiveWriter,
+    skip: Optional[Set[str]] = None
+) -> int:
+    """Writes every datasource of the instance, returns how many were written"""
+    written = 0
+    for datasource in manager.list_datasources():
+        if skip and datasource['uid'] in skip:
+            continue
+        writer.write(KIND_DATASOURCE, datasource['uid'], datasource)
+        written += 1
+    return written
+
+
+def import_archive(
+    path: str,
+    dashboard_manager: Optional[Any] = None,
+    datasource_manager: Optional[Any] = None,
+    dashboard_patch: Optional[CompiledPatch] = None,
+    datasource_patch: Optional[CompiledPatch] = None,
+    workers: int = 4,
+    on_progress: Optional[Callable[[DashboardMigrationResult, int, int], None]] = None
+) -> MigrationReport:
+    """
+    Reads archive lazily and pushes its objects with at most workers
+    writes in flight: dashboards through dashboard_manager.update_dashboard,
+    datasources through datasource_manager.create_datasource. Kinds
+    without a manager are skipped. A failing object does not stop the import
+    """
+    # The total is unknown until the archive has been read
+    report = MigrationReport(total=0)
+
+    def push(record: Dict) -> Any:
+        if record['kind'] == KIND_DASHBOARD:
+            payload = build_dashboard_payload(record['data'], dashboard_patch)
+            return dashboard_manager.update_dashboard(payload)
+        datasource = {k: v for k, v in record['data'].items() if k != 'id'}
+        if datasource_patch:
+            datasource = datasource_patch.apply(datasource)
+        return datasource_manager.create_datasource(datasource)
+
+    def finish_next(pending: deque) -> None:
+        uid, future = pending.popleft()
+        error = future.exception()
+        result = DashboardMigrationResult(
+            uid=uid,
+            ok=error is None,
+            error=None if error is None else f"{type(error).__name__}: {error}"
+        )
+        report.results.append(result)
+        if on_progress:
+            on_progress(result, len(report.results), report.total)
+
+    managers = {KIND_DASHBOARD: dashboard_manager, KIND_DATASOURCE: datasource_manager}
+    with ThreadPoolExecutor(workers) as pool:
+        pending: deque = deque()
+        for record in read_archive(path):
+            if managers.get(record['kind']) is None:
+                continue
+            report.total += 1
+            pending.append((record['uid'], pool.submit(push, record)))
+            if len(pending) >= workers:
+                finish_next(pending)
+        while pending:
+            finish_next(pending)
+
+    return report
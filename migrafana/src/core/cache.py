@@ -0,0 +1,292 @@
+import hashlib
+import json
+import os
+import time
+from collections import Counter
+from copy import deepcopy
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+from grafana_client.client import GrafanaClientError
+
+from core.files import write_atomic
+from core.metrics import METRICS
+
+
+class DashboardCache:
+    """
+    On-disk dashboard cache. Bodies are stored once per content hash
+    under objects/, index.json maps (instance, uid) to the version,
+    updated timestamp and hash of the cached copy. The least recently
+    used entries are evicted when objects exceed max_bytes
+    """
+
+    INDEX_FILE = 'index.json'
+
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._objects = os.path.join(directory, 'objects')
+        self._lock = Lock()
+        os.makedirs(self._objects, exist_ok=True)
+        self._index: Dict[str, Dict] = self._load_index()
+        self._dirty = False
+
+    @staticmethod
+    def key(instance: str, uid: str) -> str:
+        return f"{instance.rstrip('/')}|{uid}"
+
+    def get(
+        self,
+        instance: str,
+        uid: str,
+        version: Optional[int] = None,
+        updated: Optional[str] = None
+    ) -> Optional[Dict]:
+        """
+        Cached dashboard if it is still current, otherwise None.
+        The copy is current when the given version and updated match
+        the cached ones; without either of them nothing can be validated
+        """
+        if version is None and updated is None:
+            return None
+
+        with self._lock:
+            entry = self._index.get(self.key(instance, uid))
+            if entry is None:
+                return None
+            if version is not None and entry['version'] != version:
+                return None
+            if updated is not None and entry['updated'] != updated:
+                return None
+            try:
+                with open(self._object_path(entry['hash']), 'rb') as f:
+                    content = f.read()
+            except FileNotFoundError:
+                del self._index[self.key(instance, uid)]
+                self._dirty = True
+                return None
+            entry['last_used'] = time.time()
+            self._dirty = True
+
+        return json.loads(content)
+
+    def put(self, instance: str, uid: str, dashboard: Dict) -> str:
+        """Stores get_dashboard response, returns its content hash"""
+        content = json.dumps(dashboard, sort_keys=True, separators=(',', ':')).encode()
+        digest = hashlib.sha256(content).hexdigest()
+
+        with self._lock:
+            path = self._object_path(digest)
+            if not os.path.exists(path):
+                write_atomic(path, content)
+
+            self._index[self.key(instance, uid)] = {
+                'version': dashboard.get('dashboard', {}).get('version'),
+                'updated': dashboard.get('meta', {}).get('updated'),
+                'hash': digest,
+                'size': len(content),
+                'last_used': time.time(),
+            }
+            self._dirty = True
+            self._evict()
+
+        return digest
+
+    def flush(self) -> None:
+        """Writes the index to disk"""
+        with self._lock:
+            if not self._dirty:
+                return
+            path = os.path.join(self.directory, self.INDEX_FILE)
+            write_atomic(path, json.dumps(self._index))
+            self._dirty = False
+
+    def _load_index(self) -> Dict[str, Dict]:
+        try:
+            with open(os.path.join(self.directory, self.INDEX_FILE)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self._objects, f"{digest}.json")
+
+    def _evict(self) -> None:
+        """Drops least recently used entries until objects fit max_bytes"""
+        # Objects are shared by identical dashboards, count references
+        references = Counter(entry['hash'] for entry in self._index.values())
+        sizes = {entry['hash']: entry['size'] for entry in self._index.values()}
+        total = sum(sizes.values())
+        if total <= self.max_bytes:
+            return
+
+        by_age = sorted(self._index.items(), key=lambda item: item[1]['last_used'])
+        for key, entry in by_age:
+            if total <= self.max_bytes:
+                break
+            del self._index[key]
+            references[entry['hash']] -= 1
+            if not references[entry['hash']]:
+                total -= entry['size']
+                try:
+                    os.remove(self._object_path(entry['hash']))
+                except FileNotFoundError:
+                    pass
+
+
+class CachingDashboardManager:
+    """
+    Wraps a dashboard manager so get_dashboard is served from a
+    DashboardCache when the dashboard's current version, asked with
+    get_dashboard_version (a small response, unlike the dashboard),
+    matches the cached copy. Search hits carry no version to check.
+    When the versions endpoint is refused, e.g. to a read-only token,
+    dashboards are fetched without the cache. Every other method is
+    passed through to the wrapped manager
+    """
+
+    def __init__(self, manager: Any, cache: DashboardCache, instance: str):
+        self.manager = manager
+        self.cache = cache
+        self.instance = instance
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.manager, name)
+
+    def get_dashboard(self, uid: str) -> dict:
+        """Get dashboard by UID, from cache when it is still current"""
+        try:
+            version = self.manager.get_dashboard_version(uid)
+        except GrafanaClientError:
+            return self.manager.get_dashboard(uid)
+        cached = self.cache.get(self.instance, uid, version=version)
+        if cached is not None:
+            return cached
+
+        dashboard = self.manager.get_dashboard(uid)
+        self.cache.put(self.instance, uid, dashboard)
+        return dashboard
+
+
+class DataSourceCatalog:
+    """
+    In-memory index of an instance's data sources by uid, id and name,
+    loaded with a single list_datasources call. Entries are the ones
+    list_datasources returns, which leave out version and secure fields.
+    The catalog reloads when it is older than ttl seconds (never when
+    ttl is None), or on refresh
+    """
+
+    def __init__(self, manager: Any, ttl: Optional[float] = 300):
+        self.manager = manager
+        self.ttl = ttl
+        self.loaded: Optional[float] = None
+        self._lock = Lock()
+        self._datasources: List[Dict] = []
+        # field -> {value: data source}
+        self._indexes: Dict[str, Dict[Any, Dict]] = {}
+
+    def refresh(self) -> None:
+        """Reloads every data source now"""
+        datasources = self.manager.list_datasources()
+        with self._lock:
+            self._load(datasources)
+
+    def invalidate(self) -> None:
+        """Makes the next lookup reload the catalog"""
+        with self._lock:
+            self.loaded = None
+
+    def datasources(self) -> List[Dict]:
+        self._ensure_loaded()
+        return deepcopy(self._datasources)
+
+    def by_uid(self, uid: str) -> Optional[Dict]:
+        return self._lookup('uid', uid)
+
+    def by_id(self, id: int) -> Optional[Dict]:
+        try:
+            return self._lookup('id', int(id))
+        except (TypeError, ValueError):
+            return None
+
+    def by_name(self, name: str) -> Optional[Dict]:
+        return self._lookup('name', name)
+
+    def _lookup(self, field: str, value: Any) -> Optional[Dict]:
+        """Copy of the indexed entry, so callers may modify it"""
+        self._ensure_loaded()
+        entry = self._indexes[field].get(value)
+        METRICS.increment('datasource_catalog_lookups_total', result='miss' if entry is None else 'hit')
+        return None if entry is None else deepcopy(entry)
+
+    def _ensure_loaded(self) -> None:
+        with self._lock:
+            if self.loaded is not None and (self.ttl is None or time.monotonic() - self.loaded < self.ttl):
+                return
+            # Loaded under the lock, so concurrent lookups share one call
+            self._load(self.manager.list_datasources())
+
+    def _load(self, datasources: List[Dict]) -> None:
+        self._datasources = datasources
+        self._indexes = {
+            field: {ds[field]: ds for ds in datasources if field in ds}
+            for field in ('uid', 'id', 'name')
+        }
+        self.loaded = time.monotonic()
+
+
+class CachingDataSourceManager:
+    """
+    Wraps a data source manager so list_datasources and id lookups are
+    served from a DataSourceCatalog, and catalog lookups by uid, id and
+    name are available as find_datasource*. Catalog entries are list
+    entries, without version, secureJsonFields or every jsonData field,
+    so the get_datasource* getters still fetch the full object from the
+    wrapped manager, safe to modify and pass to update_datasource.
+    Writes go to the wrapped manager and invalidate the catalog; every
+    other method is passed through
+    """
+
+    WRITES = (
+        'create_datasource', 'update_datasource', 'delete_datasource', 'delete_datasource_by_name',
+        'enable_datasource', 'disable_datasource', 'transfer_datasource',
+    )
+
+    def __init__(self, manager: Any, ttl: Optional[float] = 300):
+        self.manager = manager
+        self.catalog = DataSourceCatalog(manager, ttl)
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.manager, name)
+        if name not in self.WRITES:
+            return attr
+
+        def write(*args, **kwargs):
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                self.catalog.invalidate()
+        return write
+
+    def list_datasources(self) -> List[Dict]:
+        """List all data sources"""
+        return self.catalog.datasources()
+
+    def find_datasource(self, uid: str) -> Optional[Dict]:
+        """Catalog entry of a data source by UID, None when missing"""
+        return self.catalog.by_uid(uid)
+
+    def find_datasource_by_id(self, id: int) -> Optional[Dict]:
+        """Catalog entry of a data source by ID, None when missing"""
+        return self.catalog.by_id(id)
+
+    def find_datasource_by_name(self, name: str) -> Optional[Dict]:
+        """Catalog entry of a data source by name, None when missing"""
+        return self.catalog.by_name(name)
+
+    def get_datasource_id_by_uid(self, uid: str) -> int:
+        """Get data source ID by UID"""
+        datasource = self.catalog.by_uid(uid)
+        return datasource["id"] if datasource is not None else self.manager.get_datasource_id_by_uid(uid)
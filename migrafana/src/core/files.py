@@ -0,0 +1,31 @@
+import os
+from contextlib import contextmanager
+from typing import Iterator, Union
+
+
+@contextmanager
+def atomic_path(path: str) -> Iterator[str]:
+    """
+    Temporary path next to path, moved over it when the block completes
+    and removed when it raises, so readers never see a partly written
+    file. The name keeps the extension, which selects the compression
+    of archives
+    """
+    tmp = os.path.join(os.path.dirname(path), f".{os.getpid()}.tmp.{os.path.basename(path)}")
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def write_atomic(path: str, content: Union[str, bytes]) -> None:
+    """Writes text (as UTF-8) or bytes to path atomically"""
+    with atomic_path(path) as tmp:
+        if isinstance(content, bytes):
+            with open(tmp, 'wb') as f:
+                f.write(content)
+        else:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(content)
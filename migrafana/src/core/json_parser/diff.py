@@ -0,0 +1,147 @@
+from collections import Counter
+from threading import Lock
+from typing import Any, Dict, List, Tuple, Union
+
+from core.json_parser.parser import JSONPathResolver
+
+
+class JSONDiffer:
+    """Computes minimal RFC 6902 patches between two documents"""
+
+    @staticmethod
+    def diff(original: Any, patched: Any) -> List[Dict]:
+        """
+        Returns JSON Patch turning original into patched.
+        Subtrees shared by identity (as left by structural sharing) are
+        skipped without being visited; other equal subtrees are skipped
+        after one native equality check
+        """
+        operations: List[Dict] = []
+        JSONDiffer._diff(original, patched, [], operations)
+        return operations
+
+    @staticmethod
+    def _diff(
+        original: Any,
+        patched: Any,
+        path: List[Union[int, str]],
+        operations: List[Dict]
+    ) -> None:
+        if original is patched:
+            return
+
+        if isinstance(original, dict) and isinstance(patched, dict):
+            for key in original:
+                if key not in patched:
+                    operations.append({'op': 'remove', 'path': JSONPathResolver.build_path(path + [key])})
+            for key, value in patched.items():
+                if key not in original:
+                    operations.append({
+                        'op': 'add',
+                        'path': JSONPathResolver.build_path(path + [key]),
+                        'value': value
+                    })
+                elif not JSONDiffer._same(original[key], value):
+                    JSONDiffer._diff(original[key], value, path + [key], operations)
+        elif isinstance(original, list) and isinstance(patched, list):
+            JSONDiffer._diff_list(original, patched, path, operations)
+        elif type(original) is not type(patched) or original != patched:
+            operations.append({
+                'op': 'replace',
+                'path': JSONPathResolver.build_path(path),
+                'value': patched
+            })
+
+    @staticmethod
+    def _diff_list(
+        original: List,
+        patched: List,
+        path: List[Union[int, str]],
+        operations: List[Dict]
+    ) -> None:
+        """
+        Trims the common prefix and suffix, so a single insert or remove
+        is one operation, then diffs the remaining items pairwise
+        """
+        limit = min(len(original), len(patched))
+        prefix = 0
+        while prefix < limit and JSONDiffer._same(original[prefix], patched[prefix]):
+            prefix += 1
+        suffix = 0
+        while suffix < limit - prefix and \
+                JSONDiffer._same(original[-1 - suffix], patched[-1 - suffix]):
+            suffix += 1
+
+        removed = original[prefix:len(original) - suffix]
+        added = patched[prefix:len(patched) - suffix]
+        common = min(len(removed), len(added))
+
+        for i in range(common):
+            JSONDiffer._diff(removed[i], added[i], path + [prefix + i], operations)
+        # Highest index first, so earlier removes do not shift later ones
+        for i in reversed(range(common, len(removed))):
+            operations.append({'op': 'remove', 'path': JSONPathResolver.build_path(path + [prefix + i])})
+        for i in range(common, len(added)):
+            operations.append({
+                'op': 'add',
+                'path': JSONPathResolver.build_path(path + [prefix + i]),
+                'value': added[i]
+            })
+
+    @staticmethod
+    def _same(original: Any, patched: Any) -> bool:
+        return original is patched or (type(original) is type(patched) and original == patched)
+
+
+class DiffSummary:
+    """
+    Aggregates diffs of many objects by operation and path shape
+    (list indices replaced by '*'), keeping only counters in memory
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self.objects = 0
+        self.changed = 0
+        # (op, path shape) -> objects affected / operations
+        self._objects: Counter = Counter()
+        self._operations: Counter = Counter()
+
+    def add(self, operations: List[Dict]) -> None:
+        """Records the diff of one object"""
+        shapes = Counter(
+            (operation['op'], DiffSummary.shape(operation['path']))
+            for operation in operations
+        )
+        with self._lock:
+            self.objects += 1
+            if operations:
+                self.changed += 1
+            self._objects.update(shapes.keys())
+            self._operations.update(shapes)
+
+    @staticmethod
+    def shape(path: str) -> str:
+        return '/'.join('*' if part.isdigit() else part for part in path.split('/'))
+
+    def entries(self) -> List[Tuple[str, str, int, int]]:
+        """(op, path shape, objects, operations), most widespread first"""
+        with self._lock:
+            return [
+                (op, shape, objects, self._operations[(op, shape)])
+                for (op, shape), objects in self._objects.most_common()
+            ]
+
+    def lines(self) -> List[str]:
+        lines = [
+            f"{op} {shape} in {objects} objects ({operations} changes)"
+            for op, shape, objects, operations in self.entries()
+        ]
+        lines.append(f"{self.changed} of {self.objects} objects would change")
+        return lines
+
+
+# Public API
+def diff(original: Any, patched: Any) -> List[Dict]:
+    """Public interface for computing a minimal JSON patch between documents"""
+    return JSONDiffer.diff(original, patched)
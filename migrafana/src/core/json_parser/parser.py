@@ -1,6 +1,121 @@
-from typing import Dict, List, Union, Any, Tuple
+from typing import Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Union, Any, Tuple, NamedTuple
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
 from copy import deepcopy
+from functools import lru_cache
+from itertools import chain, islice
+import operator
+import os
 import re
+import time
+
+from core.metrics import COUNT_BUCKETS, METRICS
+
+
+# Kinds of pre-tokenized path steps
+STEP_KEY = 'key'
+STEP_WILDCARD = '*'
+STEP_DESCENDANT = '**'
+STEP_SELECTOR = 'selector'
+
+# Process-wide bounds of compiled selectors and regular expressions,
+# shared by every patch and document in a run
+SELECTOR_CACHE_SIZE = 4096
+REGEX_CACHE_SIZE = 4096
+
+# Value of a key missing from a selector item
+_MISSING = object()
+
+
+class CompiledOperation(NamedTuple):
+    """Single patch operation with its path tokenized and selectors parsed"""
+    op: str
+    path: str
+    steps: Tuple[Tuple[str, Any], ...]
+    value: Any
+    source: Dict
+
+
+class PathHandle(NamedTuple):
+    """
+    Reference to a resolved location: the parent container and the key in it.
+    trail is a linked chain of (previous trail, key) pairs, so the string
+    path is only materialized when it is asked for
+    """
+    parent: Any
+    key: Union[int, str]
+    trail: Tuple
+
+    @property
+    def components(self) -> List[Union[int, str]]:
+        """Path components from the root down to this location"""
+        return PathHandle.unwind(self.trail)
+
+    @staticmethod
+    def unwind(trail: Tuple) -> List[Union[int, str]]:
+        """Converts linked trail into path components"""
+        components = []
+        while trail:
+            trail, key = trail
+            components.append(key)
+        components.reverse()
+        return components
+
+    @property
+    def path(self) -> str:
+        """JSON Pointer of this location"""
+        return JSONPathResolver.build_path(self.components)
+
+    @staticmethod
+    def from_components(
+        parent: Any,
+        components: List[Union[int, str]]
+    ) -> 'PathHandle':
+        """Builds handle for a parent already resolved from components"""
+        trail: Tuple = ()
+        for comp in components:
+            trail = (trail, comp)
+        return PathHandle(parent, components[-1], trail)
+
+
+class StepTrie(NamedTuple):
+    """
+    Paths of several operations merged on their common steps. ends are
+    the operations whose path ends at this node and within those whose
+    path continues below it, both as positions in the PatchGroup
+    """
+    ends: Tuple[int, ...]
+    within: Tuple[int, ...]
+    children: Tuple[Tuple[Tuple[str, Any], 'StepTrie'], ...]
+
+
+class PatchGroup(NamedTuple):
+    """
+    Consecutive operations of a patch whose paths resolve the same
+    before and after the others are applied (see JSONPathPatchPlanner),
+    so they are resolved in one walk over trie. trie is None for a
+    single operation
+    """
+    operations: Tuple[int, ...]
+    trie: Optional[StepTrie]
+
+
+class CompiledPatch(NamedTuple):
+    """
+    Immutable, reusable patch program produced by compile_patch.
+    Parsing is done once, so the same instance can be applied
+    to any number of documents.
+    """
+    operations: Tuple[CompiledOperation, ...]
+    groups: Tuple[PatchGroup, ...] = ()
+
+    def apply(
+        self,
+        data: Union[Dict, List],
+        in_place: bool = False
+    ) -> Union[Dict, List]:
+        """Applies the compiled operations, see JSONPathProcessor.apply_compiled"""
+        return JSONPathProcessor.apply_compiled(data, self, in_place)
 
 
 class JSONPathProcessor:
@@ -9,33 +124,412 @@ class JSONPathProcessor:
     @staticmethod
     def apply_patch(
         data: Union[Dict, List],
-        patch: List[Dict]
+        patch: Union[List[Dict], CompiledPatch],
+        in_place: bool = False
     ) -> Union[Dict, List]:
         """
         Applies RFC 6902 JSON Patch operations with selector support
         """
-        result = deepcopy(data)
+        if not isinstance(patch, CompiledPatch):
+            patch = JSONPathCompiler.compile(patch)
+        return patch.apply(data, in_place)
+
+    @staticmethod
+    def apply_compiled(
+        data: Union[Dict, List],
+        patch: CompiledPatch,
+        in_place: bool = False
+    ) -> Union[Dict, List]:
+        """
+        Applies a compiled patch.
+        By default only containers on the way to modified nodes are copied
+        and every untouched subtree is shared between data and the result,
+        so data itself is never modified (the result is data itself when
+        nothing was modified). With in_place=True data is
+        modified directly and returned, for callers that own the document
+        """
+        document = None if in_place else JSONPathCopyOnWrite(data)
+        index = JSONPathSelectorIndex()
+        result = data
+        measured = METRICS.enabled
+        if measured:
+            started = time.thread_time()
+
+        for group in patch.groups or JSONPathPatchPlanner.plan(patch.operations):
+            if measured:
+                resolving = time.thread_time()
+            resolved = JSONPathResolver.resolve_group(result, patch.operations, group, index)
+            if measured:
+                METRICS.observe('patch_resolve_cpu_seconds', time.thread_time() - resolving)
+
+            for i, handles in zip(group.operations, resolved):
+                operation = patch.operations[i]
+                try:
+                    # Resolution errors surface in operation order
+                    if isinstance(handles, ValueError):
+                        raise handles
+                    if operation.op in ('replace', 'remove') and len(handles) > 1 \
+                            and any(kind == STEP_DESCENDANT for kind, _ in operation.steps):
+                        handles = JSONPathResolver.outermost(handles)
+                    if operation.op in ('add', 'remove') and len(handles) > 1:
+                        handles = JSONPathResolver.last_first(handles)
+                    if measured:
+                        METRICS.observe('patch_paths_resolved', len(handles), COUNT_BUCKETS, op=operation.op)
+
+                    for handle in handles:
+                        if operation.op != 'test':
+                            index.invalidate(handle.components)
+                            if document is not None:
+                                handle = handle._replace(
+                                    parent=document.own_parent(handle.components)
+                                )
+                                result = document.root
+                        elif document is not None:
+                            # Resolved before earlier operations may have copied its parent
+                            handle = handle._replace(
+                                parent=JSONPathTraverser.resolve_path(result, handle.components)[0]
+                            )
+
+                        JSONPathOperator.apply_handle(
+                            handle,
+                            operation.op,
+                            JSONPathProcessor._value_for(operation)
+                        )
+                except ValueError as e:
+                    raise ValueError(f"Failed to process operation {operation.source}: {str(e)}")
+
+        if measured:
+            METRICS.observe('patch_cpu_seconds', time.thread_time() - started)
+        return result
+
+    @staticmethod
+    def _value_for(operation: CompiledOperation) -> Any:
+        """
+        Operation value to insert; containers are copied so the
+        compiled patch and the patched documents never share them
+        """
+        if operation.op != 'test' and isinstance(operation.value, (dict, list)):
+            return deepcopy(operation.value)
+        return operation.value
+
+
+class JSONPathSelectorIndex:
+    """
+    Lazy equality index for [?key==value] selectors, kept for one patch
+    application. The first such selector on a container indexes its
+    items by key; later operations of the patch reuse the index until a
+    modification at or around the container invalidates it
+    """
+
+    def __init__(self):
+        # container path -> (container, {key: {value: [matching keys]}})
+        self._entries: Dict[Tuple[str, ...], Tuple[Any, Dict[str, Dict[str, List]]]] = {}
+
+    @staticmethod
+    def indexable(selector: 'CompiledSelector') -> bool:
+        """Whether selector is a single top-level key == string comparison"""
+        return selector.equality is not None
+
+    def lookup(
+        self,
+        container: Union[Dict, List],
+        path: List[Union[int, str]],
+        key: str,
+        value: str
+    ) -> List[Union[int, str]]:
+        """Keys of container items whose key equals value, as the evaluator compares them"""
+        location = tuple(str(comp) for comp in path)
+        entry = self._entries.get(location)
+        if entry is None or entry[0] is not container:
+            entry = (container, {})
+            self._entries[location] = entry
+
+        by_value = entry[1].get(key)
+        if by_value is None:
+            by_value = {}
+            items = enumerate(container) if isinstance(container, list) else container.items()
+            for item_key, item in items:
+                if isinstance(item, dict) and key in item:
+                    by_value.setdefault(str(item[key]), []).append(item_key)
+            entry[1][key] = by_value
+
+        return list(by_value.get(value, ()))
+
+    def invalidate(self, components: List[Union[int, str]]) -> None:
+        """
+        Drops index data a modification at components may affect:
+        for an indexed ancestor, the key of its item that contains the
+        modification (or the whole index when an item itself is added,
+        removed or replaced); indexes of containers under the modified
+        location's parent, whose paths may have shifted
+        """
+        if not self._entries:
+            return
+        location = tuple(str(comp) for comp in components)
+        parent = location[:-1]
+        for path in list(self._entries):
+            if path[:len(parent)] == parent:
+                del self._entries[path]
+            elif location[:len(path)] == path:
+                depth = len(path)
+                if len(location) == depth + 1:
+                    del self._entries[path]
+                else:
+                    self._entries[path][1].pop(location[depth + 1], None)
+
+
+class JSONPathCopyOnWrite:
+    """
+    Structural sharing for patch application: containers of the
+    input document are copied lazily, only when a modification
+    reaches them, and the copies are linked into a new root
+    """
+
+    def __init__(self, data: Union[Dict, List]):
+        self.root = data
+        # Copies owned by the result, by id; holding them keeps ids unique
+        self._owned: Dict[int, Union[Dict, List]] = {}
+
+    def own_parent(self, components: List[Union[int, str]]) -> Any:
+        """
+        Makes every container from the root down to the parent of
+        components owned by the result and returns that parent
+        """
+        current = self.root = self._own(self.root)
+
+        for comp in components[:-1]:
+            child = JSONPathTraverser.child(current, comp)
+            owned = self._own(child)
+            if owned is not child:
+                if isinstance(current, list):
+                    current[int(comp)] = owned
+                else:
+                    current[comp] = owned
+            current = owned
+
+        return current
+
+    def _own(self, container: Any) -> Any:
+        """Returns shallow copy of container unless it is already owned"""
+        if id(container) in self._owned:
+            return container
+        if isinstance(container, dict):
+            copied: Union[Dict, List] = dict(container)
+        elif isinstance(container, list):
+            copied = list(container)
+        else:
+            return container
+        self._owned[id(copied)] = copied
+        return copied
+
+
+class JSONPathCompiler:
+    """Compiles patch operations into reusable CompiledPatch programs"""
+
+    @staticmethod
+    def compile(patch: List[Dict]) -> CompiledPatch:
+        """Tokenizes paths and parses selectors of every operation once"""
+        operations = []
 
         for operation in patch:
             op = operation['op']
             path = operation['path']
-            value = operation.get('value')
 
             try:
-                normalized_path = JSONPathNormalizer.normalize(path)
-                resolved_paths = JSONPathResolver.resolve(result, normalized_path)
-
-                for resolved_path in resolved_paths:
-                    JSONPathOperator.apply_operation(
-                        result,
-                        op,
-                        resolved_path,
-                        value
-                    )
+                steps = JSONPathCompiler.compile_path(JSONPathNormalizer.normalize(path))
             except ValueError as e:
                 raise ValueError(f"Failed to process operation {operation}: {str(e)}")
 
-        return result
+            operations.append(CompiledOperation(
+                op=op,
+                path=path,
+                steps=steps,
+                value=operation.get('value'),
+                source=operation
+            ))
+
+        return CompiledPatch(
+            operations=tuple(operations),
+            groups=JSONPathPatchPlanner.plan(operations)
+        )
+
+    @staticmethod
+    def compile_path(path: str) -> Tuple[Tuple[str, Any], ...]:
+        """
+        Converts path into a tuple of (kind, argument) steps:
+        - (STEP_KEY, key) for regular components, unescaped
+        - (STEP_WILDCARD, None) for '*'
+        - (STEP_DESCENDANT, None) for '**', repeats collapsed into one
+        - (STEP_SELECTOR, selector) for '[?...]', compiled
+        """
+        steps = []
+
+        for comp in JSONPathNormalizer.get_components(path):
+            if comp == '*':
+                steps.append((STEP_WILDCARD, None))
+            elif comp == '**':
+                if not steps or steps[-1][0] != STEP_DESCENDANT:
+                    steps.append((STEP_DESCENDANT, None))
+            elif JSONPathSelector.is_selector(comp):
+                selector = JSONPathConditionParser.compile(
+                    JSONPathSelector.extract(comp)
+                )
+                steps.append((STEP_SELECTOR, selector))
+            else:
+                steps.append((STEP_KEY, comp))
+
+        if steps and steps[-1][0] == STEP_DESCENDANT:
+            raise ValueError("'**' must be followed by another path component")
+        return tuple(steps)
+
+
+class JSONPathWriteTrie:
+    """
+    Paths modified by the operations of a group, merged on common
+    steps, to test a later operation against all of them in one walk.
+    Each instance is one node: the step that led to it was the last
+    step of a modification when ends is set. Selectors only matter by
+    the item keys they read, so selectors reading the same keys share
+    a node and a long run of [?id=='...'] paths stays one path
+    """
+
+    __slots__ = ('children', 'patterns', 'shifting', 'ends')
+
+    def __init__(self):
+        self.children: Dict[Tuple[str, Any], 'JSONPathWriteTrie'] = {}
+        # Children reached by '*' or a selector
+        self.patterns: List['JSONPathWriteTrie'] = []
+        # Keys where a modification may shift a list, when there are any
+        self.shifting: Optional[set] = None
+        self.ends = False
+
+    def add(self, steps: Tuple[Tuple[str, Any], ...], shifts: bool) -> None:
+        """Records a modification at steps; shifts when it may insert or remove"""
+        node = parent = self
+        for kind, arg in steps:
+            step = (kind, arg.keys if kind == STEP_SELECTOR else arg)
+            parent = node
+            node = parent.children.get(step)
+            if node is None:
+                node = parent.children[step] = JSONPathWriteTrie()
+                if kind != STEP_KEY:
+                    parent.patterns.append(node)
+        node.ends = True
+
+        kind, key = steps[-1]
+        if shifts and kind == STEP_KEY:
+            if parent.shifting is None:
+                parent.shifting = set()
+            parent.shifting.add(key)
+
+    def conflicts(self, steps: Tuple[Tuple[str, Any], ...]) -> bool:
+        """
+        Whether a recorded modification may change how steps resolve:
+        it is at or above a container steps walk through, adds to or
+        removes from a container steps expand with '*' or a selector,
+        changes an item key a selector compares, or shifts a list
+        index steps use
+        """
+        pending = [(self, 0)]
+        while pending:
+            node, depth = pending.pop()
+            kind, arg = steps[depth]
+            deeper = depth + 1 < len(steps)
+
+            if kind == STEP_KEY:
+                shifting = node.shifting
+                if shifting and (
+                    len(shifting) > (arg in shifting) if _index_like(arg)
+                    else any(_index_like(key) for key in shifting)
+                ):
+                    return True
+                # Other keys lead to other children, which cannot be met
+                same = node.children.get((STEP_KEY, arg))
+                candidates = node.patterns if same is None else node.patterns + [same]
+            else:
+                candidates = list(node.children.values())
+
+            for child in candidates:
+                if child.ends and (deeper or kind != STEP_KEY):
+                    return True
+                if kind == STEP_SELECTOR and (
+                    child.patterns or any((STEP_KEY, key) in child.children for key in arg.keys)
+                ):
+                    return True
+                if deeper:
+                    pending.append((child, depth + 1))
+        return False
+
+
+class JSONPathPatchPlanner:
+    """
+    Splits a patch into PatchGroups of consecutive operations that can
+    be resolved together against the document as it is before the
+    group: an operation joins when no modification of an earlier
+    member can change how its path resolves (see JSONPathWriteTrie).
+    Paths with '**' read whole subtrees and are not grouped with
+    modifications. Operations are still applied one after another in
+    patch order
+    """
+
+    @staticmethod
+    def plan(operations: Iterable[CompiledOperation]) -> Tuple[PatchGroup, ...]:
+        operations = tuple(operations)
+        groups: List[List[int]] = []
+        writes = JSONPathWriteTrie()
+        # Set once a member modifies somewhere below '**'
+        anywhere = False
+
+        for i, operation in enumerate(operations):
+            descendant = any(kind == STEP_DESCENDANT for kind, _ in operation.steps)
+            if groups and not anywhere and not (
+                writes.children if descendant else writes.conflicts(operation.steps)
+            ):
+                groups[-1].append(i)
+            else:
+                groups.append([i])
+                writes = JSONPathWriteTrie()
+                anywhere = False
+
+            if operation.op != 'test':
+                if descendant:
+                    anywhere = True
+                else:
+                    writes.add(operation.steps, shifts=operation.op != 'replace')
+
+        return tuple(
+            PatchGroup(
+                tuple(group),
+                JSONPathPatchPlanner.build_trie([operations[i].steps for i in group]) if len(group) > 1 else None
+            )
+            for group in groups
+        )
+
+    @staticmethod
+    def build_trie(paths: List[Tuple[Tuple[str, Any], ...]]) -> StepTrie:
+        """Merges step paths on common prefixes, positions follow paths"""
+        # Nodes are (ends, within, children) until frozen
+        root: Tuple[List[int], List[int], Dict] = ([], [], {})
+        for position, steps in enumerate(paths):
+            node = root
+            for step in steps:
+                children = node[2]
+                node = children.get(step)
+                if node is None:
+                    node = children[step] = ([], [], {})
+                node[1].append(position)
+            node[1].pop()
+            node[0].append(position)
+        return JSONPathPatchPlanner._freeze(root)
+
+    @staticmethod
+    def _freeze(node: Tuple[List[int], List[int], Dict]) -> StepTrie:
+        ends, within, children = node
+        return StepTrie(
+            ends=tuple(ends),
+            within=tuple(within),
+            children=tuple((step, JSONPathPatchPlanner._freeze(child)) for step, child in children.items())
+        )
 
 
 class JSONPathNormalizer:
@@ -60,6 +554,7 @@ class JSONPathResolver:
     """Resolves paths including selector expressions"""
 
     @staticmethod
+    @METRICS.timed('resolve_seconds')
     def resolve(
         data: Any,
         path: str
@@ -71,6 +566,7 @@ class JSONPathResolver:
         - Selector paths: "/panels/[?type=='row']/title"
         - Wildcard paths: "/panels/*/title"
         - Mixed paths: "/panels/[?type=='row']/*/options"
+        - Descendant paths: "/**/[?type=='graph']/title"
         """
         if not path.startswith('/'):
             raise ValueError("Path must start with '/'")
@@ -78,10 +574,22 @@ class JSONPathResolver:
         components = path.split('/')[1:]
         current_paths = ['']
 
-        for comp in components:
+        for i, comp in enumerate(components):
             new_paths = []
 
-            if comp == '*':
+            if comp == '**':
+                if i == len(components) - 1:
+                    raise ValueError("'**' must be followed by another path component")
+                following = components[i + 1]
+                for base_path in current_paths:
+                    base_data = JSONPathTraverser.get(data, base_path) if base_path else data
+                    new_paths.extend(
+                        base_path + ''.join(f"/{key}" for key in PathHandle.unwind(trail))
+                        for value, trail in JSONPathResolver._descendants(base_data, ())
+                        if JSONPathSelector.is_selector(following) or following == '**'
+                        or JSONPathResolver._has_child(value, following)
+                    )
+            elif comp == '*':
                 # Handle wildcard - match all immediate children
                 for base_path in current_paths:
                     base_data = JSONPathTraverser.get(data, base_path) if base_path else data
@@ -107,8 +615,202 @@ class JSONPathResolver:
 
             current_paths = new_paths
 
+        METRICS.observe('resolve_paths', len(current_paths), COUNT_BUCKETS)
         return [p if p.startswith('/') else f'/{p}' for p in current_paths]
 
+    @staticmethod
+    def resolve_handles(
+        data: Any,
+        steps: Tuple[Tuple[str, Any], ...],
+        index: Optional['JSONPathSelectorIndex'] = None
+    ) -> List[PathHandle]:
+        """
+        Resolves pre-tokenized steps (see JSONPathCompiler.compile_path)
+        walking the document once, without building string paths.
+        Returns handles to the (parent container, key) of every match.
+        With an index, '==' selectors are answered from it. A '**' step
+        expands every node into its whole subtree in one walk
+        """
+        if not steps:
+            return []
+
+        # (value, trail) of nodes matched by the steps walked so far
+        nodes: List[Tuple[Any, Tuple]] = [(data, ())]
+        last = len(steps) - 1
+        visited = 0
+
+        for i, (kind, arg) in enumerate(steps):
+            visited += len(nodes)
+            if kind == STEP_DESCENDANT:
+                following = steps[i + 1]
+                nodes = [
+                    (value, trail)
+                    for node, node_trail in nodes
+                    for value, trail in JSONPathResolver._descendants(node, node_trail)
+                    if following[0] != STEP_KEY or JSONPathResolver._has_child(value, following[1])
+                ]
+                continue
+            if i == last:
+                handles = [
+                    PathHandle(value, key, (trail, key))
+                    for value, trail in nodes
+                    for key in JSONPathResolver._match_keys(value, trail, kind, arg, index)
+                ]
+                METRICS.observe('patch_nodes_visited', visited, COUNT_BUCKETS)
+                return handles
+
+            nodes = [
+                (JSONPathTraverser.child(value, key), (trail, key))
+                for value, trail in nodes
+                for key in JSONPathResolver._match_keys(value, trail, kind, arg, index)
+            ]
+
+        return []
+
+    @staticmethod
+    def resolve_group(
+        data: Any,
+        operations: Tuple[CompiledOperation, ...],
+        group: PatchGroup,
+        index: Optional['JSONPathSelectorIndex'] = None
+    ) -> List[Union[List[PathHandle], ValueError]]:
+        """
+        Handles of every operation of group, in group order, walking
+        the group's trie once: steps shared by several operations are
+        matched once. An operation whose path cannot be resolved gets
+        the ValueError resolving it alone would have raised
+        """
+        if group.trie is None:
+            try:
+                return [JSONPathResolver.resolve_handles(data, operations[group.operations[0]].steps, index)]
+            except ValueError as e:
+                return [e]
+
+        resolved: List[Union[List[PathHandle], ValueError]] = [[] for _ in group.operations]
+        visited = 0
+        # (trie node, (value, trail) of nodes matched by the steps to it, below '**')
+        pending = [(group.trie, [(data, ())], False)]
+        while pending:
+            trie, nodes, descendant = pending.pop()
+            for (kind, arg), child in trie.children:
+                visited += len(nodes)
+                if kind == STEP_DESCENDANT:
+                    expanded = [
+                        pair
+                        for value, trail in nodes
+                        for pair in JSONPathResolver._descendants(value, trail)
+                    ]
+                    pending.append((child, expanded, True))
+                    continue
+
+                candidates = nodes
+                if descendant and kind == STEP_KEY:
+                    candidates = [(value, trail) for value, trail in nodes if JSONPathResolver._has_child(value, arg)]
+                matched = [
+                    (value, trail, key)
+                    for value, trail in candidates
+                    for key in JSONPathResolver._match_keys(value, trail, kind, arg, index)
+                ]
+                for position in child.ends:
+                    resolved[position] = [PathHandle(value, key, (trail, key)) for value, trail, key in matched]
+                if not child.children:
+                    continue
+                try:
+                    below = [(JSONPathTraverser.child(value, key), (trail, key)) for value, trail, key in matched]
+                except ValueError as e:
+                    for position in child.within:
+                        resolved[position] = e
+                    continue
+                pending.append((child, below, False))
+
+        METRICS.observe('patch_nodes_visited', visited, COUNT_BUCKETS)
+        return resolved
+
+    @staticmethod
+    def outermost(handles: List[PathHandle]) -> List[PathHandle]:
+        """
+        Handles not below another of handles. A '**' path can match a node
+        and nodes inside it; once the node is replaced or removed the
+        inner matches are no longer part of the document
+        """
+        locations = [tuple(str(comp) for comp in handle.components) for handle in handles]
+        # Sorted, the locations below a location directly follow it
+        kept = set()
+        outer: Tuple = ()
+        for position in sorted(range(len(handles)), key=locations.__getitem__):
+            location = locations[position]
+            if outer and location[:len(outer)] == outer:
+                continue
+            kept.add(position)
+            outer = location
+        return [handle for position, handle in enumerate(handles) if position in kept]
+
+    @staticmethod
+    def last_first(handles: List[PathHandle]) -> List[PathHandle]:
+        """
+        Handles in reverse document order: a location before the locations
+        above it, and a later list item before an earlier one. Adding or
+        removing an item only shifts the items after it, so applied in this
+        order no edit moves a location that is still to be edited
+        """
+        def position(comp: Union[int, str]) -> Tuple:
+            if isinstance(comp, int) or comp.isdigit():
+                return (0, int(comp), '')
+            return (1, 0, comp)
+
+        return sorted(handles, key=lambda handle: [position(comp) for comp in handle.components], reverse=True)
+
+    @staticmethod
+    def _match_keys(
+        data: Any,
+        trail: Tuple,
+        kind: str,
+        arg: Any,
+        index: Optional['JSONPathSelectorIndex'] = None
+    ) -> List[Union[int, str]]:
+        """Keys of data (found at trail) matched by a single pre-tokenized step"""
+        if kind == STEP_KEY:
+            return [arg]
+        elif kind == STEP_WILDCARD:
+            return JSONPathResolver._get_all_children_keys(data)
+        if index is not None and isinstance(data, (list, dict)) \
+                and JSONPathSelectorIndex.indexable(arg):
+            key, value = arg.equality
+            return index.lookup(data, PathHandle.unwind(trail), key, value)
+        return JSONPathSelector.evaluate_conditions(data, arg)
+
+    @staticmethod
+    def _descendants(data: Any, trail: Tuple) -> List[Tuple[Any, Tuple]]:
+        """
+        data and every object or list below it as (value, trail) pairs,
+        in document order. Walked with an explicit stack, so document
+        depth is not bounded by the recursion limit
+        """
+        found = []
+        stack = [(data, trail)]
+        while stack:
+            value, trail = stack.pop()
+            found.append((value, trail))
+            if isinstance(value, dict):
+                children = list(value.items())
+            elif isinstance(value, list):
+                children = list(enumerate(value))
+            else:
+                continue
+            for key, child in reversed(children):
+                if isinstance(child, (dict, list)):
+                    stack.append((child, (trail, key)))
+        return found
+
+    @staticmethod
+    def _has_child(data: Any, key: Union[int, str]) -> bool:
+        """Whether a key step below '**' finds something in data"""
+        if isinstance(data, dict):
+            return key in data
+        if isinstance(data, list):
+            return isinstance(key, str) and key.isdigit() and int(key) < len(data)
+        return False
+
     @staticmethod
     def _get_all_children_keys(data: Any) -> List[Union[int, str]]:
         """
@@ -126,6 +828,14 @@ class JSONPathResolver:
         """Constructs new path from base and match"""
         return f"{base_path}/{match}" if base_path else f"/{match}"
 
+    @staticmethod
+    def build_path(components: List[Union[int, str]]) -> str:
+        """Materializes path string from components, e.g. for error messages"""
+        return ''.join(
+            '/' + str(comp).replace('~', '~0').replace('/', '~1')
+            for comp in components
+        )
+
 
 class JSONPathSelector:
     """Handles selector expressions like [?type=='row']"""
@@ -148,115 +858,408 @@ class JSONPathSelector:
         """
         Evaluates selector against data and returns matching indices/keys
         """
+        return JSONPathSelector.evaluate_conditions(
+            data,
+            JSONPathConditionParser.compile(selector)
+        )
+
+    @staticmethod
+    def evaluate_conditions(
+        data: Any,
+        selector: 'CompiledSelector'
+    ) -> List[Union[int, str]]:
+        """Evaluates an already compiled selector against data"""
         if not isinstance(data, (list, dict)):
             return []
 
-        conditions = JSONPathConditionParser.parse(selector)
-
+        matches = selector.matches
         if isinstance(data, list):
-            return [
-                i for i, item in enumerate(data)
-                if JSONPathConditionEvaluator.matches(item, conditions)
-            ]
+            return [i for i, item in enumerate(data) if matches(item)]
         else:
-            return [
-                key for key, value in data.items()
-                if JSONPathConditionEvaluator.matches(value, conditions)
-            ]
+            return [key for key, value in data.items() if matches(value)]
+
+
+class CompiledSelector:
+    """
+    Selector compiled to a single predicate over an item. equality is
+    (key, value) when the selector is one top-level key == string
+    comparison, which JSONPathSelectorIndex can answer instead; keys
+    are the top-level item keys the selector reads.
+    Pickled by source and compiled again, closures do not pickle
+    """
+
+    __slots__ = ('source', 'matches', 'equality', 'keys')
+
+    def __init__(
+        self,
+        source: str,
+        matches: Callable[[Any], bool],
+        equality: Optional[Tuple[str, str]],
+        keys: FrozenSet[str]
+    ):
+        self.source = source
+        self.matches = matches
+        self.equality = equality
+        self.keys = keys
+
+    def __reduce__(self):
+        return JSONPathConditionParser.compile, (self.source,)
+
+    def __repr__(self) -> str:
+        return f"CompiledSelector({self.source!r})"
+
+
+class JSONPathConditionTokenizer:
+    """
+    Splits a selector into tokens: ('op', text) for operators and
+    parentheses, ('key', text) for keys and words, ('end', '').
+    Values after a comparison are read separately by value(), since
+    unquoted values may contain any character up to && || or an
+    unbalanced )
+    """
+
+    OPERATORS = ('&&', '||', '==', '!=', '=~', '<=', '>=', '<', '>', '!', '(', ')')
+    KEY = re.compile(r"[^\s=!<>~&|()'\"]+")
+    STRING = re.compile(r"'((?:[^'\\]|\\.)*)'|\"((?:[^\"\\]|\\.)*)\"")
+    NUMBER = re.compile(r"-?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?")
+    WORD = re.compile(r"[A-Za-z_]\w*")
+    BARE_VALUE_STOP = re.compile(r"&&|\|\||[()]")
+    ESCAPE = re.compile(r"\\(.)")
+    WORDS = {'true': True, 'false': False, 'null': None}
+
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+        self._peeked: Optional[Tuple[str, str]] = None
+
+    def peek(self) -> Tuple[str, str]:
+        if self._peeked is None:
+            self._peeked = self._scan()
+        return self._peeked
+
+    def next(self) -> Tuple[str, str]:
+        token = self.peek()
+        self._peeked = None
+        return token
+
+    def error(self, message: str) -> ValueError:
+        return ValueError(f"{message} at position {self.pos} of selector {self.text!r}")
+
+    def _skip_space(self) -> None:
+        while self.pos < len(self.text) and self.text[self.pos].isspace():
+            self.pos += 1
+
+    def _scan(self) -> Tuple[str, str]:
+        self._skip_space()
+        if self.pos >= len(self.text):
+            return ('end', '')
+        for op in self.OPERATORS:
+            if self.text.startswith(op, self.pos):
+                self.pos += len(op)
+                return ('op', op)
+        match = self.KEY.match(self.text, self.pos)
+        if match is None:
+            raise self.error(f"Unexpected {self.text[self.pos]!r}")
+        self.pos = match.end()
+        return ('key', match.group())
+
+    def value(self) -> Tuple[Any, str]:
+        """
+        Reads the literal after a comparison, returns (value, text):
+        a quoted string, a number, true/false/null, or else the
+        unquoted text up to && || or an unbalanced ) taken as a string
+        """
+        if self._peeked is not None:
+            raise self.error("Value expected")
+        self._skip_space()
+        text = self.text
+
+        match = self.STRING.match(text, self.pos)
+        if match is not None:
+            self.pos = match.end()
+            quote = "'" if match.group(1) is not None else '"'
+            quoted = match.group(1) if match.group(1) is not None else match.group(2)
+            # Only escaped quotes are unescaped, other backslashes are
+            # kept for regular expressions ('CPU\d', 'a\.b')
+            value = self.ESCAPE.sub(lambda m: quote if m.group(1) == quote else m.group(), quoted)
+            return value, value
+
+        for pattern in (self.NUMBER, self.WORD):
+            match = pattern.match(text, self.pos)
+            if match is None or not self._ends_value(match.end()):
+                continue
+            word = match.group()
+            if pattern is self.NUMBER:
+                self.pos = match.end()
+                return (float(word) if any(c in word for c in '.eE') else int(word)), word
+            if word in self.WORDS:
+                self.pos = match.end()
+                return self.WORDS[word], word
+
+        end = self._bare_value_end(self.pos)
+        word = text[self.pos:end].strip()
+        if not word:
+            raise self.error("Value expected")
+        self.pos = end
+        return word, word
+
+    def _bare_value_end(self, pos: int) -> int:
+        """
+        End of an unquoted value starting at pos. Parentheses inside it
+        are balanced, as in 'Mem (MB)' or '(CPU|Mem).*', so only a )
+        closing a group of the selector ends it
+        """
+        depth = 0
+        while True:
+            match = self.BARE_VALUE_STOP.search(self.text, pos)
+            if match is None:
+                return len(self.text)
+            stop = match.group()
+            if stop == '(':
+                depth += 1
+            elif stop == ')' and depth:
+                depth -= 1
+            elif depth == 0:
+                return match.start()
+            pos = match.end()
+
+    def _ends_value(self, pos: int) -> bool:
+        rest = self.text[pos:].lstrip()
+        return not rest or rest.startswith(('&&', '||', ')'))
 
 
 class JSONPathConditionParser:
-    """Parses selector conditions into executable form"""
+    """
+    Parses selector conditions into executable form. Grammar, loosest
+    binding first:
+        or      := and ('||' and)*
+        and     := unary ('&&' unary)*
+        unary   := '!' unary | primary
+        primary := '(' or ')' | 'exists(' key ')' | key op value
+        op      := '==' | '!=' | '=~' | 'in' | '<' | '<=' | '>' | '>='
+    Keys may be dotted paths into nested objects and lists
+    """
+
+    COMPARISONS = ('==', '!=', '=~', '<', '<=', '>', '>=')
+
+    @staticmethod
+    def parse(selector: str) -> Tuple:
+        """
+        Parses selector into a tree of tuples:
+        - ('or', left, right), ('and', left, right), ('not', operand)
+        - ('exists', key)
+        - ('compare', key, op, (value, text))
+        """
+        tokens = JSONPathConditionTokenizer(selector)
+        node = JSONPathConditionParser._parse_or(tokens)
+        kind, text = tokens.next()
+        if kind != 'end':
+            raise tokens.error(f"Unexpected {text!r}")
+        return node
 
     @staticmethod
-    def parse(selector: str) -> List[Union[str, Tuple[str, str, str]]]:
+    @lru_cache(maxsize=SELECTOR_CACHE_SIZE)
+    def compile(selector: str) -> CompiledSelector:
         """
-        Parses selector into list of conditions and operators
-        Returns list of either:
-        - condition tuples: (key, operator, value)
-        - logical operators: '&&' or '||'
+        Parses selector and compiles it to a predicate, regular
+        expressions of '=~' included. Results are immutable and
+        cached process-wide
         """
-        tokens = re.split(r'\s*(&&|\|\|)\s*', selector)
-        parsed = []
+        node = JSONPathConditionParser.parse(selector)
+        equality = None
+        if node[0] == 'compare' and node[2] == '==' and '.' not in node[1] \
+                and isinstance(node[3][0], str):
+            equality = (node[1], node[3][0])
+        return CompiledSelector(
+            selector,
+            JSONPathConditionEvaluator.build(node),
+            equality,
+            JSONPathConditionParser.keys(node)
+        )
 
-        for token in tokens:
-            if token in ('&&', '||'):
-                parsed.append(token)
+    @staticmethod
+    def keys(node: Tuple) -> FrozenSet[str]:
+        """Top-level item keys a parse tree reads: dotted keys as is and their first component"""
+        keys = set()
+        pending = [node]
+        while pending:
+            node = pending.pop()
+            if node[0] in ('or', 'and', 'not'):
+                pending.extend(node[1:])
             else:
-                parsed.append(JSONPathConditionParser._parse_condition(token))
+                keys.update((node[1], node[1].split('.', 1)[0]))
+        return frozenset(keys)
 
-        return parsed
+    @staticmethod
+    @lru_cache(maxsize=REGEX_CACHE_SIZE)
+    def compile_regex(pattern: str) -> 're.Pattern[str]':
+        """
+        Compiles '=~' pattern; cached process-wide, since the re module's
+        own cache is too small for patch files with many distinct patterns
+        """
+        try:
+            return re.compile(pattern)
+        except re.error as e:
+            raise ValueError(f"Invalid regular expression {pattern!r}: {e}")
 
     @staticmethod
-    def _parse_condition(condition: str) -> Tuple[str, str, str]:
-        """Parses a single condition into (key, op, value)"""
-        ops = ['==', '!=', '=~', ' in ']
-        for op in ops:
-            if op in condition:
-                key, value = condition.split(op, 1)
-                return (key.strip(), op.strip(), value.strip().strip("'\""))
-        raise ValueError(f"Invalid condition format: {condition}")
+    def _parse_or(tokens: JSONPathConditionTokenizer) -> Tuple:
+        node = JSONPathConditionParser._parse_and(tokens)
+        while tokens.peek() == ('op', '||'):
+            tokens.next()
+            node = ('or', node, JSONPathConditionParser._parse_and(tokens))
+        return node
 
+    @staticmethod
+    def _parse_and(tokens: JSONPathConditionTokenizer) -> Tuple:
+        node = JSONPathConditionParser._parse_unary(tokens)
+        while tokens.peek() == ('op', '&&'):
+            tokens.next()
+            node = ('and', node, JSONPathConditionParser._parse_unary(tokens))
+        return node
 
-class JSONPathConditionEvaluator:
-    """Evaluates conditions against data items"""
+    @staticmethod
+    def _parse_unary(tokens: JSONPathConditionTokenizer) -> Tuple:
+        if tokens.peek() == ('op', '!'):
+            tokens.next()
+            return ('not', JSONPathConditionParser._parse_unary(tokens))
+        return JSONPathConditionParser._parse_primary(tokens)
 
     @staticmethod
-    def matches(
-        item: Any,
-        conditions: List[Union[str, Tuple[str, str, str]]]
-    ) -> bool:
-        """Evaluates all conditions against an item"""
-        if not conditions:
-            return True
+    def _parse_primary(tokens: JSONPathConditionTokenizer) -> Tuple:
+        kind, text = tokens.next()
+        if (kind, text) == ('op', '('):
+            node = JSONPathConditionParser._parse_or(tokens)
+            if tokens.next() != ('op', ')'):
+                raise tokens.error("Missing ')'")
+            return node
+        if kind != 'key':
+            raise tokens.error("Condition expected" if kind == 'end' else f"Unexpected {text!r}")
+
+        if text == 'exists' and tokens.peek() == ('op', '('):
+            tokens.next()
+            kind, key = tokens.next()
+            if kind != 'key' or tokens.next() != ('op', ')'):
+                raise tokens.error("Invalid exists(key)")
+            return ('exists', key)
+
+        op_kind, op = tokens.next()
+        if not (op_kind == 'op' and op in JSONPathConditionParser.COMPARISONS
+                or op_kind == 'key' and op == 'in'):
+            raise tokens.error(f"Invalid condition format: operator expected after {text!r}")
+        return ('compare', text, op, tokens.value())
 
-        result = True
-        i = 0
 
-        while i < len(conditions):
-            condition = conditions[i]
+class JSONPathConditionEvaluator:
+    """
+    Compiles parsed selectors into closures. Comparisons are typed:
+    numbers compare as numbers (bools excluded) and strings as strings,
+    other combinations do not match. As the original string matching
+    did, string values of == and != also match the string form of a
+    value, =~ matches the string form and 'in' is a substring test
+    (membership for lists). Conditions on missing keys never match
+    """
 
-            if isinstance(condition, str):  # Logical operator
-                next_cond = conditions[i+1]
-                next_result = JSONPathConditionEvaluator._evaluate_single(item, next_cond)
+    ORDERINGS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
 
-                if condition == '&&':
-                    result = result and next_result
-                else:  # '||'
-                    result = result or next_result
-                i += 2
-            else:
-                result = JSONPathConditionEvaluator._evaluate_single(item, condition)
-                i += 1
+    @staticmethod
+    def matches(item: Any, selector: CompiledSelector) -> bool:
+        """Evaluates a compiled selector against an item"""
+        return selector.matches(item)
 
-        return result
+    @staticmethod
+    def build(node: Tuple) -> Callable[[Any], bool]:
+        """Predicate of a parse tree, and/or short-circuit"""
+        kind = node[0]
+        if kind == 'or':
+            left, right = JSONPathConditionEvaluator.build(node[1]), JSONPathConditionEvaluator.build(node[2])
+            return lambda item: left(item) or right(item)
+        if kind == 'and':
+            left, right = JSONPathConditionEvaluator.build(node[1]), JSONPathConditionEvaluator.build(node[2])
+            return lambda item: left(item) and right(item)
+        if kind == 'not':
+            operand = JSONPathConditionEvaluator.build(node[1])
+            return lambda item: not operand(item)
+
+        get = JSONPathConditionEvaluator.getter(node[1])
+        if kind == 'exists':
+            return lambda item: get(item) is not _MISSING
+        test = JSONPathConditionEvaluator.comparison(node[2], *node[3])
+        return lambda item: (value := get(item)) is not _MISSING and test(value)
 
     @staticmethod
-    def _evaluate_single(
-        item: Any,
-        condition: Tuple[str, str, str]
-    ) -> bool:
-        """Evaluates a single condition against an item"""
-        if not isinstance(item, dict):
-            return False
+    def getter(key: str) -> Callable[[Any], Any]:
+        """
+        Reads key of an item, _MISSING when absent. A dotted key is
+        first looked up as is, then walked through nested objects,
+        with numeric components indexing lists
+        """
+        if '.' not in key:
+            return lambda item: item.get(key, _MISSING) if isinstance(item, dict) else _MISSING
+
+        components = key.split('.')
+
+        def get(item: Any) -> Any:
+            if not isinstance(item, dict):
+                return _MISSING
+            if key in item:
+                return item[key]
+            for comp in components:
+                if isinstance(item, dict):
+                    item = item.get(comp, _MISSING)
+                    if item is _MISSING:
+                        return _MISSING
+                elif isinstance(item, list) and comp.isdigit() and int(comp) < len(item):
+                    item = item[int(comp)]
+                else:
+                    return _MISSING
+            return item
+
+        return get
 
-        key, op, value = condition
+    @staticmethod
+    def comparison(op: str, value: Any, text: str) -> Callable[[Any], bool]:
+        """Test of an item value against a literal"""
+        if op in ('==', '!='):
+            equals = JSONPathConditionEvaluator._equality(value, text)
+            if op == '==':
+                return equals
+            return lambda item_value: not equals(item_value)
+        if op == '=~':
+            pattern = JSONPathConditionParser.compile_regex(text)
+            return lambda item_value: pattern.match(
+                item_value if isinstance(item_value, str) else str(item_value)
+            ) is not None
+        if op == 'in':
+            return lambda item_value: (
+                value in item_value if isinstance(item_value, list)
+                else text in (item_value if isinstance(item_value, str) else str(item_value))
+            )
+
+        compare = JSONPathConditionEvaluator.ORDERINGS[op]
+        if isinstance(value, str):
+            return lambda item_value: isinstance(item_value, str) and compare(item_value, value)
+        if _is_number(value):
+            return lambda item_value: _is_number(item_value) and compare(item_value, value)
+        raise ValueError(f"Cannot compare with {op} against {text}")
 
-        if key not in item:
-            return False
+    @staticmethod
+    def _equality(value: Any, text: str) -> Callable[[Any], bool]:
+        if isinstance(value, str):
+            return lambda item_value: (item_value if isinstance(item_value, str) else str(item_value)) == value
+        if _is_number(value):
+            return lambda item_value: (item_value == value and _is_number(item_value)) or str(item_value) == text
+        # true, false and null match themselves only
+        return lambda item_value: item_value is value
 
-        item_value = str(item[key])
 
-        if op == '==':
-            return item_value == value
-        elif op == '!=':
-            return item_value != value
-        elif op == '=~':
-            return bool(re.match(value, item_value))
-        elif op == 'in':
-            return value in item_value
-        else:
-            raise ValueError(f"Unknown operator: {op}")
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _index_like(key: str) -> bool:
+    """Whether a key may address a list position"""
+    return key == '-' or key.lstrip('-').isdigit()
 
 
 class JSONPathTraverser:
@@ -295,6 +1298,26 @@ class JSONPathTraverser:
 
         return current
 
+    @staticmethod
+    def child(
+        current: Any,
+        comp: Union[int, str]
+    ) -> Any:
+        """Gets direct child of a container, validating the key"""
+        if isinstance(current, dict):
+            if comp not in current:
+                raise ValueError(f"Key not found: {comp}")
+            return current[comp]
+        elif isinstance(current, list):
+            try:
+                idx = int(comp)
+            except ValueError:
+                raise ValueError(f"Invalid array index: {comp}")
+            if idx >= len(current):
+                raise ValueError(f"Index out of range: {idx}")
+            return current[idx]
+        raise ValueError(f"Cannot traverse into {type(current)} at {comp}")
+
     @staticmethod
     def resolve_path(
         data: Union[Dict, List],
@@ -324,7 +1347,21 @@ class JSONPathOperator:
     ) -> None:
         """Applies the specified operation at the given path"""
         components = JSONPathNormalizer.get_components(path)
-        parent, last_component = JSONPathTraverser.resolve_path(data, components)
+        parent, _ = JSONPathTraverser.resolve_path(data, components)
+        JSONPathOperator.apply_handle(
+            PathHandle.from_components(parent, components),
+            op,
+            value
+        )
+
+    @staticmethod
+    def apply_handle(
+        handle: PathHandle,
+        op: str,
+        value: Any = None
+    ) -> None:
+        """Applies the specified operation through a resolved handle"""
+        parent, last_component = handle.parent, handle.key
 
         if op == 'add':
             JSONPathOperator._add(parent, last_component, value)
@@ -338,7 +1375,7 @@ class JSONPathOperator:
             raise NotImplementedError("Copy operation requires from_path")
         elif op == 'test':
             if not JSONPathOperator._test(parent, last_component, value):
-                raise ValueError(f"Test failed at {path}")
+                raise ValueError(f"Test failed at {handle.path}")
         else:
             raise ValueError(f"Unsupported operation: {op}")
 
@@ -416,10 +1453,125 @@ class JSONPathOperator:
         return False
 
 
+class JSONPathBatchProcessor:
+    """Applies one patch to many documents across worker processes"""
+
+    # Patch of the current worker process, set once by the pool initializer
+    _worker_patch: Optional[CompiledPatch] = None
+
+    @staticmethod
+    def apply_many(
+        documents: Iterable[Union[Dict, List]],
+        patch: Union[List[Dict], CompiledPatch],
+        workers: Optional[int] = None,
+        chunk_size: int = 32,
+        ordered: bool = True,
+        serial_threshold: int = 64
+    ) -> Iterator[Any]:
+        """
+        Streams documents through a process pool in chunks. The patch is
+        compiled once and sent to each worker once, at pool start.
+        Yields patched documents in input order, or (input index, document)
+        pairs as they complete when ordered is False. Fewer documents than
+        serial_threshold, or a single worker, are patched in this process
+        """
+        if not isinstance(patch, CompiledPatch):
+            patch = JSONPathCompiler.compile(patch)
+        workers = workers or os.cpu_count() or 1
+
+        documents = iter(documents)
+        head = list(islice(documents, serial_threshold))
+        if workers == 1 or len(head) < serial_threshold:
+            for i, document in enumerate(chain(head, documents)):
+                result = patch.apply(document)
+                yield result if ordered else (i, result)
+            return
+
+        # multiprocessing is only imported when a pool is needed
+        from concurrent.futures import ProcessPoolExecutor
+
+        chunks = JSONPathBatchProcessor._chunks(head, documents, chunk_size)
+        with ProcessPoolExecutor(
+            workers,
+            initializer=JSONPathBatchProcessor._init_worker,
+            initargs=(patch,)
+        ) as pool:
+            # Bounds chunks held in memory to two per worker
+            in_flight = workers * 2
+            if ordered:
+                pending: deque = deque()
+                for chunk in chunks:
+                    pending.append(pool.submit(JSONPathBatchProcessor._apply_chunk, chunk))
+                    if len(pending) >= in_flight:
+                        yield from pending.popleft().result()
+                while pending:
+                    yield from pending.popleft().result()
+            else:
+                futures: Dict[Any, int] = {}
+                start = 0
+                for chunk in chunks:
+                    futures[pool.submit(JSONPathBatchProcessor._apply_chunk, chunk)] = start
+                    start += len(chunk)
+                    if len(futures) >= in_flight:
+                        yield from JSONPathBatchProcessor._collect(futures, FIRST_COMPLETED)
+                while futures:
+                    yield from JSONPathBatchProcessor._collect(futures, FIRST_COMPLETED)
+
+    @staticmethod
+    def _chunks(
+        head: List[Any],
+        rest: Iterator[Any],
+        chunk_size: int
+    ) -> Iterator[List[Any]]:
+        for i in range(0, len(head), chunk_size):
+            yield head[i:i + chunk_size]
+        while True:
+            chunk = list(islice(rest, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    @staticmethod
+    def _collect(futures: Dict[Any, int], return_when: str) -> Iterator[Tuple[int, Any]]:
+        """Yields (index, document) of chunks done, removing them from futures"""
+        done, _ = wait(futures, return_when=return_when)
+        for future in done:
+            start = futures.pop(future)
+            for offset, result in enumerate(future.result()):
+                yield start + offset, result
+
+    @staticmethod
+    def _init_worker(patch: CompiledPatch) -> None:
+        JSONPathBatchProcessor._worker_patch = patch
+
+    @staticmethod
+    def _apply_chunk(chunk: List[Any]) -> List[Any]:
+        # Documents were unpickled into this process, nobody else owns them
+        patch = JSONPathBatchProcessor._worker_patch
+        return [patch.apply(document, in_place=True) for document in chunk]
+
+
 # Public API
+def compile_patch(patch: List[Dict]) -> CompiledPatch:
+    """Public interface for compiling JSON patches once for repeated use"""
+    return JSONPathCompiler.compile(patch)
+
+
 def apply_patch(
     data: Union[Dict, List],
-    patch: List[Dict]
+    patch: Union[List[Dict], CompiledPatch],
+    in_place: bool = False
 ) -> Union[Dict, List]:
     """Public interface for applying JSON patches"""
-    return JSONPathProcessor.apply_patch(data, patch)
+    return JSONPathProcessor.apply_patch(data, patch, in_place)
+
+
+def apply_patch_many(
+    documents: Iterable[Union[Dict, List]],
+    patch: Union[List[Dict], CompiledPatch],
+    workers: Optional[int] = None,
+    chunk_size: int = 32,
+    ordered: bool = True
+) -> Iterator[Any]:
+    """Public interface for applying one JSON patch to many documents in parallel"""
+    return JSONPathBatchProcessor.apply_many(documents, patch, workers, chunk_size, ordered)
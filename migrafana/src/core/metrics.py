@@ -0,0 +1,239 @@
+import inspect
+import json
+import math
+import time
+from bisect import bisect_left
+from functools import wraps
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from core.files import write_atomic
+
+# Upper bounds of histogram buckets by kind of value
+TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = tuple(64 * 4 ** i for i in range(11))
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 100000)
+
+PROMETHEUS_PREFIX = 'migrafana_'
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Bucketed distribution of observed values with count, sum, min and max"""
+
+    def __init__(self, buckets: Iterable[float]):
+        self.buckets = tuple(buckets)
+        # Last slot counts values above every bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (max above the last bucket)"""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """(upper bound, observations <= bound) pairs, ending with +Inf"""
+        total = 0
+        pairs = []
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+    def to_dict(self) -> Dict[str, Any]:
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.sum / self.count,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+        }
+
+
+class MetricsRegistry:
+    """
+    Histograms and counters of a run, keyed by name and labels.
+    Disabled by default: every recording call returns after one
+    attribute check, and hot paths check enabled before measuring
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.started = time.time()
+        self._lock = Lock()
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+
+    def enable(self) -> None:
+        self.reset()
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started = time.time()
+            self._histograms.clear()
+            self._counters.clear()
+
+    def observe(self, name: str, value: float, buckets: Iterable[float] = TIME_BUCKETS, **labels: str) -> None:
+        """Adds value to histogram name, created with buckets on first use"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def increment(self, name: str, amount: float = 1, **labels: str) -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def timed(self, name: str, **labels: str) -> Callable:
+        """
+        Decorator recording wall time of every call in histogram name,
+        labelled with outcome 'ok' or 'error'. Works on coroutine functions
+        """
+        def decorator(func: Callable) -> Callable:
+            if inspect.iscoroutinefunction(func):
+                @wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    if not self.enabled:
+                        return await func(*args, **kwargs)
+                    start = time.perf_counter()
+                    outcome = 'error'
+                    try:
+                        result = await func(*args, **kwargs)
+                        outcome = 'ok'
+                        return result
+                    finally:
+                        self.observe(name, time.perf_counter() - start, outcome=outcome, **labels)
+                return async_wrapper
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                outcome = 'error'
+                try:
+                    result = func(*args, **kwargs)
+                    outcome = 'ok'
+                    return result
+                finally:
+                    self.observe(name, time.perf_counter() - start, outcome=outcome, **labels)
+            return wrapper
+
+        return decorator
+
+    def report(self) -> Dict[str, Any]:
+        """Run report: summaries of every histogram and counter value"""
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+        return {
+            'started': self.started,
+            'duration_seconds': time.time() - self.started,
+            'histograms': [
+                dict(name=name, labels=dict(labels), **histogram.to_dict())
+                for (name, labels), histogram in histograms
+            ],
+            'counters': [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in counters
+            ],
+        }
+
+    def write_report(self, path: str, extra: Optional[Dict[str, Any]] = None) -> None:
+        """Writes the JSON run report, with extra top-level fields"""
+        report = self.report()
+        if extra:
+            report.update(extra)
+        write_atomic(path, json.dumps(report, indent=2))
+
+    def write_prometheus(self, path: str) -> None:
+        """
+        Writes metrics in Prometheus text format, e.g. for the
+        node_exporter textfile collector. Written atomically so the
+        collector never reads a partial file
+        """
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+
+        lines = []
+        typed = set()
+        for (name, labels), histogram in histograms:
+            metric = PROMETHEUS_PREFIX + name
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f'# TYPE {metric} histogram')
+            for bound, count in histogram.cumulative():
+                le = '+Inf' if bound == math.inf else repr(float(bound))
+                lines.append(f'{metric}_bucket{_format_labels(labels + (("le", le),))} {count}')
+            lines.append(f'{metric}_sum{_format_labels(labels)} {histogram.sum}')
+            lines.append(f'{metric}_count{_format_labels(labels)} {histogram.count}')
+        for (name, labels), value in counters:
+            metric = PROMETHEUS_PREFIX + name
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f'# TYPE {metric} counter')
+            lines.append(f'{metric}{_format_labels(labels)} {value}')
+
+        write_atomic(path, '\n'.join(lines) + '\n')
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    )
+    return '{' + pairs + '}'
+
+
+def instrumented(kind: str) -> Callable[[type], type]:
+    """
+    Class decorator timing every public method of a manager in the
+    grafana_call_seconds histogram, labelled call='<kind>.<method>'
+    """
+    def decorator(cls: type) -> type:
+        for name, attr in list(vars(cls).items()):
+            if name.startswith('_') or not callable(attr) or isinstance(attr, (staticmethod, classmethod)):
+                continue
+            setattr(cls, name, METRICS.timed('grafana_call_seconds', call=f'{kind}.{name}')(attr))
+        return cls
+    return decorator
+
+
+# Process-wide registry
+METRICS = MetricsRegistry()
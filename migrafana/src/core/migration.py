@@ -0,0 +1,307 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from grafana_client.client import GrafanaClientError
+
+from core.json_parser.diff import DiffSummary, diff
+from core.json_parser.parser import CompiledPatch, compile_patch
+from core.remap import DataSourceRemapper
+from core.sync import DASHBOARD_VOLATILE_KEYS, SyncState, canonical_hash, same_content
+
+# Hits requested per search page; Grafana returns at most 1000 when no limit is given
+SEARCH_PAGE_SIZE = 5000
+
+# Fetch result of a dashboard whose source version was already synced
+_UNCHANGED_SOURCE = object()
+
+
+class DashboardMigrationResult(NamedTuple):
+    """Outcome of migrating a single dashboard"""
+    uid: str
+    ok: bool
+    error: Optional[str] = None
+    skipped: Optional[str] = None
+
+
+class MigrationReport:
+    """Per-dashboard results of a bulk migration run"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.results: List[DashboardMigrationResult] = []
+
+    @property
+    def succeeded(self) -> List[DashboardMigrationResult]:
+        return [r for r in self.results if r.ok and not r.skipped]
+
+    @property
+    def skipped(self) -> List[DashboardMigrationResult]:
+        return [r for r in self.results if r.skipped]
+
+    @property
+    def failed(self) -> List[DashboardMigrationResult]:
+        return [r for r in self.results if not r.ok]
+
+    def to_dict(self) -> Dict:
+        return {
+            'total': self.total,
+            'succeeded': len(self.succeeded),
+            'skipped': len(self.skipped),
+            'failed': [r._asdict() for r in self.failed],
+        }
+
+
+class BulkDashboardMigrator:
+    """
+    Fetches, patches and pushes many dashboards concurrently.
+    Source reads and destination writes run in separate bounded
+    thread pools; a failing dashboard is recorded in the report
+    and does not stop the batch.
+
+    source and destination are dashboard managers, i.e. anything
+    with get_dashboard, update_dashboard and search_dashboards.
+
+    With a SyncState the run is incremental: dashboards whose source
+    version was already synced are not fetched, and dashboards whose
+    patched output matches the last pushed one are not pushed. Search
+    hits carry no version, so it is asked with the source's
+    get_dashboard_version, a small response, when it has one;
+    otherwise every dashboard is fetched and only the output is compared.
+
+    Dashboards the patch leaves unchanged (updated in place) or whose
+    destination copy already has the patched content are not written,
+    unless skip_unchanged is False: every write bumps the dashboard
+    version and adds a history entry.
+
+    With a DiffSummary the run is a dry run: nothing is pushed, the
+    minimal JSON patch of every dashboard is added to the summary.
+
+    With a DataSourceRemapper the data source references of every
+    patched dashboard are rewritten to the destination's data sources;
+    references it cannot match are collected in remapper.unmatched.
+    """
+
+    def __init__(
+        self,
+        source: Any,
+        destination: Optional[Any] = None,
+        patch: Optional[List[Dict]] = None,
+        fetch_workers: int = 8,
+        push_workers: int = 4,
+        on_progress: Optional[Callable[[DashboardMigrationResult, int, int], None]] = None,
+        state: Optional[SyncState] = None,
+        dry_run: Optional[DiffSummary] = None,
+        skip_unchanged: bool = True,
+        remapper: Optional[DataSourceRemapper] = None
+    ):
+        if fetch_workers < 1 or push_workers < 1:
+            raise ValueError("Worker counts must be positive")
+        self.source = source
+        self.destination = destination if destination is not None else source
+        self.patch = compile_patch(patch) if patch else None
+        self.remapper = remapper
+        self.patch_hash = patch_hash(patch, remapper)
+        self.fetch_workers = fetch_workers
+        self.push_workers = push_workers
+        self.on_progress = on_progress
+        self.state = state
+        self.dry_run = dry_run
+        self.skip_unchanged = skip_unchanged
+
+    def find_uids(self, query: str = "", tag: str = "") -> List[str]:
+        """Dashboard UIDs on the source matching a search query"""
+        return [hit['uid'] for hit in search_all_dashboards(self.source, query=query, tag=tag)]
+
+    def run(self, uids: List[str]) -> MigrationReport:
+        """Migrates every dashboard in uids and returns the report"""
+        report = MigrationReport(total=len(uids))
+        lock = Lock()
+        # Bounds fetched dashboards waiting to be pushed
+        window = self.fetch_workers + self.push_workers
+        in_flight = BoundedSemaphore(window)
+
+        def finish(
+            uid: str,
+            error: Optional[BaseException] = None,
+            skipped: Optional[str] = None
+        ) -> None:
+            result = DashboardMigrationResult(
+                uid=uid,
+                ok=error is None,
+                error=None if error is None else f"{type(error).__name__}: {error}",
+                skipped=skipped
+            )
+            try:
+                with lock:
+                    report.results.append(result)
+                    done = len(report.results)
+                if self.on_progress:
+                    self.on_progress(result, done, report.total)
+            finally:
+                in_flight.release()
+
+        def on_pushed(uid: str, version: Optional[int], digest: str, future: Future) -> None:
+            error = future.exception()
+            if error is None and self.state is not None:
+                self.state.record(uid, version, digest, self.patch_hash)
+            if error is None and not future.result():
+                finish(uid, skipped='unchanged')
+            else:
+                finish(uid, error)
+
+        def on_fetched(uid: str, push_pool: ThreadPoolExecutor, future: Future) -> None:
+            error = future.exception()
+            if error is not None:
+                finish(uid, error)
+                return
+            if future.result() is _UNCHANGED_SOURCE:
+                finish(uid, skipped='unchanged source')
+                return
+            if self.dry_run is not None:
+                finish(uid, skipped='dry run')
+                return
+            payload, version, digest, unchanged = future.result()
+            if self.state is not None and self.state.is_pushed(uid, digest):
+                self.state.record(uid, version, digest, self.patch_hash)
+                finish(uid, skipped='unchanged output')
+                return
+            if unchanged:
+                if self.state is not None:
+                    self.state.record(uid, version, digest, self.patch_hash)
+                finish(uid, skipped='unchanged')
+                return
+            pushed = push_pool.submit(self._push, uid, payload)
+            pushed.add_done_callback(lambda f: on_pushed(uid, version, digest, f))
+
+        with ThreadPoolExecutor(self.fetch_workers) as fetch_pool, \
+                ThreadPoolExecutor(self.push_workers) as push_pool:
+            for uid in uids:
+                in_flight.acquire()
+                fetched = fetch_pool.submit(self._fetch, uid)
+                fetched.add_done_callback(
+                    lambda f, uid=uid: on_fetched(uid, push_pool, f)
+                )
+            # Every slot is returned once all dashboards are finished
+            for _ in range(window):
+                in_flight.acquire()
+
+        return report
+
+    def _fetch(self, uid: str) -> Any:
+        """
+        Fetches and patches (or diffs) dashboard uid, or returns
+        _UNCHANGED_SOURCE when its source version was already synced.
+        When the versions endpoint is refused, e.g. to a read-only token,
+        the version of the fetched dashboard is compared instead
+        """
+        compare_fetched = False
+        if self.state is not None and hasattr(self.source, 'get_dashboard_version'):
+            try:
+                version = self.source.get_dashboard_version(uid)
+            except GrafanaClientError:
+                compare_fetched = True
+            else:
+                if self.state.is_current(uid, version, self.patch_hash):
+                    return _UNCHANGED_SOURCE
+
+        response = self.source.get_dashboard(uid)
+        if compare_fetched and self.state.is_current(uid, response['dashboard'].get('version'), self.patch_hash):
+            return _UNCHANGED_SOURCE
+        if self.dry_run is not None:
+            return self._diff(response['dashboard'])
+        return self._patch(response)
+
+    def _patch(self, response: Dict) -> Tuple[Dict, Optional[int], str, bool]:
+        """
+        Builds the patched update payload of a get_dashboard response.
+        Returns the payload, the source version, the payload hash and
+        whether an in-place update would leave the dashboard unchanged
+        """
+        in_place = self.destination is self.source
+        payload = build_dashboard_payload(response, self.patch, keep_id=in_place, remapper=self.remapper)
+        version = response['dashboard'].get('version')
+        unchanged = in_place and self.skip_unchanged and same_content(
+            response['dashboard'], payload['dashboard'], DASHBOARD_VOLATILE_KEYS
+        )
+        return payload, version, canonical_hash(payload), unchanged
+
+    def _push(self, uid: str, payload: Dict) -> bool:
+        """
+        Writes payload to destination unless its copy of the dashboard
+        already has the same content and folder. Returns whether it wrote
+        """
+        if self.skip_unchanged and self.destination is not self.source:
+            try:
+                current = self.destination.get_dashboard(uid)
+            except Exception:
+                # Not on the destination yet
+                current = None
+            if current is not None \
+                    and (current.get('meta', {}).get('folderUid') or None) == payload.get('folderUid') \
+                    and same_content(current['dashboard'], payload['dashboard'], DASHBOARD_VOLATILE_KEYS):
+                return False
+        self.destination.update_dashboard(payload)
+        return True
+
+    def _diff(self, dashboard: Dict) -> None:
+        """Records what the patch would change in a source dashboard"""
+        patched = self.patch.apply(dashboard) if self.patch else dashboard
+        if self.remapper is not None:
+            patched = self.remapper.remap(patched).dashboard
+        self.dry_run.add(diff(dashboard, patched))
+
+
+def patch_hash(patch: Optional[List[Dict]], remapper: Optional[DataSourceRemapper] = None) -> str:
+    """
+    Hash of what a sync applies to dashboards, kept in the SyncState.
+    Remapping is part of the output, so a new pairing invalidates the state
+    """
+    return canonical_hash(patch or [] if remapper is None else [patch or [], remapper.pairs])
+
+
+def search_all_dashboards(
+    manager: Any,
+    query: str = "",
+    tag: str = "",
+    page_size: int = SEARCH_PAGE_SIZE
+) -> Iterator[Dict]:
+    """
+    Search hits of every dashboard (no folders) matching query and tag,
+    requesting pages until a short one shows the results are exhausted
+    """
+    page = 1
+    while True:
+        hits = manager.search_dashboards(query=query, tag=tag, limit=page_size, page=page, type_='dash-db')
+        for hit in hits:
+            if hit.get('type', 'dash-db') == 'dash-db':
+                yield hit
+        if len(hits) < page_size:
+            return
+        page += 1
+
+
+def build_dashboard_payload(
+    response: Dict,
+    patch: Optional[CompiledPatch] = None,
+    keep_id: bool = False,
+    remapper: Optional[DataSourceRemapper] = None
+) -> Dict:
+    """
+    Builds update_dashboard payload from a get_dashboard response,
+    applying patch and remapper to the dashboard. Numeric ids are instance
+    specific, so unless keep_id is set the destination matches the dashboard by uid
+    """
+    dashboard = response['dashboard']
+    if patch:
+        dashboard = patch.apply(dashboard)
+    if remapper is not None:
+        dashboard = remapper.remap(dashboard).dashboard
+    if not keep_id:
+        dashboard = dict(dashboard, id=None)
+
+    payload = {'dashboard': dashboard, 'overwrite': True}
+    folder_uid = response.get('meta', {}).get('folderUid')
+    if folder_uid:
+        payload['folderUid'] = folder_uid
+    return payload
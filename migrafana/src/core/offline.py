@@ -0,0 +1,265 @@
+import json
+import mmap
+import os
+import re
+from collections import deque
+from itertools import islice
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from core.archive import KIND_DASHBOARD, open_archive
+from core.files import atomic_path, write_atomic
+from core.json_parser.parser import CompiledPatch, compile_patch
+from core.migration import DashboardMigrationResult, MigrationReport
+from core.sync import same_content
+
+JSON_SUFFIXES = ('.json',)
+NDJSON_SUFFIXES = ('.ndjson', '.ndjson.gz', '.ndjson.zst', '.jsonl', '.jsonl.gz', '.jsonl.zst')
+
+# Lines of NDJSON handed to a worker at once: a byte range of an
+# uncompressed file, or this many lines of a compressed one
+CHUNK_BYTES = 4 * 1024 * 1024
+CHUNK_LINES = 1000
+
+# Fewer JSON files than this, without archives, are patched in this process
+SERIAL_THRESHOLD = 64
+
+# Patch of the current worker process, set once by the pool initializer
+_worker_patch: Optional[CompiledPatch] = None
+
+
+def patch_target(document: Any) -> Tuple[Any, Callable[[Any], Any]]:
+    """
+    Part of a document the patch applies to, and how to put the patched
+    part back: the dashboard model of a get_dashboard response
+    ({'dashboard': ..., 'meta': ...}), otherwise the whole document
+    """
+    if isinstance(document, dict) and isinstance(document.get('dashboard'), dict):
+        return document['dashboard'], lambda patched: dict(document, dashboard=patched)
+    return document, lambda patched: patched
+
+
+def patch_document(patch: CompiledPatch, document: Any) -> Any:
+    target, rebuild = patch_target(document)
+    patched = patch.apply(target)
+    return document if patched is target else rebuild(patched)
+
+
+def patch_record(patch: CompiledPatch, record: Any, kind: str) -> Any:
+    """Patches an export archive record of kind, or a plain NDJSON document"""
+    if isinstance(record, dict) and {'kind', 'uid', 'data'} <= record.keys():
+        if record['kind'] != kind:
+            return record
+        patched = patch_document(patch, record['data'])
+        return record if patched is record['data'] else dict(record, data=patched)
+    return patch_document(patch, record)
+
+
+def detect_indent(text: str) -> Union[int, str, None]:
+    """Indentation of a JSON text, so rewritten files keep their layout"""
+    match = re.search(r'\n([ \t]+)\S', text[:4096])
+    if match is None:
+        return None
+    indent = match.group(1)
+    return indent if '\t' in indent else len(indent)
+
+
+def patch_json_file(patch: CompiledPatch, path: str, target: str) -> Optional[str]:
+    """
+    Patches the JSON file at path into target (which may be path).
+    Returns 'unchanged' without writing when patching in place changes nothing
+    """
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    document = json.loads(text)
+    patched = patch_document(patch, document)
+    if target == path and same_content(document, patched):
+        return 'unchanged'
+
+    indent = detect_indent(text)
+    content = json.dumps(
+        patched,
+        indent=indent,
+        ensure_ascii=False,
+        separators=(',', ':') if indent is None else None
+    )
+    write_atomic(target, content + '\n' if text.endswith('\n') else content)
+    return None
+
+
+def patch_lines(patch: CompiledPatch, lines: List[Union[bytes, str]], kind: str) -> List[str]:
+    """Patches NDJSON lines, blank lines are dropped"""
+    output = []
+    for line in lines:
+        if not line.strip():
+            continue
+        record = patch_record(patch, json.loads(line), kind)
+        output.append(json.dumps(record, separators=(',', ':'), ensure_ascii=False) + '\n')
+    return output
+
+
+def read_range(path: str, start: int, end: int) -> List[bytes]:
+    """Lines of bytes start to end of a file, read through mmap"""
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return mm[start:end].splitlines()
+
+
+def line_ranges(path: str, chunk_bytes: int = CHUNK_BYTES) -> Iterator[Tuple[int, int]]:
+    """
+    Splits an uncompressed NDJSON file into byte ranges of about
+    chunk_bytes ending on line boundaries. Only newlines are searched
+    in the mapped file, lines are parsed by the workers
+    """
+    size = os.path.getsize(path)
+    if not size:
+        return
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = 0
+        while start < size:
+            newline = mm.find(b'\n', min(start + chunk_bytes, size) - 1)
+            end = size if newline == -1 else newline + 1
+            yield start, end
+            start = end
+
+
+def _init_worker(patch: CompiledPatch) -> None:
+    global _worker_patch
+    _worker_patch = patch
+
+
+def _in_worker(func: Callable, *args: Any) -> Any:
+    return func(_worker_patch, *args)
+
+
+def _patch_range(patch: CompiledPatch, path: str, start: int, end: int, kind: str) -> List[str]:
+    return patch_lines(patch, read_range(path, start, end), kind)
+
+
+class OfflinePatcher:
+    """
+    Applies a patch to local files without Grafana: JSON files (a
+    dashboard model or a get_dashboard response) and NDJSON archives,
+    e.g. written by export. Work is spread over worker processes, each
+    of which receives the patch once and reads its files itself;
+    uncompressed archives are split into byte ranges that workers map
+    instead of receiving the lines
+    """
+
+    def __init__(
+        self,
+        patch: Union[List[Dict], CompiledPatch],
+        output_dir: Optional[str] = None,
+        workers: Optional[int] = None,
+        kind: str = KIND_DASHBOARD,
+        on_progress: Optional[Callable[[DashboardMigrationResult, int, int], None]] = None,
+        chunk_bytes: int = CHUNK_BYTES
+    ):
+        self.patch = patch if isinstance(patch, CompiledPatch) else compile_patch(patch)
+        self.output_dir = output_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.kind = kind
+        self.on_progress = on_progress
+        self.chunk_bytes = chunk_bytes
+        self._pool = None
+
+    def run(self, paths: List[str]) -> MigrationReport:
+        """Patches every file of paths (directories are walked), returns the report"""
+        files = list(self.find_files(paths))
+        report = MigrationReport(total=len(files))
+        archives = [entry for entry in files if entry[0].endswith(NDJSON_SUFFIXES)]
+        if self.workers > 1 and (archives or len(files) >= SERIAL_THRESHOLD):
+            # multiprocessing is only imported when a pool is needed
+            from concurrent.futures import ProcessPoolExecutor
+
+            self._pool = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(self.patch,))
+        try:
+            pending: deque = deque()
+            for path, target in files:
+                if path.endswith(NDJSON_SUFFIXES):
+                    self._finish(report, path, self._patch_archive, path, target)
+                    continue
+                if self._pool is None:
+                    self._finish(report, path, patch_json_file, self.patch, path, target)
+                    continue
+                pending.append((path, self._pool.submit(_in_worker, patch_json_file, path, target)))
+                if len(pending) >= self.workers * 2:
+                    path, future = pending.popleft()
+                    self._finish(report, path, future.result)
+            while pending:
+                path, future = pending.popleft()
+                self._finish(report, path, future.result)
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+        return report
+
+    def find_files(self, paths: List[str]) -> Iterator[Tuple[str, str]]:
+        """(source, target) of every JSON and NDJSON file of paths"""
+        for path in paths:
+            if not os.path.isdir(path):
+                yield path, self._target(path, os.path.dirname(path))
+                continue
+            for directory, subdirectories, names in os.walk(path):
+                subdirectories.sort()
+                for name in sorted(names):
+                    if name.endswith(JSON_SUFFIXES + NDJSON_SUFFIXES):
+                        source = os.path.join(directory, name)
+                        yield source, self._target(source, path)
+
+    def _target(self, path: str, base: str) -> str:
+        if self.output_dir is None:
+            return path
+        target = os.path.join(self.output_dir, os.path.relpath(path, base or '.'))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        return target
+
+    def _finish(self, report: MigrationReport, path: str, func: Callable, *args: Any) -> None:
+        try:
+            skipped = func(*args)
+            result = DashboardMigrationResult(uid=path, ok=True, skipped=skipped)
+        except Exception as e:
+            result = DashboardMigrationResult(uid=path, ok=False, error=f"{type(e).__name__}: {e}")
+        report.results.append(result)
+        if self.on_progress:
+            self.on_progress(result, len(report.results), report.total)
+
+    def _patch_archive(self, path: str, target: str) -> None:
+        """Patches an NDJSON archive chunk by chunk, writing chunks in order"""
+        with atomic_path(target) as tmp, open_archive(tmp, 'w') as output:
+            for lines in self._patched_chunks(path):
+                output.writelines(lines)
+
+    def _patched_chunks(self, path: str) -> Iterator[List[str]]:
+        if path.endswith(('.gz', '.zst')):
+            tasks = (
+                (patch_lines, chunk, self.kind)
+                for chunk in self._line_chunks(path)
+            )
+        else:
+            tasks = (
+                (_patch_range, path, start, end, self.kind)
+                for start, end in line_ranges(path, self.chunk_bytes)
+            )
+
+        if self._pool is None:
+            for func, *args in tasks:
+                yield func(self.patch, *args)
+            return
+
+        # Bounds chunks held in memory to two per worker
+        pending: deque = deque()
+        for task in tasks:
+            pending.append(self._pool.submit(_in_worker, *task))
+            if len(pending) >= self.workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    @staticmethod
+    def _line_chunks(path: str) -> Iterator[List[str]]:
+        with open_archive(path) as archive:
+            while True:
+                chunk = list(islice(archive, CHUNK_LINES))
+                if not chunk:
+                    return
+                yield chunk
@@ -0,0 +1,212 @@
+from threading import Lock
+from typing import Any, Dict, Iterable, List, NamedTuple, Tuple, Union
+
+from core.json_parser.parser import JSONPathCopyOnWrite, JSONPathResolver, PathHandle
+from core.metrics import METRICS
+
+# Data sources Grafana provides itself, the same on every instance
+BUILTIN_DATASOURCES = frozenset(('grafana', '-- Grafana --', '-- Mixed --', '-- Dashboard --', 'default'))
+
+# Rewrite of a reference that matches no data source
+_UNMATCHED = object()
+
+
+class UnmatchedReference(NamedTuple):
+    """Data source reference of a dashboard with no counterpart on the destination"""
+    path: str
+    reference: Any
+
+
+class RemapResult(NamedTuple):
+    """Dashboard with its data source references rewritten"""
+    dashboard: Any
+    rewritten: int
+    unmatched: List[UnmatchedReference]
+
+
+class DataSourceRemapper:
+    """
+    Rewrites the data source references of dashboards moved to
+    another instance. Source and destination data sources (as returned
+    by list_datasources) are paired once: by name and type, then by
+    uid and type, then by name. Every reference of a dashboard - of
+    panels, nested panels and their targets, templating variables and
+    annotations - is then rewritten in a single walk of the model.
+
+    References are {'uid': ..., 'type': ...} objects, legacy name or
+    uid strings and numeric datasourceId fields; variables ('$ds')
+    and built-in data sources are left alone. References to neither
+    a paired source data source nor one existing on the destination
+    are reported as unmatched, per dashboard uid
+    """
+
+    def __init__(self, source: Iterable[Dict], destination: Iterable[Dict]):
+        destination = list(destination)
+        by_name_type = {(ds.get('name'), ds.get('type')): ds for ds in destination}
+        by_uid = {ds.get('uid'): ds for ds in destination}
+        by_name = {ds.get('name'): ds for ds in destination}
+
+        # Source reference (uid, name or id) -> destination data source
+        self._uids: Dict[str, Dict] = {}
+        self._names: Dict[str, Dict] = {}
+        self._ids: Dict[int, Dict] = {}
+        # Source data sources without a destination counterpart
+        self.unpaired: List[Dict] = []
+        for ds in source:
+            name, kind, uid = ds.get('name'), ds.get('type'), ds.get('uid')
+            target = by_name_type.get((name, kind))
+            if target is None and uid in by_uid and by_uid[uid].get('type') == kind:
+                target = by_uid[uid]
+            if target is None:
+                target = by_name.get(name)
+            if target is None:
+                self.unpaired.append(ds)
+                continue
+            if uid is not None:
+                self._uids[uid] = target
+            if name is not None:
+                self._names[name] = target
+            if ds.get('id') is not None:
+                self._ids[ds['id']] = target
+
+        # References already valid on the destination are kept as they are
+        self._known_uids = frozenset(by_uid) - {None}
+        self._known_names = frozenset(by_name) - {None}
+        self._known_ids = frozenset(ds.get('id') for ds in destination) - {None}
+
+        self._lock = Lock()
+        self.unmatched: Dict[str, List[UnmatchedReference]] = {}
+
+    @classmethod
+    def from_managers(cls, source: Any, destination: Any) -> 'DataSourceRemapper':
+        """Pairs the data sources of two data source managers"""
+        return cls(source.list_datasources(), destination.list_datasources())
+
+    @property
+    def pairs(self) -> Dict[str, str]:
+        """Source data source uid -> destination data source uid"""
+        return {uid: target.get('uid') for uid, target in self._uids.items()}
+
+    def remap(self, dashboard: Any) -> RemapResult:
+        """
+        Rewrites every data source reference of a dashboard model.
+        The input is not modified; containers on the way to a rewritten
+        reference are copied, so a dashboard without references to
+        rewrite is returned as is
+        """
+        edits, unmatched = self._scan(dashboard)
+        document = JSONPathCopyOnWrite(dashboard)
+        for components, value in edits:
+            document.own_parent(components)[components[-1]] = value
+
+        if unmatched and isinstance(dashboard, dict):
+            with self._lock:
+                self.unmatched.setdefault(str(dashboard.get('uid')), []).extend(unmatched)
+        METRICS.increment('datasource_references_total', len(edits), result='rewritten')
+        METRICS.increment('datasource_references_total', len(unmatched), result='unmatched')
+        return RemapResult(document.root, len(edits), unmatched)
+
+    def _scan(self, dashboard: Any) -> Tuple[List[Tuple[List[Union[int, str]], Any]], List[UnmatchedReference]]:
+        """
+        Rewrites of every reference as (path components, new value),
+        and the references that could not be rewritten, in document order
+        """
+        edits = []
+        unmatched = []
+        stack: List[Tuple[Any, Tuple]] = [(dashboard, ())]
+        while stack:
+            value, trail = stack.pop()
+            if isinstance(value, list):
+                children = list(enumerate(value))
+            elif isinstance(value, dict):
+                children = list(value.items())
+                self._scan_object(value, trail, edits, unmatched)
+            else:
+                continue
+            for key, child in reversed(children):
+                if isinstance(child, (dict, list)):
+                    stack.append((child, (trail, key)))
+        return edits, unmatched
+
+    def _scan_object(
+        self,
+        item: Dict,
+        trail: Tuple,
+        edits: List[Tuple[List[Union[int, str]], Any]],
+        unmatched: List[UnmatchedReference]
+    ) -> None:
+        """Checks the reference fields of one object"""
+        for key, lookup in (('datasource', self._rewrite), ('datasourceId', self._rewrite_id)):
+            if key not in item:
+                continue
+            reference = item[key]
+            rewritten = lookup(reference)
+            if rewritten is _UNMATCHED:
+                unmatched.append(UnmatchedReference(
+                    JSONPathResolver.build_path(PathHandle.unwind((trail, key))), reference
+                ))
+            elif rewritten is not reference:
+                edits.append((PathHandle.unwind((trail, key)), rewritten))
+
+        # Current value of a data source variable is a data source uid or name
+        current = item.get('current')
+        if item.get('type') == 'datasource' and isinstance(current, dict) \
+                and isinstance(current.get('value'), str):
+            rewritten = self._rewrite(current['value'])
+            if rewritten is _UNMATCHED:
+                unmatched.append(UnmatchedReference(
+                    JSONPathResolver.build_path(PathHandle.unwind((trail, 'current'))), current
+                ))
+            elif rewritten is not current['value']:
+                target = self._names.get(current['value']) or self._uids[current['value']]
+                edits.append((
+                    PathHandle.unwind((trail, 'current')),
+                    dict(current, value=rewritten, text=target.get('name', current.get('text')))
+                ))
+
+    def _rewrite(self, reference: Any) -> Any:
+        """
+        Destination form of a datasource field: the reference itself when
+        it needs no rewrite, _UNMATCHED when it cannot be matched
+        """
+        if isinstance(reference, dict):
+            uid = reference.get('uid')
+            if not isinstance(uid, str) or self._keeps(uid) \
+                    or (uid in self._known_uids and uid not in self._uids):
+                return reference
+            target = self._uids.get(uid)
+            if target is None:
+                return _UNMATCHED
+            if target.get('uid') == uid and target.get('type', reference.get('type')) == reference.get('type'):
+                return reference
+            rewritten = dict(reference, uid=target.get('uid'))
+            if 'type' in reference or 'type' in target:
+                rewritten['type'] = target.get('type')
+            return rewritten
+
+        if not isinstance(reference, str) or self._keeps(reference):
+            return reference
+        # Legacy references are names, later ones uids; the form is kept
+        if reference in self._names:
+            name = self._names[reference].get('name')
+            return reference if name == reference else name
+        if reference in self._uids:
+            uid = self._uids[reference].get('uid')
+            return reference if uid == reference else uid
+        if reference in self._known_names or reference in self._known_uids:
+            return reference
+        return _UNMATCHED
+
+    def _rewrite_id(self, reference: Any) -> Any:
+        """Destination form of a datasourceId field"""
+        if not isinstance(reference, int) or isinstance(reference, bool) or not reference:
+            return reference
+        target = self._ids.get(reference)
+        if target is None:
+            return reference if reference in self._known_ids else _UNMATCHED
+        return reference if target.get('id') == reference else target.get('id')
+
+    @staticmethod
+    def _keeps(reference: str) -> bool:
+        """Whether a reference is a variable or built in, valid anywhere"""
+        return not reference or '$' in reference or reference in BUILTIN_DATASOURCES
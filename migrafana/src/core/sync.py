@@ -0,0 +1,80 @@
+import hashlib
+import json
+from threading import Lock
+from typing import Any, Dict, Iterable, Optional
+
+from core.files import write_atomic
+
+# Top-level fields Grafana assigns on every write, not part of the content
+DASHBOARD_VOLATILE_KEYS = ('id', 'version')
+DATASOURCE_VOLATILE_KEYS = ('id', 'orgId', 'version')
+
+
+def canonical_hash(data: Any, ignore: Iterable[str] = ()) -> str:
+    """
+    sha256 of key-sorted, whitespace-free JSON of data,
+    without the top-level keys in ignore
+    """
+    if ignore and isinstance(data, dict):
+        data = {key: value for key, value in data.items() if key not in ignore}
+    content = json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def same_content(original: Any, patched: Any, ignore: Iterable[str] = ()) -> bool:
+    """
+    Whether writing patched over original would be a no-op.
+    A patch that matched nothing returns its input, so identity
+    is checked before hashing
+    """
+    return original is patched or canonical_hash(original, ignore) == canonical_hash(patched, ignore)
+
+
+class SyncState:
+    """
+    State of incremental syncs kept in a JSON file: for every UID the
+    source version last synced, the hash of the patch applied to it and
+    the hash of the patched output pushed. One file per destination
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = Lock()
+        try:
+            with open(path) as f:
+                self._entries: Dict[str, Dict] = json.load(f)
+        except FileNotFoundError:
+            self._entries = {}
+
+    def is_current(self, uid: str, version: Optional[int], patch_hash: str) -> bool:
+        """Whether source version of uid was already synced with the same patch"""
+        if version is None:
+            return False
+        with self._lock:
+            entry = self._entries.get(uid)
+        return (
+            entry is not None
+            and entry.get('version') == version
+            and entry.get('patch') == patch_hash
+        )
+
+    def is_pushed(self, uid: str, digest: str) -> bool:
+        """Whether output with this hash was already pushed for uid"""
+        with self._lock:
+            entry = self._entries.get(uid)
+        return entry is not None and entry.get('hash') == digest
+
+    def record(
+        self,
+        uid: str,
+        version: Optional[int],
+        digest: str,
+        patch_hash: str
+    ) -> None:
+        with self._lock:
+            self._entries[uid] = {'version': version, 'hash': digest, 'patch': patch_hash}
+
+    def save(self) -> None:
+        """Writes the state file atomically"""
+        with self._lock:
+            write_atomic(self.path, json.dumps(self._entries))
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modules under src import each other from the src root (e.g. `core.models`)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), 'src'))
@@ -0,0 +1,226 @@
+from grafana_client.client import GrafanaClientError
+
+from core.cache import CachingDashboardManager, CachingDataSourceManager, DashboardCache, DataSourceCatalog
+
+
+def make_dashboard(uid, version, title="Dashboard"):
+    return {
+        "dashboard": {"uid": uid, "version": version, "title": title},
+        "meta": {"updated": f"2024-01-0{version}T00:00:00Z"}
+    }
+
+
+class CountingManager:
+    """Dashboard manager counting network fetches"""
+
+    def __init__(self, dashboards):
+        self.dashboards = dashboards
+        self.fetches = 0
+
+    def get_dashboard(self, uid):
+        self.fetches += 1
+        return self.dashboards[uid]
+
+    def get_dashboard_version(self, uid):
+        return self.dashboards[uid]["dashboard"]["version"]
+
+    def search_dashboards(self, query="", tag="", limit=None, page=None, type_=None):
+        # Fields of Grafana's search hits: no version or updated timestamp
+        return [
+            {"id": i, "uid": uid, "title": d["dashboard"]["title"], "type": "dash-db",
+             "url": f"/d/{uid}", "tags": [], "folderUid": "ops"}
+            for i, (uid, d) in enumerate(self.dashboards.items())
+        ]
+
+
+class NoVersionsManager(CountingManager):
+    """Dashboard manager whose token may read dashboards but not their versions"""
+
+    def get_dashboard_version(self, uid):
+        raise GrafanaClientError(403, {"message": "Access denied"}, "Client Error 403: Access denied")
+
+
+class CountingDataSourceManager:
+    """Data source manager counting network calls"""
+
+    def __init__(self, datasources):
+        self.datasources = datasources
+        self.calls = 0
+
+    def list_datasources(self):
+        self.calls += 1
+        return [dict(ds) for ds in self.datasources]
+
+    def get_datasource(self, uid):
+        self.calls += 1
+        return next(dict(ds) for ds in self.datasources if ds["uid"] == uid)
+
+    def get_datasource_id_by_uid(self, uid):
+        return self.get_datasource(uid)["id"]
+
+    def update_datasource(self, uid, config):
+        self.calls += 1
+        self.datasources = [config if ds["uid"] == uid else ds for ds in self.datasources]
+        return {"message": "Datasource updated"}
+
+    def get_datasource_health(self, uid):
+        return {"status": "OK"}
+
+
+DATASOURCES = [
+    {"id": 1, "uid": "prom", "name": "Prometheus", "type": "prometheus"},
+    {"id": 2, "uid": "loki", "name": "Loki", "type": "loki"},
+]
+
+
+class TestDashboardCache:
+    """Tests for the on-disk dashboard cache"""
+
+    def test_revalidates_by_version(self, tmp_path):
+        cache = DashboardCache(str(tmp_path))
+        cache.put("http://grafana", "abc", make_dashboard("abc", 1))
+
+        assert cache.get("http://grafana", "abc", version=1) == make_dashboard("abc", 1)
+        assert cache.get("http://grafana", "abc", version=2) is None
+        assert cache.get("http://grafana", "abc") is None
+        assert cache.get("http://other", "abc", version=1) is None
+
+    def test_index_persists(self, tmp_path):
+        cache = DashboardCache(str(tmp_path))
+        cache.put("http://grafana", "abc", make_dashboard("abc", 1))
+        cache.flush()
+
+        reopened = DashboardCache(str(tmp_path))
+        assert reopened.get("http://grafana", "abc", version=1) is not None
+
+    def test_lru_eviction(self, tmp_path):
+        cache = DashboardCache(str(tmp_path), max_bytes=250)
+        for i in range(1, 4):
+            cache.put("http://grafana", f"uid{i}", make_dashboard(f"uid{i}", i))
+            cache.get("http://grafana", "uid1", version=1)
+
+        assert cache.get("http://grafana", "uid1", version=1) is not None
+        assert cache.get("http://grafana", "uid2", version=2) is None
+        assert len(list((tmp_path / "objects").iterdir())) == 2
+
+
+class TestCachingDashboardManager:
+    """Tests for cache-backed dashboard fetching"""
+
+    def test_unchanged_dashboards_are_not_fetched(self, tmp_path):
+        source = CountingManager({"abc": make_dashboard("abc", 1)})
+        cache = DashboardCache(str(tmp_path))
+
+        manager = CachingDashboardManager(source, cache, instance="http://grafana")
+        manager.search_dashboards()
+        manager.get_dashboard("abc")
+        manager.get_dashboard("abc")
+        assert source.fetches == 1
+
+        source.dashboards["abc"] = make_dashboard("abc", 2, title="Changed")
+        assert manager.get_dashboard("abc")["dashboard"]["title"] == "Changed"
+        assert source.fetches == 2
+
+    def test_cache_survives_runs(self, tmp_path):
+        source = CountingManager({"abc": make_dashboard("abc", 1)})
+        first = DashboardCache(str(tmp_path))
+        CachingDashboardManager(source, first, instance="http://grafana").get_dashboard("abc")
+        first.flush()
+
+        manager = CachingDashboardManager(source, DashboardCache(str(tmp_path)), instance="http://grafana")
+        assert manager.get_dashboard("abc") == make_dashboard("abc", 1)
+        assert source.fetches == 1
+
+    def test_refused_versions_fetch_without_cache(self, tmp_path):
+        source = NoVersionsManager({"abc": make_dashboard("abc", 1)})
+        manager = CachingDashboardManager(source, DashboardCache(str(tmp_path)), instance="http://grafana")
+
+        assert manager.get_dashboard("abc") == make_dashboard("abc", 1)
+        assert manager.get_dashboard("abc") == make_dashboard("abc", 1)
+        assert source.fetches == 2
+
+
+class TestDataSourceCatalog:
+    """Tests for the in-memory data source index"""
+
+    def test_lookups_share_one_list_call(self):
+        source = CountingDataSourceManager(DATASOURCES)
+        catalog = DataSourceCatalog(source)
+
+        assert catalog.by_uid("loki")["name"] == "Loki"
+        assert catalog.by_id(1)["uid"] == "prom"
+        assert catalog.by_id("2")["uid"] == "loki"
+        assert catalog.by_name("Prometheus")["id"] == 1
+        assert catalog.by_uid("missing") is None
+        assert source.calls == 1
+
+    def test_entries_are_copies(self):
+        catalog = DataSourceCatalog(CountingDataSourceManager(DATASOURCES))
+        catalog.by_uid("prom")["name"] = "Changed"
+        assert catalog.by_uid("prom")["name"] == "Prometheus"
+
+    def test_ttl_and_refresh(self, monkeypatch):
+        source = CountingDataSourceManager(DATASOURCES)
+        catalog = DataSourceCatalog(source, ttl=60)
+        now = [1000.0]
+        monkeypatch.setattr("core.cache.time.monotonic", lambda: now[0])
+
+        catalog.by_uid("prom")
+        now[0] += 30
+        catalog.by_uid("prom")
+        assert source.calls == 1
+
+        now[0] += 31
+        source.datasources = DATASOURCES[1:]
+        assert catalog.by_uid("prom") is None
+        assert source.calls == 2
+
+        source.datasources = DATASOURCES
+        catalog.refresh()
+        assert catalog.by_uid("prom") is not None
+        assert source.calls == 3
+
+
+class TestCachingDataSourceManager:
+    """Tests for catalog-backed data source lookups"""
+
+    def test_lookups_are_served_from_memory(self):
+        source = CountingDataSourceManager(DATASOURCES)
+        manager = CachingDataSourceManager(source)
+
+        assert manager.find_datasource("prom")["name"] == "Prometheus"
+        assert manager.find_datasource_by_name("Loki")["uid"] == "loki"
+        assert manager.find_datasource_by_id(2)["uid"] == "loki"
+        assert manager.find_datasource("missing") is None
+        assert manager.get_datasource_id_by_uid("loki") == 2
+        assert [ds["uid"] for ds in manager.list_datasources()] == ["prom", "loki"]
+        assert manager.get_datasource_health("prom") == {"status": "OK"}
+        assert source.calls == 1
+
+    def test_getters_return_the_full_object(self):
+        source = CountingDataSourceManager([dict(DATASOURCES[0], version=3, secureJsonFields={"password": True})])
+        manager = CachingDataSourceManager(source)
+        manager.list_datasources()
+
+        datasource = manager.get_datasource("prom")
+        assert datasource["version"] == 3
+        assert datasource["secureJsonFields"] == {"password": True}
+        assert source.calls == 2
+
+    def test_writes_invalidate(self):
+        source = CountingDataSourceManager(DATASOURCES)
+        manager = CachingDataSourceManager(source)
+        manager.find_datasource("prom")
+
+        manager.update_datasource("prom", dict(DATASOURCES[0], name="Renamed"))
+        assert manager.find_datasource("prom")["name"] == "Renamed"
+        assert source.calls == 3
+
+    def test_missing_ids_fall_back_to_the_manager(self):
+        source = CountingDataSourceManager(DATASOURCES)
+        manager = CachingDataSourceManager(source, ttl=None)
+        manager.list_datasources()
+
+        source.datasources = DATASOURCES + [{"id": 3, "uid": "new", "name": "New", "type": "tempo"}]
+        assert manager.get_datasource_id_by_uid("new") == 3
+        assert source.calls == 2
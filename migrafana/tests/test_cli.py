@@ -0,0 +1,52 @@
+import json
+
+import pytest  # type: ignore
+from click.testing import CliRunner
+
+from cli.main import cli
+
+
+@pytest.fixture
+def bad_patch(tmp_path):
+    path = tmp_path / "patch.json"
+    path.write_text("[{not json")
+    return str(path)
+
+
+class TestPatchOptions:
+    """Unreadable patch files must stop a command before anything is written"""
+
+    def test_migrate_all_rejects_invalid_patch(self, bad_patch):
+        result = CliRunner().invoke(cli, ["migrate-all", "--src", "http://grafana", "--patch", bad_patch])
+        assert result.exit_code == 2
+        assert "Cannot read patch file" in result.output
+
+    def test_migrate_all_rejects_missing_patch(self, tmp_path):
+        missing = str(tmp_path / "missing.json")
+        result = CliRunner().invoke(cli, ["migrate-all", "--src", "http://grafana", "--patch", missing])
+        assert result.exit_code == 2
+
+    @pytest.mark.parametrize("option", ["--patch", "--datasource-patch"])
+    def test_import_rejects_invalid_patch(self, bad_patch, tmp_path, option):
+        archive = tmp_path / "grafana.ndjson"
+        archive.write_text("")
+        result = CliRunner().invoke(
+            cli, ["import", "--dest", "http://grafana", "--input", str(archive), option, bad_patch]
+        )
+        assert result.exit_code == 2
+        assert option in result.output
+
+    @pytest.mark.parametrize("command", ["dashboard", "datasource"])
+    def test_single_object_commands_reject_invalid_patch(self, bad_patch, command):
+        result = CliRunner().invoke(
+            cli, [command, "--src", "http://grafana", "--uuid", "abc", "--patch", bad_patch]
+        )
+        assert result.exit_code == 2
+        assert "Cannot read patch file" in result.output
+
+    def test_patch_rejects_invalid_patch(self, bad_patch, tmp_path):
+        document = tmp_path / "dashboard.json"
+        document.write_text(json.dumps({"title": "A"}))
+        result = CliRunner().invoke(cli, ["patch", str(document), "--patch", bad_patch])
+        assert result.exit_code == 2
+        assert json.loads(document.read_text()) == {"title": "A"}
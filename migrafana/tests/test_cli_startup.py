@@ -0,0 +1,58 @@
+import os
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+# Cumulative import time of cli.main, well above the ~50ms it takes
+# without the Grafana client stack and well below the ~300ms with it
+IMPORT_BUDGET_MS = 150
+
+HEAVY_MODULES = ('grafana_client', 'niquests', 'urllib3', 'pydantic', 'dotenv', 'multiprocessing')
+
+
+def run_python(code, *flags):
+    return subprocess.run(
+        [sys.executable, *flags, '-c', code],
+        cwd=SRC,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+
+
+def import_times():
+    """(module, cumulative microseconds) of every import of cli.main, via -X importtime"""
+    stderr = run_python('import cli.main', '-X', 'importtime').stderr
+    times = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times.append((name.strip(), int(cumulative)))
+    return times
+
+
+class TestCliStartup:
+    """Startup of the CLI must not pay for the Grafana client stack"""
+
+    def test_heavy_modules_are_not_imported(self):
+        imported = {name.split('.')[0] for name, _ in import_times()}
+        assert imported.isdisjoint(HEAVY_MODULES)
+
+    def test_import_time_budget(self):
+        # Best of three, the first run may include writing bytecode caches
+        best = min(dict(import_times())['cli.main'] for _ in range(3))
+        assert best / 1000 < IMPORT_BUDGET_MS
+
+    def test_help_stays_light(self):
+        code = (
+            'import sys\n'
+            'from cli.main import cli\n'
+            'try:\n'
+            '    cli(["--help"])\n'
+            'except SystemExit:\n'
+            '    pass\n'
+            f'print(sorted(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n'
+        )
+        assert run_python(code).stdout.strip().splitlines()[-1] == '[]'
@@ -0,0 +1,251 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import niquests
+import pytest  # type: ignore
+from grafana_client.client import GrafanaClientError, GrafanaServerError, GrafanaTimeoutError
+from niquests.exceptions import Timeout
+
+from core.api.base import AsyncGrafanaAPIClient
+from core.api.dashboard import AsyncGrafanaDashboardManager, GrafanaDashboardManager, latest_version
+from core.api.datasource import AsyncGrafanaDataSourceManager
+from core.api.throttle import ThrottleRegistry
+from core.migration import patch_hash
+from core.models import GrafanaConfig
+from core.remap import DataSourceRemapper
+from core.sync import SyncState
+
+
+class FakeDashboardApi:
+    """grafana-client dashboard element serving in-memory dashboards"""
+
+    def __init__(self, dashboards=None):
+        self.dashboards = dashboards or {}
+        self.updated = []
+
+    def get_dashboard(self, uid):
+        if uid not in self.dashboards:
+            raise GrafanaClientError(404, None, "Dashboard not found")
+        return {"dashboard": self.dashboards[uid], "meta": {"folderUid": "ops", "version": 7}}
+
+    def update_dashboard(self, dashboard):
+        self.updated.append(dashboard)
+        return {"status": "success"}
+
+
+def dashboard_manager(dashboards=None):
+    api = SimpleNamespace(client=SimpleNamespace(dashboard=FakeDashboardApi(dashboards)))
+    return GrafanaDashboardManager(api)
+
+
+def source_dashboard():
+    return {
+        "id": 42,
+        "uid": "dash",
+        "version": 7,
+        "title": "Service",
+        "panels": [{"type": "timeseries", "datasource": {"type": "prometheus", "uid": "prom-src"}}],
+    }
+
+
+class TestTransferDatasource:
+    """Tests for GrafanaDashboardManager.transfer_datasource"""
+
+    patch = [{"op": "replace", "path": "/title", "value": "Moved"}]
+
+    def test_transfer_to_another_instance(self):
+        source = dashboard_manager({"dash": source_dashboard()})
+        target = dashboard_manager()
+
+        assert source.transfer_datasource("dash", self.patch, target) == {"status": "success"}
+
+        (payload,) = target.api.client.dashboard.updated
+        assert payload["overwrite"] is True
+        assert payload["folderUid"] == "ops"
+        assert "meta" not in payload
+        assert payload["dashboard"]["id"] is None
+        assert payload["dashboard"]["title"] == "Moved"
+        assert source.api.client.dashboard.updated == []
+
+    def test_refused_lookup_is_not_a_missing_dashboard(self):
+        source = dashboard_manager({"dash": source_dashboard()})
+        target = dashboard_manager()
+
+        def refused(uid):
+            raise GrafanaClientError(403, {"message": "Access denied"}, "Client Error 403: Access denied")
+
+        target.api.client.dashboard.get_dashboard = refused
+        with pytest.raises(GrafanaClientError):
+            source.transfer_datasource("dash", self.patch, target)
+        assert target.api.client.dashboard.updated == []
+
+    def test_transfer_in_place_keeps_id(self):
+        source = dashboard_manager({"dash": source_dashboard()})
+
+        source.transfer_datasource("dash", self.patch)
+        (payload,) = source.api.client.dashboard.updated
+        assert payload["dashboard"]["id"] == 42
+
+    def test_transfer_remaps_datasources(self):
+        source = dashboard_manager({"dash": source_dashboard()})
+        target = dashboard_manager()
+        remapper = DataSourceRemapper(
+            [{"id": 1, "uid": "prom-src", "name": "Prometheus", "type": "prometheus"}],
+            [{"id": 2, "uid": "prom-dest", "name": "Prometheus", "type": "prometheus"}],
+        )
+
+        source.transfer_datasource("dash", [], target, remapper=remapper)
+        (payload,) = target.api.client.dashboard.updated
+        assert payload["dashboard"]["panels"][0]["datasource"]["uid"] == "prom-dest"
+
+    def test_new_pairing_is_not_up_to_date(self, tmp_path):
+        source = dashboard_manager({"dash": source_dashboard()})
+        target = dashboard_manager()
+        state = SyncState(str(tmp_path / "state.json"))
+        datasources = [{"id": 1, "uid": "prom-src", "name": "Prometheus", "type": "prometheus"}]
+
+        first = DataSourceRemapper(datasources, [{"uid": "prom-a", "name": "Prometheus", "type": "prometheus"}])
+        source.transfer_datasource("dash", self.patch, target, state, remapper=first)
+        second = DataSourceRemapper(datasources, [{"uid": "prom-b", "name": "Prometheus", "type": "prometheus"}])
+
+        assert state.is_current("dash", 7, patch_hash(self.patch, first))
+        assert not state.is_current("dash", 7, patch_hash(self.patch, second))
+
+
+class TestDashboardVersion:
+    """Tests for reading a dashboard's current version"""
+
+    def test_latest_version_of_both_response_shapes(self):
+        assert latest_version([{"version": 5}, {"version": 4}]) == 5
+        assert latest_version({"versions": [{"version": 9}], "continueToken": ""}) == 9
+        assert latest_version([]) is None
+        assert latest_version({"versions": []}) is None
+
+    def test_requests_one_entry(self):
+        requests = []
+
+        def get(path, params=None):
+            requests.append((path, params))
+            return [{"version": 3}]
+
+        api = SimpleNamespace(client=SimpleNamespace(client=SimpleNamespace(GET=get)))
+        assert GrafanaDashboardManager(api).get_dashboard_version("dash") == 3
+        assert requests == [("/dashboards/uid/dash/versions", {"limit": 1})]
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.headers = {"Content-Type": "application/json"}
+        self.body = body
+
+    @property
+    def text(self):
+        return json.dumps(self.body)
+
+    def json(self):
+        return self.body
+
+
+class FakeAsyncTransport:
+    """Replaces the asyncio HTTP layer with queued responses (or exceptions)"""
+
+    def __init__(self):
+        self.queue = []
+        self.sent = []
+        self.closed = 0
+
+    async def request(self, session, method, url, **kwargs):
+        self.sent.append((method.upper(), url, kwargs))
+        outcome = self.queue.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    async def close(self, session):
+        self.closed += 1
+
+
+@pytest.fixture
+def transport(monkeypatch):
+    fake = FakeAsyncTransport()
+    monkeypatch.setattr(
+        niquests.AsyncSession, "request",
+        lambda session, *args, **kwargs: fake.request(session, *args, **kwargs)
+    )
+    monkeypatch.setattr(niquests.AsyncSession, "close", lambda session: fake.close(session))
+    ThrottleRegistry.clear()
+    yield fake
+    ThrottleRegistry.clear()
+
+
+def async_client():
+    return AsyncGrafanaAPIClient(GrafanaConfig(url="http://grafana:3000", api_key="token"))
+
+
+class TestAsyncManagers:
+    """Tests for the asyncio client and managers against a fake transport"""
+
+    def test_builds_requests(self, transport):
+        transport.queue = [
+            FakeResponse(200, {"dashboard": {"uid": "dash"}, "meta": {}}),
+            FakeResponse(200, [{"version": 4}]),
+            FakeResponse(200, [{"uid": "dash"}]),
+            FakeResponse(200, {"id": 1, "uid": "prom"}),
+        ]
+        client = async_client()
+        dashboards = AsyncGrafanaDashboardManager(client)
+        datasources = AsyncGrafanaDataSourceManager(client)
+
+        async def run():
+            assert (await dashboards.get_dashboard("dash"))["dashboard"]["uid"] == "dash"
+            assert await dashboards.get_dashboard_version("dash") == 4
+            assert await dashboards.search_dashboards(query="svc", limit=10, page=2) == [{"uid": "dash"}]
+            assert await datasources.create_datasource({"name": "Prometheus"}) == {"id": 1, "uid": "prom"}
+
+        asyncio.run(run())
+        (get, versions, search, create) = transport.sent
+        assert get[:2] == ("GET", "http://grafana:3000/api/dashboards/uid/dash")
+        assert versions[:2] == ("GET", "http://grafana:3000/api/dashboards/uid/dash/versions")
+        assert versions[2]["params"] == {"limit": 1}
+        assert search[:2] == ("GET", "http://grafana:3000/api/search")
+        assert search[2]["params"] == {"query": "svc", "limit": 10, "page": 2}
+        assert create[:2] == ("POST", "http://grafana:3000/api/datasources")
+        assert create[2]["json"] == {"name": "Prometheus"}
+        assert get[2]["auth"].token == "token"
+
+    def test_maps_errors(self, transport):
+        transport.queue = [
+            FakeResponse(404, {"message": "Dashboard not found"}),
+            FakeResponse(403, {"message": "Access denied"}),
+            FakeResponse(500, {"message": "boom"}),
+            Timeout("timed out"),
+        ]
+        client = async_client()
+        dashboards = AsyncGrafanaDashboardManager(client)
+        datasources = AsyncGrafanaDataSourceManager(client)
+
+        async def run():
+            assert await dashboards.find_dashboard("missing") is None
+            with pytest.raises(GrafanaClientError):
+                await datasources.find_datasource("prom")
+            with pytest.raises(GrafanaServerError):
+                await datasources.get_datasource("prom")
+            # Writes are not retried, so the timeout is final
+            with pytest.raises(GrafanaTimeoutError):
+                await datasources.create_datasource({"name": "Prometheus"})
+
+        asyncio.run(run())
+        assert len(transport.sent) == 4
+
+    def test_context_manager_closes_the_session(self, transport):
+        async def run():
+            async with async_client() as client:
+                assert transport.closed == 0
+            return client
+
+        client = asyncio.run(run())
+        assert transport.closed == 1
+        # The slot of every request is returned
+        assert client.client.client.s.throttle.concurrency.try_acquire() is not None
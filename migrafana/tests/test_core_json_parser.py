@@ -0,0 +1,476 @@
+from copy import deepcopy
+import pickle
+import pytest  # type: ignore
+from migrafana.src.core.json_parser.parser import (
+    CompiledPatch,
+    CompiledSelector,
+    JSONPathCompiler,
+    JSONPathConditionEvaluator,
+    JSONPathConditionParser,
+    JSONPathResolver,
+    JSONPathSelectorIndex,
+    PatchGroup,
+    STEP_DESCENDANT,
+    STEP_KEY,
+    STEP_SELECTOR,
+    STEP_WILDCARD,
+    apply_patch,
+    apply_patch_many,
+    compile_patch
+)
+
+
+@pytest.fixture
+def dashboard():
+    return deepcopy({
+        "panels": [
+            {"id": 1, "type": "row", "title": "Row 1"},
+            {"id": 2, "type": "graph", "title": "CPU usage"},
+            {"id": 3, "type": "row", "title": "Row 2"}
+        ],
+        "a/b": {"c~d": 1},
+        "settings": {"refresh": "30s"}
+    })
+
+
+class TestCompilePatch:
+    """Tests for compiled patch programs"""
+
+    def test_compile_path_steps(self):
+        steps = JSONPathCompiler.compile_path("/panels/*/[?title=~'CPU.*']/a~1b")
+        assert steps[0] == (STEP_KEY, "panels")
+        assert steps[1] == (STEP_WILDCARD, None)
+        kind, selector = steps[2]
+        assert kind == STEP_SELECTOR
+        assert isinstance(selector, CompiledSelector)
+        assert selector.matches({"title": "CPU load"}) is True
+        assert steps[3] == (STEP_KEY, "a/b")
+
+    def test_compiled_patch_is_reusable(self, dashboard):
+        compiled = compile_patch([
+            {"op": "replace", "path": "/panels/[?type=='row']/title", "value": "Row"}
+        ])
+        assert isinstance(compiled, CompiledPatch)
+
+        first = compiled.apply(dashboard)
+        second = compiled.apply(dashboard)
+        assert first == second
+        assert [p["title"] for p in first["panels"]] == ["Row", "CPU usage", "Row"]
+        assert dashboard["panels"][0]["title"] == "Row 1"
+
+    def test_apply_patch_accepts_compiled(self, dashboard):
+        patch = [
+            {"op": "replace", "path": "/panels/[?title=~'CPU.*']/type", "value": "timeseries"},
+            {"op": "replace", "path": "/a~1b/c~0d", "value": 2}
+        ]
+        assert apply_patch(dashboard, compile_patch(patch)) == apply_patch(dashboard, patch)
+        assert apply_patch(dashboard, patch)["panels"][1]["type"] == "timeseries"
+        assert apply_patch(dashboard, patch)["a/b"]["c~d"] == 2
+
+    def test_compile_invalid_regex(self):
+        with pytest.raises(ValueError):
+            compile_patch([{"op": "remove", "path": "/panels/[?title=~'(']"}])
+
+    def test_compiled_test_failure(self, dashboard):
+        compiled = compile_patch([
+            {"op": "test", "path": "/settings/refresh", "value": "1m"}
+        ])
+        with pytest.raises(ValueError, match="/settings/refresh"):
+            compiled.apply(dashboard)
+
+
+class TestResolveHandles:
+    """Tests for object-reference path resolution"""
+
+    def test_handles_reference_parent(self, dashboard):
+        steps = JSONPathCompiler.compile_path("/panels/[?type=='row']/title")
+        handles = JSONPathResolver.resolve_handles(dashboard, steps)
+
+        assert [h.parent for h in handles] == [dashboard["panels"][0], dashboard["panels"][2]]
+        assert all(h.key == "title" for h in handles)
+        assert [h.path for h in handles] == ["/panels/0/title", "/panels/2/title"]
+
+    def test_handle_path_is_escaped(self, dashboard):
+        steps = JSONPathCompiler.compile_path("/a~1b/*")
+        handles = JSONPathResolver.resolve_handles(dashboard, steps)
+        assert [h.path for h in handles] == ["/a~1b/c~0d"]
+
+    def test_missing_intermediate_key(self, dashboard):
+        with pytest.raises(ValueError, match="Key not found"):
+            apply_patch(dashboard, [{"op": "replace", "path": "/missing/title", "value": 1}])
+
+
+class TestDescendantPaths:
+    """Tests for '**' path components"""
+
+    @pytest.fixture
+    def nested(self):
+        return {
+            "panels": [
+                {"type": "row", "panels": [{"id": 2, "type": "timeseries", "datasource": "a"}]},
+                {"id": 3, "type": "timeseries", "datasource": "b"},
+                {"id": 4, "type": "stat"},
+            ],
+            "templating": {"list": [{"type": "query", "datasource": "c"}]},
+        }
+
+    def test_selector_at_any_depth(self, nested):
+        steps = JSONPathCompiler.compile_path("/**/[?type=='timeseries']/datasource")
+        handles = JSONPathResolver.resolve_handles(nested, steps)
+        assert sorted(h.path for h in handles) == ["/panels/0/panels/0/datasource", "/panels/1/datasource"]
+        assert sorted(JSONPathResolver.resolve(nested, "/**/[?type=='timeseries']/datasource")) == \
+            sorted(h.path for h in handles)
+
+        result = apply_patch(nested, [
+            {"op": "replace", "path": "/**/[?type=='timeseries']/datasource", "value": "new"}
+        ])
+        assert result["panels"][0]["panels"][0]["datasource"] == "new"
+        assert result["panels"][1]["datasource"] == "new"
+        assert result["templating"] is nested["templating"]
+
+    def test_key_after_descendant_must_exist(self, nested):
+        steps = JSONPathCompiler.compile_path("/**/datasource")
+        paths = [h.path for h in JSONPathResolver.resolve_handles(nested, steps)]
+        assert paths == [
+            "/panels/0/panels/0/datasource",
+            "/panels/1/datasource",
+            "/templating/list/0/datasource",
+        ]
+
+    @pytest.mark.parametrize("operation, expected", [
+        ({"op": "replace", "path": "/**/[?type=='row']", "value": {"type": "text"}},
+         [{"type": "text"}, {"id": 3}]),
+        ({"op": "remove", "path": "/**/[?type=='row']"}, [{"id": 3}]),
+        ({"op": "remove", "path": "/**/[?type=='row']/panels"}, [{"type": "row"}, {"id": 3}]),
+    ])
+    def test_matches_inside_replaced_matches(self, operation, expected):
+        data = {"panels": [
+            {"type": "row", "panels": [{"type": "row", "panels": [{"type": "row", "panels": []}]}]},
+            {"id": 3},
+        ]}
+        before = deepcopy(data)
+
+        assert apply_patch(data, [operation])["panels"] == expected
+        assert data == before
+        assert apply_patch(deepcopy(data), [operation], in_place=True)["panels"] == expected
+
+    @pytest.mark.parametrize("data, operation, expected", [
+        ({"panels": [{"title": "row A", "panels": [{"title": "inner"}]}]},
+         {"op": "add", "path": "/**/panels/0", "value": {"title": "new"}},
+         {"panels": [{"title": "new"}, {"title": "row A", "panels": [{"title": "new"}, {"title": "inner"}]}]}),
+        ({"a": [[1, 2], [3]]}, {"op": "add", "path": "/**/0", "value": 0}, {"a": [0, [0, 1, 2], [0, 3]]}),
+        ({"panels": [{"panels": [{"id": 1}, {"id": 2}]}, {"panels": [{"id": 3}, {"id": 4}]}]},
+         {"op": "remove", "path": "/**/panels/0"}, {"panels": [{"panels": [{"id": 4}]}]}),
+        ({"panels": [{"id": 1, "x": 1}, {"id": 2}, {"id": 3, "x": 1}]},
+         {"op": "remove", "path": "/panels/[?x==1]"}, {"panels": [{"id": 2}]}),
+    ])
+    def test_edits_that_shift_later_matches(self, data, operation, expected):
+        before = deepcopy(data)
+
+        assert apply_patch(data, [operation]) == expected
+        assert data == before
+        assert apply_patch(deepcopy(data), [operation], in_place=True) == expected
+
+    def test_repeated_descendants_collapse(self):
+        assert JSONPathCompiler.compile_path("/**/**/x") == ((STEP_DESCENDANT, None), (STEP_KEY, "x"))
+        with pytest.raises(ValueError, match="must be followed"):
+            compile_patch([{"op": "remove", "path": "/panels/**"}])
+
+    def test_deep_documents(self):
+        data = node = {}
+        for _ in range(5000):
+            node["child"] = {}
+            node = node["child"]
+        node["leaf"] = 1
+
+        handles = JSONPathResolver.resolve_handles(data, JSONPathCompiler.compile_path("/**/leaf"))
+        assert len(handles) == 1
+        assert handles[0].parent is node
+
+
+class TestStructuralSharing:
+    """Tests for copy-on-write patch application"""
+
+    def test_untouched_subtrees_are_shared(self, dashboard):
+        result = apply_patch(dashboard, [
+            {"op": "replace", "path": "/panels/1/title", "value": "Memory"}
+        ])
+
+        assert dashboard["panels"][1]["title"] == "CPU usage"
+        assert result["panels"][1]["title"] == "Memory"
+        assert result is not dashboard
+        assert result["panels"] is not dashboard["panels"]
+        assert result["panels"][0] is dashboard["panels"][0]
+        assert result["settings"] is dashboard["settings"]
+
+    def test_in_place(self, dashboard):
+        panels = dashboard["panels"]
+        result = apply_patch(dashboard, [
+            {"op": "remove", "path": "/panels/0"}
+        ], in_place=True)
+
+        assert result is dashboard
+        assert dashboard["panels"] is panels
+        assert len(panels) == 2
+
+    def test_values_are_not_shared_between_documents(self, dashboard):
+        compiled = compile_patch([
+            {"op": "add", "path": "/panels/*/options", "value": {"legend": True}},
+            {"op": "replace", "path": "/panels/0/options/legend", "value": False}
+        ])
+        result = compiled.apply(dashboard)
+
+        assert result["panels"][0]["options"] == {"legend": False}
+        assert result["panels"][1]["options"] == {"legend": True}
+        assert compiled.operations[0].value == {"legend": True}
+        assert "options" not in dashboard["panels"][0]
+
+
+class TestSelectorCache:
+    """Tests for process-wide caching of compiled selectors"""
+
+    def test_compiled_selectors_are_shared(self):
+        first = compile_patch([{"op": "remove", "path": "/panels/[?title=~'Disk.*']"}])
+        second = compile_patch([{"op": "remove", "path": "/x/[?title=~'Disk.*']"}])
+
+        first_selector = first.operations[0].steps[1][1]
+        second_selector = second.operations[0].steps[1][1]
+        assert first_selector is second_selector
+
+    def test_compiled_selectors_pickle_by_source(self):
+        selector = JSONPathConditionParser.compile("title=~'Disk.*'")
+        assert pickle.loads(pickle.dumps(selector)) is selector
+        assert JSONPathConditionEvaluator.matches({"title": "Disk IO"}, selector) is True
+        with pytest.raises(ValueError):
+            JSONPathConditionParser.compile("title=~'('")
+
+
+class TestSelectorExpressions:
+    """Tests for the selector expression grammar"""
+
+    @staticmethod
+    def matching(selector, items):
+        compiled = JSONPathConditionParser.compile(selector)
+        return [i for i, item in enumerate(items) if compiled.matches(item)]
+
+    def test_and_binds_tighter_than_or(self, dashboard):
+        panels = dashboard["panels"]
+        assert self.matching("type=='graph' || type=='row' && id==3", panels) == [1, 2]
+        assert self.matching("(type=='graph' || type=='row') && id==3", panels) == [2]
+        assert self.matching("!(type=='row')", panels) == [1]
+
+    def test_short_circuit(self):
+        class Recording(dict):
+            def get(self, key, default=None):
+                read.append(key)
+                return super().get(key, default)
+
+        read = []
+        assert JSONPathConditionParser.compile("a==1 || b==2").matches(Recording(a=1)) is True
+        assert read == ["a"]
+        read.clear()
+        assert JSONPathConditionParser.compile("a==2 && b==2").matches(Recording(a=1)) is False
+        assert read == ["a"]
+
+    def test_nested_keys(self):
+        items = [
+            {"gridPos": {"y": 12}, "targets": [{"datasource": {"uid": "prom"}}]},
+            {"gridPos": {"y": 3}, "datasource.uid": "prom"},
+            {"gridPos": 5},
+        ]
+        assert self.matching("gridPos.y > 10", items) == [0]
+        assert self.matching("targets.0.datasource.uid=='prom'", items) == [0]
+        # A literal dotted key is found before nested objects
+        assert self.matching("datasource.uid=='prom'", items) == [1]
+        assert self.matching("exists(gridPos.y)", items) == [0, 1]
+
+    def test_typed_comparisons(self):
+        items = [{"v": 2}, {"v": 10}, {"v": "9"}, {"v": True}, {"v": None}, {}]
+        assert self.matching("v < 5", items) == [0]
+        assert self.matching("v >= 9.5", items) == [1]
+        assert self.matching("v > '10'", items) == [2]
+        assert self.matching("v == true", items) == [3]
+        assert self.matching("v == null", items) == [4]
+        assert self.matching("v != 2", items) == [1, 2, 3, 4]
+
+    def test_string_forms_still_match(self):
+        items = [{"id": 1}, {"id": "1"}, {"id": 1.5, "tags": ["a", "b"]}]
+        assert self.matching("id=='1'", items) == [0, 1]
+        assert self.matching("id==1", items) == [0, 1]
+        assert self.matching("id=~'1'", items) == [0, 1, 2]
+        assert self.matching("id in .5", items) == [2]
+        assert self.matching("tags in a", items) == [2]
+        assert self.matching("title==Row 1", [{"title": "Row 1"}]) == [0]
+
+    def test_regex_escapes_are_kept(self):
+        items = [{"legend": "CPU1"}, {"legend": "CPUd"}, {"name": "a.b"}, {"name": "axb"}]
+        assert self.matching(r"legend=~'CPU\d'", items) == [0]
+        assert self.matching(r"name=~'a\.b'", items) == [2]
+        assert self.matching(r"name=~'^a\.b$' || legend=~'CPU\d'", items) == [0, 2]
+        assert self.matching(r"""t=='it\'s'""", [{"t": "it's"}]) == [0]
+        assert self.matching(r'''t=="say \"hi\""''', [{"t": 'say "hi"'}]) == [0]
+
+    def test_bare_values_with_parentheses(self):
+        items = [
+            {"expr": "Mem used", "title": "Mem (MB)", "unit": "(MB)"},
+            {"expr": "Disk", "title": "Mem", "unit": "MB"},
+        ]
+        assert self.matching("expr=~(CPU|Mem).*", items) == [0]
+        assert self.matching("title==Mem (MB)", items) == [0]
+        assert self.matching("unit in (MB)", items) == [0]
+        assert self.matching("(title==Mem (MB)) || expr==Disk", items) == [0, 1]
+        assert self.matching("(unit in (MB) && expr=~(CPU|Mem).*)", items) == [0]
+
+    def test_equality_metadata(self):
+        assert JSONPathConditionParser.compile("id=='1'").equality == ("id", "1")
+        assert JSONPathConditionParser.compile("id==1").equality is None
+        assert JSONPathConditionParser.compile("a.b=='1'").equality is None
+        assert JSONPathConditionParser.compile("id=='1' && a==2").equality is None
+
+    @pytest.mark.parametrize("selector", ["", "a", "a==", "(a==1", "a==1)", "a==1 &&", "a < true"])
+    def test_invalid_selectors(self, selector):
+        with pytest.raises(ValueError):
+            JSONPathConditionParser.compile(selector)
+
+
+class TestSelectorIndex:
+    """Tests for the per-application equality index"""
+
+    @staticmethod
+    def apply_one_by_one(data, patch):
+        for operation in patch:
+            data = apply_patch(data, [operation])
+        return data
+
+    def test_index_reused_across_operations(self, dashboard):
+        index = JSONPathSelectorIndex()
+        steps = JSONPathCompiler.compile_path("/panels/[?type=='row']/title")
+
+        first = JSONPathResolver.resolve_handles(dashboard, steps, index)
+        dashboard["panels"][1]["type"] = "row"  # not seen: nothing invalidated
+        second = JSONPathResolver.resolve_handles(dashboard, steps, index)
+        assert [h.path for h in first] == [h.path for h in second] == ["/panels/0/title", "/panels/2/title"]
+
+        index.invalidate(["panels", 1, "type"])
+        third = JSONPathResolver.resolve_handles(dashboard, steps, index)
+        assert len(third) == 3
+
+    def test_index_invalidated_by_mutations(self, dashboard):
+        patch = [
+            {"op": "replace", "path": "/panels/[?id=='1']/title", "value": "First"},
+            {"op": "remove", "path": "/panels/[?id=='2']"},
+            {"op": "replace", "path": "/panels/[?id=='3']/title", "value": "Third"},
+            {"op": "replace", "path": "/panels/[?id=='3']/id", "value": 4},
+            {"op": "replace", "path": "/panels/[?id=='4']/type", "value": "graph"},
+            {"op": "add", "path": "/panels/0", "value": {"id": 5, "type": "row"}},
+            {"op": "replace", "path": "/panels/[?type=='row']/title", "value": "Row"},
+        ]
+        result = apply_patch(dashboard, patch)
+
+        assert result == self.apply_one_by_one(dashboard, patch)
+        assert [p["id"] for p in result["panels"]] == [5, 1, 4]
+        assert result["panels"][2] == {"id": 4, "type": "graph", "title": "Third"}
+
+
+class TestPatchFusion:
+    """Tests for resolving independent operations in one walk"""
+
+    @staticmethod
+    def groups(patch):
+        return [group.operations for group in compile_patch(patch).groups]
+
+    @staticmethod
+    def unfused(patch):
+        compiled = compile_patch(patch)
+        return compiled._replace(groups=tuple(PatchGroup((i,), None) for i in range(len(compiled.operations))))
+
+    def test_independent_operations_share_a_walk(self):
+        patch = [
+            {"op": "replace", "path": f"/panels/[?id=='{i}']/title", "value": str(i)}
+            for i in range(1, 4)
+        ] + [{"op": "add", "path": "/settings/timezone", "value": "utc"}]
+        compiled = compile_patch(patch)
+
+        assert [group.operations for group in compiled.groups] == [(0, 1, 2, 3)]
+        (panels_step, panels), (settings_step, settings) = compiled.groups[0].trie.children
+        assert panels_step == (STEP_KEY, "panels") and panels.within == (0, 1, 2)
+        assert settings_step == (STEP_KEY, "settings") and settings.within == (3,)
+
+    @pytest.mark.parametrize("patch", [
+        # A list insert shifts the index used next
+        [{"op": "add", "path": "/panels/0", "value": {}}, {"op": "replace", "path": "/panels/1/title", "value": 1}],
+        # The selector compares the modified key
+        [{"op": "replace", "path": "/panels/0/type", "value": "row"},
+         {"op": "remove", "path": "/panels/[?type=='row']/title"}],
+        # Later paths walk through the replaced container
+        [{"op": "replace", "path": "/settings", "value": {}}, {"op": "add", "path": "/settings/x", "value": 1}],
+        # Added keys are expanded by the wildcard
+        [{"op": "add", "path": "/settings/x", "value": 1}, {"op": "replace", "path": "/settings/*", "value": 2}],
+    ])
+    def test_dependent_operations_are_not_fused(self, dashboard, patch):
+        assert self.groups(patch) == [(0,), (1,)]
+        assert apply_patch(dashboard, patch) == self.unfused(patch).apply(dashboard)
+
+    def test_fused_results_match_sequential(self, dashboard):
+        patch = [
+            {"op": "replace", "path": "/panels/[?type=='row']/title", "value": "Row"},
+            {"op": "add", "path": "/panels/[?id==2]/options", "value": {"legend": True}},
+            {"op": "test", "path": "/panels/0/title", "value": "Row"},
+            {"op": "replace", "path": "/settings/refresh", "value": "1m"},
+            {"op": "test", "path": "/settings/refresh", "value": "1m"},
+        ]
+        assert self.groups(patch) == [(0, 1, 2, 3, 4)]
+
+        expected = self.unfused(patch).apply(deepcopy(dashboard), in_place=True)
+        assert apply_patch(dashboard, patch) == expected
+        assert apply_patch(deepcopy(dashboard), patch, in_place=True) == expected
+
+    def test_test_after_earlier_group_copied_root(self):
+        data = {"a": {"x": 1}, "b": {"y": 1}}
+        patch = [
+            {"op": "replace", "path": "/a", "value": {"x": 0}},
+            {"op": "replace", "path": "/a/x", "value": 2},
+            {"op": "replace", "path": "/b/y", "value": 2},
+            {"op": "test", "path": "/b/y", "value": 2},
+        ]
+        assert self.groups(patch) == [(0,), (1, 2, 3)]
+
+        expected = self.unfused(patch).apply(data)
+        assert expected == {"a": {"x": 2}, "b": {"y": 2}}
+        assert apply_patch(data, patch) == expected
+        assert apply_patch(deepcopy(data), patch, in_place=True) == expected
+        assert data == {"a": {"x": 1}, "b": {"y": 1}}
+
+    def test_errors_follow_operation_order(self, dashboard):
+        patch = [
+            {"op": "test", "path": "/settings/refresh", "value": "1h"},
+            {"op": "replace", "path": "/missing/title", "value": 1},
+        ]
+        assert self.groups(patch) == [(0, 1)]
+        with pytest.raises(ValueError, match="Test failed"):
+            apply_patch(dashboard, patch)
+        with pytest.raises(ValueError, match="Key not found"):
+            apply_patch(dashboard, patch[1:] + patch[:1])
+
+
+class TestApplyPatchMany:
+    """Tests for patching many documents"""
+
+    patch = [{"op": "replace", "path": "/panels/[?type=='row']/title", "value": "Row"}]
+
+    def documents(self, dashboard, count):
+        return [dict(dashboard, id=i) for i in range(count)]
+
+    def test_serial_fallback(self, dashboard):
+        documents = self.documents(dashboard, 3)
+        results = list(apply_patch_many(documents, self.patch, workers=4))
+        assert results == [apply_patch(d, self.patch) for d in documents]
+
+    def test_process_pool(self, dashboard):
+        documents = self.documents(dashboard, 100)
+        expected = [apply_patch(d, self.patch) for d in documents]
+
+        assert list(apply_patch_many(iter(documents), self.patch, workers=2, chunk_size=8)) == expected
+        unordered = dict(apply_patch_many(documents, compile_patch(self.patch), workers=2, ordered=False))
+        assert [unordered[i] for i in range(100)] == expected
+        assert dashboard["panels"][0]["title"] == "Row 1"
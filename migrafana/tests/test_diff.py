@@ -0,0 +1,79 @@
+from copy import deepcopy
+
+from core.json_parser.diff import DiffSummary, diff
+from core.json_parser.parser import apply_patch
+
+
+def make_dashboard():
+    return {
+        "title": "Service",
+        "panels": [
+            {"id": 1, "type": "graph", "title": "CPU", "targets": [{"expr": "cpu"}]},
+            {"id": 2, "type": "stat", "title": "Memory"},
+            {"id": 3, "type": "graph", "title": "Disk"},
+        ],
+        "templating": {"list": []},
+    }
+
+
+class TestDiff:
+    """Tests for minimal JSON patch diffs"""
+
+    def test_equal_documents(self):
+        assert diff(make_dashboard(), make_dashboard()) == []
+
+    def test_replace_is_single_operation(self):
+        original = make_dashboard()
+        patched = apply_patch(original, [
+            {"op": "replace", "path": "/panels/[?type=='graph']/title", "value": "Graph"}
+        ])
+        assert diff(original, patched) == [
+            {"op": "replace", "path": "/panels/0/title", "value": "Graph"},
+            {"op": "replace", "path": "/panels/2/title", "value": "Graph"},
+        ]
+
+    def test_list_insert_is_single_add(self):
+        original = make_dashboard()
+        patched = deepcopy(original)
+        patched["panels"].insert(1, {"id": 4})
+        assert diff(original, patched) == [{"op": "add", "path": "/panels/1", "value": {"id": 4}}]
+
+    def test_removes_highest_index_first(self):
+        original = {"items": [1, 2, 3, 4]}
+        patched = {"items": [1]}
+        assert diff(original, patched) == [
+            {"op": "remove", "path": "/items/3"},
+            {"op": "remove", "path": "/items/2"},
+            {"op": "remove", "path": "/items/1"},
+        ]
+
+    def test_type_change_is_replaced(self):
+        assert diff({"a": 1}, {"a": True}) == [{"op": "replace", "path": "/a", "value": True}]
+
+    def test_keys_are_escaped(self):
+        assert diff({}, {"a/b~c": 1}) == [{"op": "add", "path": "/a~1b~0c", "value": 1}]
+
+    def test_diff_reproduces_patched(self):
+        original = make_dashboard()
+        patched = deepcopy(original)
+        patched["panels"][0]["targets"].append({"expr": "load"})
+        del patched["panels"][1]
+        patched["templating"]["list"] = [{"name": "env"}]
+        patched["refresh"] = "5s"
+        assert apply_patch(original, diff(original, patched)) == patched
+
+
+class TestDiffSummary:
+    """Tests for cross-object diff summaries"""
+
+    def test_groups_by_path_shape(self):
+        summary = DiffSummary()
+        summary.add([
+            {"op": "replace", "path": "/panels/0/title", "value": "A"},
+            {"op": "replace", "path": "/panels/3/title", "value": "B"},
+        ])
+        summary.add([{"op": "replace", "path": "/panels/1/title", "value": "C"}])
+        summary.add([])
+
+        assert summary.entries() == [("replace", "/panels/*/title", 2, 3)]
+        assert summary.lines()[-1] == "2 of 3 objects would change"
@@ -0,0 +1,30 @@
+import pytest  # type: ignore
+
+from core.files import atomic_path, write_atomic
+
+
+class TestAtomicWrites:
+    """Tests for the shared write-then-rename helpers"""
+
+    def test_writes_text_and_bytes(self, tmp_path):
+        path = tmp_path / "state.json"
+        write_atomic(str(path), "{\"a\": \"é\"}")
+        assert path.read_text(encoding="utf-8") == "{\"a\": \"é\"}"
+
+        write_atomic(str(path), b"\x00\x01")
+        assert path.read_bytes() == b"\x00\x01"
+        assert [p.name for p in tmp_path.iterdir()] == ["state.json"]
+
+    def test_failure_keeps_the_original(self, tmp_path):
+        path = tmp_path / "export.ndjson.gz"
+        path.write_text("original")
+
+        with pytest.raises(RuntimeError):
+            with atomic_path(str(path)) as tmp:
+                assert tmp.endswith(".ndjson.gz")
+                with open(tmp, "w") as f:
+                    f.write("partial")
+                raise RuntimeError("interrupted")
+
+        assert path.read_text() == "original"
+        assert [p.name for p in tmp_path.iterdir()] == ["export.ndjson.gz"]
@@ -0,0 +1,90 @@
+import json
+
+import pytest  # type: ignore
+
+from core.json_parser.parser import apply_patch
+from core.metrics import COUNT_BUCKETS, METRICS, Histogram, MetricsRegistry, instrumented
+
+
+@pytest.fixture
+def metrics():
+    METRICS.enable()
+    yield METRICS
+    METRICS.disable()
+    METRICS.reset()
+
+
+def find(report, name, **labels):
+    return [h for h in report["histograms"] if h["name"] == name and labels.items() <= h["labels"].items()]
+
+
+class TestHistogram:
+    """Tests for bucketed histograms"""
+
+    def test_summary(self):
+        histogram = Histogram(COUNT_BUCKETS)
+        for value in range(1, 101):
+            histogram.observe(value)
+        summary = histogram.to_dict()
+        assert summary["count"] == 100
+        assert summary["mean"] == 50.5
+        assert summary["p50"] == 50
+        assert summary["p99"] == 100
+        assert histogram.cumulative()[-1] == (float("inf"), 100)
+
+
+class TestMetricsRegistry:
+    """Tests for recording and exporting run metrics"""
+
+    def test_disabled_records_nothing(self):
+        registry = MetricsRegistry()
+        registry.observe("latency", 1.0)
+        registry.increment("calls")
+        assert registry.report()["histograms"] == []
+        assert registry.report()["counters"] == []
+
+    def test_timed_labels_outcome(self, metrics):
+        @metrics.timed("call_seconds", call="fail")
+        def fail():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            fail()
+        [histogram] = find(metrics.report(), "call_seconds")
+        assert histogram["labels"] == {"call": "fail", "outcome": "error"}
+
+    def test_instrumented_manager(self, metrics):
+        @instrumented("dashboard")
+        class Manager:
+            def get_dashboard(self, uid):
+                return {"uid": uid}
+
+            @staticmethod
+            def connect():
+                return True
+
+        assert Manager().get_dashboard("a") == {"uid": "a"}
+        assert Manager.connect()
+        assert find(metrics.report(), "grafana_call_seconds", call="dashboard.get_dashboard")
+
+    def test_patch_is_measured(self, metrics):
+        data = {"panels": [{"type": "graph", "title": str(i)} for i in range(10)]}
+        apply_patch(data, [{"op": "replace", "path": "/panels/[?type=='graph']/title", "value": "x"}])
+        report = metrics.report()
+        assert find(report, "patch_paths_resolved", op="replace")[0]["max"] == 10
+        assert find(report, "patch_nodes_visited")[0]["count"] == 1
+        assert find(report, "patch_cpu_seconds")[0]["count"] == 1
+
+    def test_exports(self, metrics, tmp_path):
+        metrics.observe("fetch_seconds", 0.2, call="get")
+        metrics.increment("retries_total")
+        metrics.write_report(str(tmp_path / "report.json"), {"command": "migrate-all"})
+        metrics.write_prometheus(str(tmp_path / "metrics.prom"))
+
+        report = json.loads((tmp_path / "report.json").read_text())
+        assert report["command"] == "migrate-all"
+        lines = (tmp_path / "metrics.prom").read_text().splitlines()
+        assert "# TYPE migrafana_fetch_seconds histogram" in lines
+        assert 'migrafana_fetch_seconds_bucket{call="get",le="0.25"} 1' in lines
+        assert 'migrafana_fetch_seconds_count{call="get"} 1' in lines
+        assert "migrafana_retries_total 1" in lines
@@ -0,0 +1,214 @@
+import pytest  # type: ignore
+from grafana_client.client import GrafanaClientError
+
+from core.json_parser.diff import DiffSummary
+from core.migration import BulkDashboardMigrator, search_all_dashboards
+from core.sync import SyncState
+
+
+class FakeDashboardManager:
+    """In-memory stand-in for GrafanaDashboardManager"""
+
+    def __init__(self, dashboards=None):
+        self.dashboards = dashboards or {}
+        self.updated = []
+        self.fetches = 0
+        self.searches = 0
+        self.version_checks = 0
+
+    def get_dashboard(self, uid):
+        self.fetches += 1
+        if uid not in self.dashboards:
+            raise KeyError(uid)
+        return {"dashboard": self.dashboards[uid], "meta": {"folderUid": "f1"}}
+
+    def get_dashboard_version(self, uid):
+        self.version_checks += 1
+        if uid not in self.dashboards:
+            raise KeyError(uid)
+        return self.dashboards[uid].get("version")
+
+    def update_dashboard(self, dashboard):
+        self.updated.append(dashboard)
+        return {"status": "success"}
+
+    def search_dashboards(self, query="", tag="", limit=None, page=None, type_=None):
+        self.searches += 1
+        # Fields of Grafana's search hits: no version
+        hits = [
+            {"id": i, "uid": uid, "title": d.get("title"), "type": "dash-db", "url": f"/d/{uid}", "tags": []}
+            for i, (uid, d) in enumerate(self.dashboards.items())
+        ] + [{"uid": "folder", "type": "dash-folder"}]
+        if type_:
+            hits = [hit for hit in hits if hit["type"] == type_]
+        # Grafana's default page size
+        limit = limit or 1000
+        page = page or 1
+        return hits[(page - 1) * limit:page * limit]
+
+
+class WithoutVersions:
+    """Dashboard manager that cannot tell dashboard versions without fetching them"""
+
+    def __init__(self, manager):
+        self.get_dashboard = manager.get_dashboard
+        self.update_dashboard = manager.update_dashboard
+        self.search_dashboards = manager.search_dashboards
+
+
+class RefusedVersions(FakeDashboardManager):
+    """Dashboard manager whose token may read dashboards but not their versions"""
+
+    def get_dashboard_version(self, uid):
+        self.version_checks += 1
+        raise GrafanaClientError(403, {"message": "Access denied"}, "Client Error 403: Access denied")
+
+
+@pytest.fixture
+def source():
+    return FakeDashboardManager({
+        f"uid{i}": {"id": i, "uid": f"uid{i}", "title": f"Dashboard {i}", "version": 1}
+        for i in range(20)
+    })
+
+
+class TestBulkDashboardMigrator:
+    """Tests for the bulk migration engine"""
+
+    def test_find_uids_skips_folders(self, source):
+        migrator = BulkDashboardMigrator(source)
+        assert sorted(migrator.find_uids()) == sorted(source.dashboards)
+
+    def test_find_uids_is_not_cut_at_default_page_size(self):
+        source = FakeDashboardManager({f"uid{i}": {"uid": f"uid{i}"} for i in range(1500)})
+        assert len(BulkDashboardMigrator(source).find_uids()) == 1500
+
+    def test_search_reads_pages_until_a_short_one(self):
+        source = FakeDashboardManager({f"uid{i}": {"uid": f"uid{i}"} for i in range(250)})
+        hits = list(search_all_dashboards(source, page_size=100))
+        assert [hit["uid"] for hit in hits] == [f"uid{i}" for i in range(250)]
+        assert source.searches == 3
+
+    def test_run_patches_and_pushes(self, source):
+        destination = FakeDashboardManager()
+        migrator = BulkDashboardMigrator(
+            source,
+            destination,
+            patch=[{"op": "replace", "path": "/title", "value": "Migrated"}],
+            fetch_workers=3,
+            push_workers=2
+        )
+        report = migrator.run(migrator.find_uids())
+
+        assert len(report.succeeded) == 20
+        assert len(destination.updated) == 20
+        payload = destination.updated[0]
+        assert payload["dashboard"]["title"] == "Migrated"
+        assert payload["dashboard"]["id"] is None
+        assert payload["folderUid"] == "f1"
+        assert source.dashboards["uid0"]["title"] == "Dashboard 0"
+
+    def test_failures_do_not_stop_batch(self, source):
+        progress = []
+        migrator = BulkDashboardMigrator(
+            source,
+            patch=[{"op": "replace", "path": "/title", "value": "Migrated"}],
+            on_progress=lambda result, done, total: progress.append((done, total))
+        )
+        report = migrator.run(["uid1", "missing", "uid2"])
+
+        assert [r.uid for r in report.failed] == ["missing"]
+        assert len(report.succeeded) == 2
+        assert sorted(progress) == [(1, 3), (2, 3), (3, 3)]
+        assert report.to_dict()["failed"][0]["uid"] == "missing"
+
+    def test_unchanged_dashboards_are_not_written(self, source):
+        # Patch changing nothing, updated in place
+        migrator = BulkDashboardMigrator(source, patch=[{"op": "test", "path": "/version", "value": 1}])
+        report = migrator.run(["uid1", "uid2"])
+        assert [r.skipped for r in report.skipped] == ["unchanged"] * 2
+        assert source.updated == []
+
+        # Destination copy already patched, ids and versions differ
+        destination = FakeDashboardManager({
+            "uid1": dict(source.dashboards["uid1"], id=101, version=7, title="Migrated")
+        })
+        migrator = BulkDashboardMigrator(
+            source,
+            destination,
+            patch=[{"op": "replace", "path": "/title", "value": "Migrated"}]
+        )
+        report = migrator.run(["uid1", "uid2"])
+        assert [r.uid for r in report.skipped] == ["uid1"]
+        assert [p["dashboard"]["uid"] for p in destination.updated] == ["uid2"]
+
+        migrator.skip_unchanged = False
+        migrator.run(["uid1"])
+        assert len(destination.updated) == 2
+
+    def test_incremental_sync(self, source, tmp_path):
+        state_file = str(tmp_path / "state.json")
+        patch = [{"op": "replace", "path": "/title", "value": "Migrated"}]
+        destination = FakeDashboardManager()
+
+        migrator = BulkDashboardMigrator(source, destination, patch=patch, state=SyncState(state_file))
+        report = migrator.run(["uid1", "uid2"])
+        migrator.state.save()
+        assert len(report.succeeded) == 2
+        assert len(destination.updated) == 2
+
+        # Source versions unchanged: not even fetched
+        migrator = BulkDashboardMigrator(source, destination, patch=patch, state=SyncState(state_file))
+        fetches = source.fetches
+        report = migrator.run(migrator.find_uids()[1:3])
+        assert [r.skipped for r in report.skipped] == ["unchanged source"] * 2
+        assert source.fetches == fetches
+
+        # A new source version is fetched and pushed again
+        source.dashboards["uid1"]["version"] = 2
+        report = migrator.run(["uid1", "uid2"])
+        assert [r.skipped for r in report.skipped] == ["unchanged source"]
+        assert source.fetches == fetches + 1
+        assert len(destination.updated) == 3
+        migrator.state.save()
+
+        # Without versions, dashboards are fetched but the same output is not pushed
+        migrator = BulkDashboardMigrator(
+            WithoutVersions(source), destination, patch=patch, state=SyncState(state_file)
+        )
+        report = migrator.run(["uid1", "uid2"])
+        assert [r.skipped for r in report.skipped] == ["unchanged output"] * 2
+        assert source.fetches == fetches + 3
+        assert len(destination.updated) == 3
+
+    def test_refused_versions_compare_fetched_version(self, source, tmp_path):
+        source = RefusedVersions(source.dashboards)
+        destination = FakeDashboardManager()
+        state = SyncState(str(tmp_path / "state.json"))
+        migrator = BulkDashboardMigrator(source, destination, state=state)
+        assert len(migrator.run(["uid1", "uid2"]).succeeded) == 2
+
+        source.dashboards["uid1"]["version"] = 2
+        report = migrator.run(["uid1", "uid2"])
+        assert [(r.uid, r.skipped) for r in report.skipped] == [("uid2", "unchanged source")]
+        assert len(destination.updated) == 3
+        assert source.fetches == 4
+
+    def test_dry_run_summarizes_without_pushing(self, source):
+        destination = FakeDashboardManager()
+        summary = DiffSummary()
+        migrator = BulkDashboardMigrator(
+            source,
+            destination,
+            patch=[{"op": "replace", "path": "/title", "value": "Dashboard 0"}],
+            dry_run=summary
+        )
+        report = migrator.run(migrator.find_uids())
+
+        assert destination.updated == []
+        assert len(report.skipped) == 20
+        assert summary.changed == 19
+        assert summary.lines() == [
+            "replace /title in 19 objects (19 changes)",
+            "19 of 20 objects would change",
+        ]
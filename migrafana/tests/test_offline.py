@@ -0,0 +1,92 @@
+import json
+
+import pytest  # type: ignore
+
+from core.archive import KIND_DASHBOARD, KIND_DATASOURCE, ArchiveWriter, read_archive
+from core.offline import OfflinePatcher, detect_indent, line_ranges
+
+PATCH = [{"op": "replace", "path": "/panels/[?type=='graph']/type", "value": "timeseries"}]
+
+
+def dashboard(uid, panel_type="graph"):
+    return {"uid": uid, "panels": [{"id": 1, "type": panel_type}, {"id": 2, "type": "stat"}]}
+
+
+@pytest.fixture
+def repo(tmp_path):
+    """dashboards-as-code tree: raw models, a get_dashboard response, nested dirs"""
+    root = tmp_path / "dashboards"
+    (root / "team").mkdir(parents=True)
+    (root / "a.json").write_text(json.dumps(dashboard("a"), indent=4) + "\n")
+    (root / "team" / "b.json").write_text(json.dumps({"dashboard": dashboard("b"), "meta": {}}))
+    (root / "team" / "c.json").write_text(json.dumps(dashboard("c", "stat"), indent=2))
+    (root / "notes.txt").write_text("not a dashboard")
+    return root
+
+
+class TestOfflinePatcher:
+    """Tests for patching local files"""
+
+    def test_in_place(self, repo):
+        report = OfflinePatcher(PATCH, workers=1).run([str(repo)])
+
+        assert report.total == 3
+        assert [r.uid for r in report.skipped] == [str(repo / "team" / "c.json")]
+        a = (repo / "a.json").read_text()
+        assert json.loads(a)["panels"][0]["type"] == "timeseries"
+        assert a.startswith('{\n    "uid"') and a.endswith("}\n")
+        b = json.loads((repo / "team" / "b.json").read_text())
+        assert b["dashboard"]["panels"][0]["type"] == "timeseries"
+        assert b["meta"] == {}
+
+    def test_output_dir(self, repo, tmp_path):
+        out = tmp_path / "out"
+        report = OfflinePatcher(PATCH, output_dir=str(out), workers=2).run([str(repo)])
+
+        assert len(report.succeeded) == 3
+        assert json.loads((out / "team" / "c.json").read_text()) == dashboard("c", "stat")
+        assert json.loads((out / "a.json").read_text())["panels"][0]["type"] == "timeseries"
+        assert json.loads((repo / "a.json").read_text()) == dashboard("a")
+
+    def test_failures_are_reported(self, repo):
+        (repo / "broken.json").write_text("{")
+        report = OfflinePatcher(PATCH, workers=1).run([str(repo)])
+        assert [r.uid for r in report.failed] == [str(repo / "broken.json")]
+        assert len(report.succeeded) == 2
+
+    @pytest.mark.parametrize("name", ["export.ndjson", "export.ndjson.gz"])
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_archive(self, tmp_path, name, workers):
+        path = str(tmp_path / name)
+        with ArchiveWriter(path) as writer:
+            writer.write(KIND_DATASOURCE, "prom", {"uid": "prom", "type": "graph"})
+            for i in range(50):
+                writer.write(KIND_DASHBOARD, f"uid{i}", {"dashboard": dashboard(f"uid{i}"), "meta": {}})
+
+        # Tiny chunks so the archive is split across many ranges
+        report = OfflinePatcher(PATCH, workers=workers, chunk_bytes=300).run([path])
+
+        assert len(report.succeeded) == 1
+        records = list(read_archive(path))
+        assert len(records) == 51
+        assert records[0]["data"]["type"] == "graph"
+        assert all(r["data"]["dashboard"]["panels"][0]["type"] == "timeseries" for r in records[1:])
+        assert [r["uid"] for r in records[1:]] == [f"uid{i}" for i in range(50)]
+
+
+def test_line_ranges_end_on_newlines(tmp_path):
+    path = tmp_path / "lines.ndjson"
+    lines = [json.dumps({"n": "x" * i}) + "\n" for i in range(100)]
+    path.write_text("".join(lines))
+    content = path.read_bytes()
+
+    ranges = list(line_ranges(str(path), chunk_bytes=64))
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(content)
+    assert all(end == start for (_, end), (start, _) in zip(ranges, ranges[1:]))
+    assert all(content[end - 1:end] == b"\n" for _, end in ranges)
+
+
+def test_detect_indent():
+    assert detect_indent('{\n  "a": 1\n}') == 2
+    assert detect_indent('{\n\t"a": 1\n}') == "\t"
+    assert detect_indent('{"a": 1}') is None
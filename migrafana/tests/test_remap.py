@@ -0,0 +1,140 @@
+import copy
+
+import pytest  # type: ignore
+from core.cache import CachingDataSourceManager
+from core.migration import BulkDashboardMigrator
+from core.remap import DataSourceRemapper, UnmatchedReference
+
+from test_cache import CountingDataSourceManager
+from test_migration import FakeDashboardManager
+
+SOURCE = [
+    {"id": 1, "uid": "prom-src", "name": "Prometheus", "type": "prometheus"},
+    {"id": 2, "uid": "loki-src", "name": "Loki", "type": "loki"},
+    {"id": 3, "uid": "shared", "name": "Postgres old", "type": "postgres"},
+    {"id": 4, "uid": "gone", "name": "Graphite", "type": "graphite"},
+]
+DESTINATION = [
+    {"id": 11, "uid": "prom-dest", "name": "Prometheus", "type": "prometheus"},
+    {"id": 12, "uid": "loki-dest", "name": "Loki", "type": "loki"},
+    {"id": 13, "uid": "shared", "name": "Postgres", "type": "postgres"},
+    {"id": 14, "uid": "tempo", "name": "Tempo", "type": "tempo"},
+]
+
+
+def dashboard_model():
+    return {
+        "uid": "dash",
+        "title": "Service",
+        "panels": [
+            {
+                "type": "timeseries",
+                "datasource": {"type": "prometheus", "uid": "prom-src"},
+                "targets": [{"refId": "A", "datasource": {"type": "prometheus", "uid": "prom-src"}}],
+            },
+            {
+                "type": "row",
+                "panels": [{"type": "logs", "datasource": "Loki", "targets": [{"refId": "A"}]}],
+            },
+            {"type": "graph", "datasource": {"type": "graphite", "uid": "gone"}},
+            {"type": "table", "datasource": {"type": "postgres", "uid": "shared"}},
+            {"type": "text", "datasource": "$ds"},
+            {"type": "stat", "datasource": None},
+        ],
+        "templating": {"list": [
+            {"type": "query", "name": "job", "datasource": {"type": "prometheus", "uid": "prom-src"}},
+            {"type": "datasource", "name": "ds", "query": "prometheus",
+             "current": {"text": "Prometheus", "value": "prom-src"}},
+        ]},
+        "annotations": {"list": [
+            {"name": "Annotations & Alerts", "datasource": {"type": "grafana", "uid": "-- Grafana --"}},
+            {"name": "Deploys", "datasource": {"type": "loki", "uid": "loki-src"}, "datasourceId": 2},
+        ]},
+    }
+
+
+@pytest.fixture
+def remapper():
+    return DataSourceRemapper(SOURCE, DESTINATION)
+
+
+class TestDataSourceRemapper:
+    """Tests for cross-instance data source reference remapping"""
+
+    def test_pairs_by_name_type_then_uid(self, remapper):
+        assert remapper.pairs == {"prom-src": "prom-dest", "loki-src": "loki-dest", "shared": "shared"}
+        assert [ds["uid"] for ds in remapper.unpaired] == ["gone"]
+
+    def test_rewrites_every_reference(self, remapper):
+        result = remapper.remap(dashboard_model())
+        dashboard = result.dashboard
+        panels = dashboard["panels"]
+
+        assert panels[0]["datasource"] == {"type": "prometheus", "uid": "prom-dest"}
+        assert panels[0]["targets"][0]["datasource"]["uid"] == "prom-dest"
+        assert panels[1]["panels"][0]["datasource"] == "Loki"
+        assert panels[3]["datasource"] == {"type": "postgres", "uid": "shared"}
+        assert panels[4]["datasource"] == "$ds"
+        assert panels[5]["datasource"] is None
+        variables = dashboard["templating"]["list"]
+        assert variables[0]["datasource"]["uid"] == "prom-dest"
+        assert variables[1]["current"] == {"text": "Prometheus", "value": "prom-dest"}
+        annotations = dashboard["annotations"]["list"]
+        assert annotations[0]["datasource"]["uid"] == "-- Grafana --"
+        assert annotations[1]["datasource"]["uid"] == "loki-dest"
+        assert annotations[1]["datasourceId"] == 12
+        assert result.rewritten == 6
+
+    def test_reports_unmatched_references(self, remapper):
+        result = remapper.remap(dashboard_model())
+
+        expected = [UnmatchedReference("/panels/2/datasource", {"type": "graphite", "uid": "gone"})]
+        assert result.unmatched == expected
+        assert result.dashboard["panels"][2]["datasource"]["uid"] == "gone"
+        assert remapper.unmatched == {"dash": expected}
+
+    def test_input_is_not_modified(self, remapper):
+        original = dashboard_model()
+        before = copy.deepcopy(original)
+        result = remapper.remap(original)
+
+        assert original == before
+        # Subtrees without references are shared
+        assert result.dashboard["panels"][1] is original["panels"][1]
+
+    def test_legacy_names_are_renamed(self):
+        remapper = DataSourceRemapper(
+            [{"id": 1, "uid": "a", "name": "Metrics", "type": "prometheus"}],
+            [{"id": 2, "uid": "b", "name": "Metrics", "type": "prometheus"},
+             {"id": 3, "uid": "c", "name": "Logs", "type": "loki"}],
+        )
+        model = {"panels": [{"datasource": "Metrics"}, {"datasource": "a"}, {"datasource": "Logs"}]}
+
+        result = remapper.remap(model)
+        assert [p["datasource"] for p in result.dashboard["panels"]] == ["Metrics", "b", "Logs"]
+        assert result.unmatched == []
+
+    def test_unchanged_dashboard_is_returned_as_is(self, remapper):
+        model = {"panels": [{"datasource": {"type": "tempo", "uid": "tempo"}}]}
+        assert remapper.remap(model).dashboard is model
+
+    def test_bulk_migration_remaps(self, remapper):
+        source = FakeDashboardManager({"dash": dashboard_model()})
+        destination = FakeDashboardManager()
+        migrator = BulkDashboardMigrator(source, destination, remapper=remapper)
+
+        report = migrator.run(["dash"])
+        assert len(report.succeeded) == 1
+        pushed = destination.updated[0]["dashboard"]
+        assert pushed["panels"][0]["datasource"]["uid"] == "prom-dest"
+        assert "dash" in remapper.unmatched
+
+    def test_from_catalogs(self):
+        source = CountingDataSourceManager(SOURCE)
+        destination = CountingDataSourceManager(DESTINATION)
+        remapper = DataSourceRemapper.from_managers(
+            CachingDataSourceManager(source), CachingDataSourceManager(destination)
+        )
+
+        assert remapper.pairs["prom-src"] == "prom-dest"
+        assert source.calls == destination.calls == 1
@@ -0,0 +1,104 @@
+import threading
+import time
+
+import niquests
+import pytest  # type: ignore
+from grafana_client import GrafanaApi
+
+from api.dashboard import GrafanaDashboardManager
+from api.datasource import GrafanaDataSourceManager
+from api.models import GrafanaCreds
+from api.session import GrafanaSessionRegistry
+from core.api.throttle import ThrottledSession
+
+CREDS = GrafanaCreds(login="admin", password="secret")
+
+
+class FakeGrafana:
+    """Counts connect() probes and closed sessions instead of talking to Grafana"""
+
+    def __init__(self):
+        self.connects = 0
+        self.closed = []
+        self.fail = False
+        self._lock = threading.Lock()
+
+    def connect(self, api):
+        with self._lock:
+            self.connects += 1
+        # Widens the window for concurrent first uses
+        time.sleep(0.01)
+        if self.fail:
+            raise ConnectionError("refused")
+        return {"database": "ok"}
+
+
+@pytest.fixture
+def grafana(monkeypatch):
+    fake = FakeGrafana()
+    monkeypatch.setattr(GrafanaApi, "connect", lambda api: fake.connect(api))
+    monkeypatch.setattr(niquests.Session, "close", lambda session: fake.closed.append(session))
+    GrafanaSessionRegistry.clear()
+    fake.closed.clear()
+    yield fake
+    GrafanaSessionRegistry.clear()
+
+
+class TestGrafanaSessionRegistry:
+    """Tests for the shared per-instance Grafana sessions"""
+
+    def test_managers_share_one_session(self, grafana):
+        dashboards = GrafanaDashboardManager("http://grafana:3000", CREDS)
+        datasources = GrafanaDataSourceManager("http://grafana:3000", CREDS)
+
+        assert dashboards.connection is datasources.connection
+        session = dashboards.connection.instance.client.s
+        assert isinstance(session, ThrottledSession)
+        assert grafana.connects == 1
+
+    def test_connect_uses_the_registry(self, grafana):
+        manager = GrafanaDashboardManager("http://grafana:3000", CREDS)
+
+        assert GrafanaDashboardManager.connect("http://grafana:3000", CREDS) is manager.connection
+        assert grafana.connects == 1
+
+    def test_sessions_are_per_instance_and_credential(self, grafana):
+        first = GrafanaSessionRegistry.get("http://grafana:3000", CREDS)
+        other_host = GrafanaSessionRegistry.get("http://other:3000", CREDS)
+        other_user = GrafanaSessionRegistry.get("http://grafana:3000", GrafanaCreds(login="viewer", password="x"))
+
+        assert len({id(first), id(other_host), id(other_user)}) == 3
+        assert grafana.connects == 3
+
+    def test_concurrent_first_use_connects_once(self, grafana):
+        connections = []
+
+        def get():
+            connections.append(GrafanaSessionRegistry.get("http://grafana:3000", CREDS))
+
+        threads = [threading.Thread(target=get) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert grafana.connects == 1
+        assert all(connection is connections[0] for connection in connections)
+
+    def test_failed_connections_are_retried(self, grafana):
+        grafana.fail = True
+        failed = GrafanaSessionRegistry.get("http://grafana:3000", CREDS)
+        assert failed.instance is None and isinstance(failed.error, ConnectionError)
+
+        grafana.fail = False
+        assert GrafanaSessionRegistry.get("http://grafana:3000", CREDS).instance is not None
+        assert grafana.connects == 2
+
+    def test_clear_closes_sessions(self, grafana):
+        connection = GrafanaSessionRegistry.get("http://grafana:3000", CREDS)
+        session = connection.instance.client.s
+        grafana.closed.clear()
+
+        GrafanaSessionRegistry.clear()
+        assert grafana.closed == [session]
+        assert GrafanaSessionRegistry.get("http://grafana:3000", CREDS) is not connection
@@ -0,0 +1,137 @@
+import asyncio
+
+import niquests
+import pytest  # type: ignore
+from niquests.exceptions import InvalidURL, Timeout
+
+from core.api.throttle import (
+    AdaptiveConcurrency,
+    AsyncThrottledSession,
+    InstanceThrottle,
+    ThrottledSession,
+    TokenBucket
+)
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeTransport:
+    """Replaces the HTTP layer with queued responses (or exceptions)"""
+
+    def __init__(self):
+        self.queue = []
+        self.sent = []
+
+    def extend(self, outcomes):
+        self.queue.extend(outcomes)
+
+    def request(self, session, method, url, *args, **kwargs):
+        self.sent.append(method)
+        outcome = self.queue.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture
+def responses(monkeypatch):
+    transport = FakeTransport()
+    monkeypatch.setattr(
+        niquests.Session, "request",
+        lambda session, *args, **kwargs: transport.request(session, *args, **kwargs)
+    )
+    return transport
+
+
+class TestTokenBucket:
+    """Tests for the rate limiter"""
+
+    def test_burst_then_rate(self):
+        bucket = TokenBucket(rate=10, burst=2)
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+        assert bucket.reserve() == pytest.approx(0.2, abs=0.01)
+
+    def test_unlimited(self):
+        bucket = TokenBucket()
+        assert all(bucket.reserve() == 0 for _ in range(1000))
+
+
+class TestAdaptiveConcurrency:
+    """Tests for the AIMD concurrency window"""
+
+    def test_halves_once_per_burst_of_overload(self):
+        window = AdaptiveConcurrency(maximum=8)
+        tickets = [window.acquire() for _ in range(8)]
+        assert window.try_acquire() is None
+        for ticket in tickets:
+            window.release(ticket, overloaded=True)
+        assert window.limit == 4
+
+    def test_grows_back_on_success(self):
+        window = AdaptiveConcurrency(maximum=8)
+        window.release(window.acquire(), overloaded=True)
+        for _ in range(20):
+            window.release(window.acquire())
+        assert 6 < window.limit <= 8
+
+
+class TestThrottledSession:
+    """Tests for retries of throttled requests"""
+
+    def test_retries_get_on_overload(self, responses):
+        responses.extend([FakeResponse(429, {"Retry-After": "0"}), Timeout(), FakeResponse(200)])
+        session = ThrottledSession(InstanceThrottle(backoff=0))
+        assert session.request("GET", "http://grafana/api/health").status_code == 200
+        assert responses.sent == ["GET"] * 3
+        assert session.throttle.concurrency.limit < 16
+
+    def test_gives_up_after_retries(self, responses):
+        responses.extend([FakeResponse(503)] * 3)
+        session = ThrottledSession(InstanceThrottle(retries=2, backoff=0))
+        assert session.request("GET", "http://grafana/api/health").status_code == 503
+        assert len(responses.sent) == 3
+
+    def test_does_not_retry_writes(self, responses):
+        responses.extend([FakeResponse(503), Timeout()])
+        session = ThrottledSession(InstanceThrottle(backoff=0))
+        assert session.request("POST", "http://grafana/api/dashboards/db").status_code == 503
+        with pytest.raises(Timeout):
+            session.request("POST", "http://grafana/api/dashboards/db")
+
+    def test_other_errors_return_the_slot(self, responses):
+        responses.extend([InvalidURL(), FakeResponse(200)])
+        session = ThrottledSession(InstanceThrottle(max_concurrency=1, backoff=0))
+        with pytest.raises(InvalidURL):
+            session.request("GET", "http://grafana/api/health")
+        assert session.throttle.concurrency.try_acquire() is not None
+
+
+class TestAsyncThrottledSession:
+    """Tests for the asyncio throttled session"""
+
+    def test_errors_and_cancellation_return_the_slot(self, monkeypatch):
+        async def request(session, method, url, *args, **kwargs):
+            if "invalid" in url:
+                raise InvalidURL()
+            await asyncio.sleep(10)
+
+        monkeypatch.setattr(niquests.AsyncSession, "request", request)
+        session = AsyncThrottledSession(InstanceThrottle(max_concurrency=1, backoff=0))
+
+        async def run():
+            with pytest.raises(InvalidURL):
+                await session.request("GET", "http://invalid/api/health")
+            task = asyncio.ensure_future(session.request("GET", "http://grafana/api/health"))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run())
+        assert session.throttle.concurrency.try_acquire() is not None